@@ -9,6 +9,7 @@ const int ECHO_PIN = 6;
 const int WAKE_DIST = 80;
 const unsigned long SLEEP_TIMEOUT = 12000;
 const unsigned long MEASURE_MS    = 250;
+const unsigned long DIST_HEARTBEAT = 1000;  // поток D<см>: не реже раза в секунду
 
 // === ТАЙМИНГИ ===
 const unsigned long TALK_MS   = 100;
@@ -242,6 +243,11 @@ unsigned long lastFarTime = 0;
 bool wakeSent  = false;
 bool sleepSent = true;
 
+// Поток расстояния для хоста (D1 — вкл, D0 — выкл)
+bool streamDist = false;
+long lastSentDist = -1;
+unsigned long lastDistSentTime = 0;
+
 // Моргание
 unsigned long nextBlinkTime = 0;
 bool blinking = false;
@@ -551,6 +557,12 @@ void processCommand(String cmd) {
       loadDefaultEyes(); // сначала загрузим default, потом заменим
       loadEmotionEyes(cmd.c_str() + 1);
     }
+  } else if (cmd == "D1") {
+    // Поток расстояния: хост по нему заранее видит, что к нему идут
+    streamDist = true;
+    lastSentDist = -1;
+  } else if (cmd == "D0") {
+    streamDist = false;
   } else if (cmd == "BL") {
     // Быстрое моргание — подтверждение
     drawEyes(2, 3);
@@ -625,6 +637,14 @@ void loop() {
     distIdx = (distIdx + 1) % 3;
     long dist = filteredDistance();
 
+    // Только изменения + редкий heartbeat — 9600 бод не забиваем
+    if (streamDist && (dist != lastSentDist || now - lastDistSentTime >= DIST_HEARTBEAT)) {
+      Serial.print('D');
+      Serial.println(dist);
+      lastSentDist = dist;
+      lastDistSentTime = now;
+    }
+
     if (dist < WAKE_DIST) {
       lastFarTime = now;
       if (!wakeSent) {
@@ -1,13 +1,15 @@
-"""Модуль ИИ — генерация ответов через OpenAI с streaming и памятью."""
+"""Модуль ИИ — генерация ответов через движок LLM с streaming и памятью."""
 
 import json
 import re
 import threading
 import time
 
-from openai import OpenAI
-
+import backends
 import config
+from backends.base import approx_usage
+from retry import classify_error, error_message, get_policy
+from routing import ModelRouter
 
 SYSTEM_PROMPT = """Ты — ЖОПА (Жутко Оптимизированный Персональный Ассистент).
 У тебя характер и манера речи Эндрю Тейта. Ты альфа среди ассистентов.
@@ -46,124 +48,174 @@ EMOTION_PATTERNS = [
     (r"братан|между нами|секрет", "wink"),
 ]
 
+# Конец предложения: . ! ? ...
+SENTENCE_END = re.compile(r'[.!?…]+\s*')
+
+
+def split_sentences(text):
+    """Разбить готовый текст на предложения (как их отдаёт ask_stream)."""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+
+def _unshown(text, shown):
+    """Что дописать через on_token, если shown уже показан, а весь ответ — text."""
+    if shown and text.startswith(shown):
+        return text[len(shown):]
+    return "\n" + text if shown else text
+
 
 class JarvisAI:
-    """Генерация ответов через OpenAI GPT со streaming и памятью."""
+    """Генерация ответов через движок LLM (по умолчанию GPT) со streaming и памятью."""
 
-    def __init__(self, client=None):
-        self.client = client or OpenAI(api_key=config.OPENAI_API_KEY)
-        self.model = config.GPT_MODEL
+    def __init__(self, llm=None, transport=None, memory_file=None):
+        self.llm = llm or backends.create("llm", transport=transport)
+        self.memory_file = memory_file or config.MEMORY_FILE
+        self.router = ModelRouter()
         self.history = []
         self._lock = threading.Lock()
         self._memory_summary = self._load_memory()
+        self.last_stats = {}  # TTFT / время / токены последнего ask_stream
 
     # === Streaming ответ (yield по предложениям) ===
 
-    def ask_stream(self, user_text):
-        """Streaming ответ — yield предложений по мере генерации."""
+    def ask_stream(self, user_text, deadline=None, on_token=None):
+        """Streaming ответ — yield предложений по мере генерации.
+
+        on_token(text) вызывается на каждый кусочек текста от LLM.
+        Модель и лимиты выбирает self.router; после max_sentences предложений
+        поток закрывается, хвост не доходит и до on_token, а токены, которых
+        API уже не прислал, оцениваются по словам.
+
+        После завершения в self.last_stats — маршрут, TTFT, полное время,
+        токены и error (класс и тип исключения, если поток оборвался — даже
+        когда fallback без streaming ответил). failed — ответить не удалось
+        совсем: отдаётся фраза об ошибке, и через on_token тоже. Если часть
+        текста уже ушла в on_token, туда дописывается только недостающее.
+        """
+        started = time.monotonic()
+        usage = {}
+
         with self._lock:
+            route = self.router.choose(user_text, self.history)
             self.history.append({"role": "user", "content": user_text})
             if len(self.history) > config.MAX_HISTORY:
                 self.history = self.history[-config.MAX_HISTORY:]
             messages = self._build_messages()
 
+        stats = {"route": route.name, "model": route.model, "ttft": None, "total": None,
+                 "prompt_tokens": None, "completion_tokens": None,
+                 "fallback": False, "truncated": False, "error": None, "failed": False}
+        self.last_stats = stats
+
         full_answer = ""
         buffer = ""
+        shown = ""  # что уже ушло в on_token
+        sentences = 0
 
+        stream = None
         try:
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                max_tokens=config.GPT_MAX_TOKENS,
+            stream = self.llm.stream(
+                messages,
+                model=route.model,
+                max_tokens=route.max_tokens,
                 temperature=config.GPT_TEMPERATURE,
-                messages=messages,
-                stream=True,
+                timeout=config.HTTP_TIMEOUTS["chat"],
+                usage=usage,
             )
 
-            for chunk in stream:
-                delta = chunk.choices[0].delta
-                if delta.content:
-                    buffer += delta.content
-                    full_answer += delta.content
+            for delta in stream:
+                if delta:
+                    if stats["ttft"] is None:
+                        stats["ttft"] = time.monotonic() - started
+                    buffer += delta
+                    full_answer += delta
 
                     # Отдаём по предложениям (разделители: . ! ? ...)
-                    while True:
-                        match = re.search(r'[.!?…]+\s*', buffer)
+                    ready = []
+                    while sentences < route.max_sentences:
+                        match = SENTENCE_END.search(buffer)
                         if match and match.end() < len(buffer):
                             sentence = buffer[:match.end()].strip()
                             buffer = buffer[match.end():]
                             if sentence:
-                                yield sentence
+                                sentences += 1
+                                ready.append(sentence)
                         else:
                             break
+                    if sentences >= route.max_sentences:
+                        # Достаточно — хвост не ждём, не показываем и не озвучиваем
+                        stats["truncated"] = True
+                        full_answer = full_answer[:len(full_answer) - len(buffer)].strip()
+                        delta = delta[:max(0, len(delta) - len(buffer))]
+                        buffer = ""
+                    if on_token and delta:
+                        on_token(delta)
+                        shown += delta
+                    yield from ready
+                    if stats["truncated"]:
+                        break
 
             # Остаток буфера
             if buffer.strip():
                 yield buffer.strip()
 
         except Exception as e:
-            error_type = self._classify_error(e)
-            print(f"[AI] Ошибка: {e}")
-
-            # Retry один раз
-            try:
-                time.sleep(1)
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    max_tokens=config.GPT_MAX_TOKENS,
-                    temperature=config.GPT_TEMPERATURE,
-                    messages=messages,
-                )
-                full_answer = response.choices[0].message.content
-                yield full_answer
-            except Exception:
-                yield config.ERROR_MESSAGES.get(error_type, config.ERROR_MESSAGES["api_error"])
-                return
+            print(f"[AI] Ошибка ({classify_error(e)}): {e}")
+            stats["error"] = f"{classify_error(e)}: {type(e).__name__}: {e}"
+
+            if sentences:
+                # Начало ответа уже прозвучало — не повторяем его целиком
+                full_answer = full_answer[:len(full_answer) - len(buffer)].strip()
+            else:
+                # Retry без streaming, по общей политике и в рамках бюджета хода
+                stats["fallback"] = True
+                try:
+                    full_answer = get_policy("chat").call(
+                        lambda timeout: self._complete(messages, timeout, route),
+                        deadline=deadline,
+                        previous_error=e,
+                    )
+                    stats["ttft"] = time.monotonic() - started
+                    if on_token:
+                        on_token(_unshown(full_answer, shown))
+                    yield full_answer
+                except Exception as e2:
+                    stats["total"] = time.monotonic() - started
+                    stats["error"] = f"{classify_error(e2)}: {type(e2).__name__}: {e2}"
+                    stats["failed"] = True
+                    self.router.record(route, user_text, stats)
+                    message = error_message(e2)
+                    if on_token:
+                        on_token(_unshown(message, shown))
+                    yield message
+                    return
+        finally:
+            if stream is not None:
+                stream.close()  # закрыть HTTP-ответ, даже если вышли досрочно
+
+        stats["total"] = time.monotonic() - started
+        if stats["truncated"] and "completion_tokens" not in usage:
+            # Поток закрыли до последнего chunk со счётчиком — оцениваем по словам
+            usage.update(approx_usage(messages, full_answer))
+        stats["prompt_tokens"] = usage.get("prompt_tokens")
+        stats["completion_tokens"] = usage.get("completion_tokens")
+        self.router.record(route, user_text, stats)
 
         # Сохраняем полный ответ в историю
         if full_answer:
             with self._lock:
                 self.history.append({"role": "assistant", "content": full_answer})
-            print(f"[ЖОПА] {full_answer}")
-
-    # === Обычный (не-streaming) ответ — для текстового режима ===
-
-    def ask(self, user_text):
-        """Отправить текст и получить полный ответ."""
-        with self._lock:
-            self.history.append({"role": "user", "content": user_text})
-            if len(self.history) > config.MAX_HISTORY:
-                self.history = self.history[-config.MAX_HISTORY:]
-            messages = self._build_messages()
-
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                max_tokens=config.GPT_MAX_TOKENS,
-                temperature=config.GPT_TEMPERATURE,
-                messages=messages,
-            )
-            answer = response.choices[0].message.content
-        except Exception as e:
-            print(f"[AI] Ошибка: {e}")
-            # Retry
-            try:
-                time.sleep(1)
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    max_tokens=config.GPT_MAX_TOKENS,
-                    temperature=config.GPT_TEMPERATURE,
-                    messages=messages,
-                )
-                answer = response.choices[0].message.content
-            except Exception as e2:
-                print(f"[AI] Retry тоже упал: {e2}")
-                return config.ERROR_MESSAGES["api_error"]
-
-        with self._lock:
-            self.history.append({"role": "assistant", "content": answer})
-
-        print(f"[ЖОПА] {answer}")
-        return answer
+            if not on_token:  # иначе вызывающий уже показал текст
+                print(f"[ЖОПА] {full_answer}")
 
     # === Определение эмоции по тексту ===
 
@@ -189,20 +241,29 @@ class JarvisAI:
                 {"role": "system", "content": "Кратко суммаризируй этот диалог в 2-3 предложениях на русском. Укажи ключевые темы и факты о пользователе."},
                 {"role": "user", "content": "\n".join(f"{m['role']}: {m['content']}" for m in history_copy[-10:])},
             ]
-            response = self.client.chat.completions.create(
+            summary = self.llm.complete(
+                summary_prompt,
                 model=config.GPT_MODEL,
                 max_tokens=150,
-                messages=summary_prompt,
+                temperature=config.GPT_TEMPERATURE,
+                timeout=config.HTTP_TIMEOUTS["chat"],
             )
-            summary = response.choices[0].message.content
 
             data = {"summary": summary, "timestamp": time.time()}
-            with open(config.MEMORY_FILE, "w", encoding="utf-8") as f:
+            with open(self.memory_file, "w", encoding="utf-8") as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
             print(f"[AI] Память сохранена: {summary[:60]}...")
         except Exception as e:
             print(f"[AI] Ошибка сохранения памяти: {e}")
 
+    def last_answer(self):
+        """Последний ответ ассистента (для «повтори»)."""
+        with self._lock:
+            for message in reversed(self.history):
+                if message["role"] == "assistant":
+                    return message["content"].strip()
+        return None
+
     def clear_history(self):
         """Очистка истории (при SLEEP — сначала сохраняет)."""
         self.save_memory()
@@ -210,12 +271,9 @@ class JarvisAI:
             self.history = []
 
     def warmup(self):
-        """Прогрев HTTP соединения (вызывать при старте)."""
-        try:
-            self.client.models.list()
-            print("[AI] Прогрев OK")
-        except Exception:
-            pass
+        """Прогрев соединений движка (вызывать при старте)."""
+        self.llm.warmup()
+        print("[AI] Прогрев OK")
 
     # === Внутренние методы ===
 
@@ -233,7 +291,7 @@ class JarvisAI:
     def _load_memory(self):
         """Загружает память из файла."""
         try:
-            with open(config.MEMORY_FILE, "r", encoding="utf-8") as f:
+            with open(self.memory_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
             summary = data.get("summary", "")
             if summary:
@@ -242,11 +300,13 @@ class JarvisAI:
         except (FileNotFoundError, json.JSONDecodeError):
             return ""
 
-    def _classify_error(self, error):
-        """Классификация ошибки для голосового фидбека."""
-        err_str = str(error).lower()
-        if "rate" in err_str or "429" in err_str:
-            return "rate_limit"
-        if "connect" in err_str or "timeout" in err_str or "network" in err_str:
-            return "network"
-        return "api_error"
+    def _complete(self, messages, timeout, route):
+        """Один не-streaming запрос к LLM, ответ — не длиннее маршрута."""
+        answer = self.llm.complete(
+            messages,
+            model=route.model,
+            max_tokens=route.max_tokens,
+            temperature=config.GPT_TEMPERATURE,
+            timeout=timeout,
+        )
+        return " ".join(split_sentences(answer)[:route.max_sentences])
@@ -0,0 +1,66 @@
+"""Предсказание подхода по дальномеру — без Serial, только арифметика.
+
+Arduino после D1 шлёт строки D<см>; ArduinoSerial разбирает их
+parse_distance() и кормит ApproachTracker.
+"""
+
+import config
+
+
+def parse_distance(line):
+    """«D123» → 123; не замер расстояния — None."""
+    if not line.startswith("D"):
+        return None
+    try:
+        return int(line[1:])
+    except ValueError:
+        return None
+
+
+class ApproachTracker:
+    """Сглаженная скорость приближения по замерам D<см>.
+
+    update() возвращает True один раз на подход: человек в зоне
+    APPROACH_MAX_CM, ещё дальше WAKE_DISTANCE_CM и идёт к станции
+    быстрее APPROACH_SPEED_CM_S.
+    """
+
+    def __init__(self):
+        self.distance = None
+        self.velocity = 0.0  # см/с, > 0 — приближается
+        self._samples = 0    # замеров подряд в зоне видимости
+        self._last_time = None
+        self._last_event = None
+
+    def update(self, cm, now):
+        if cm >= config.DISTANCE_MAX_CM:
+            # Никого не видно — следующий замер начнёт оценку заново
+            self.distance = None
+            self.velocity = 0.0
+            self._samples = 0
+            return False
+
+        if self.distance is not None and now > self._last_time:
+            speed = (self.distance - cm) / (now - self._last_time)
+            alpha = config.APPROACH_SMOOTHING
+            self.velocity = alpha * speed + (1 - alpha) * self.velocity
+        self.distance = cm
+        self._last_time = now
+        self._samples += 1
+
+        if not (config.WAKE_DISTANCE_CM < cm <= config.APPROACH_MAX_CM):
+            return False
+        # Один скачок замера — не подход: нужна скорость хотя бы по двум интервалам
+        if self._samples < 3 or self.velocity < config.APPROACH_SPEED_CM_S:
+            return False
+        if self._last_event is not None and now - self._last_event < config.APPROACH_COOLDOWN_SEC:
+            return False
+        self._last_event = now
+        return True
+
+    @property
+    def eta(self):
+        """Секунд до зоны WAKE при текущей скорости (None — не приближается)."""
+        if self.distance is None or self.velocity <= 0:
+            return None
+        return max(0.0, (self.distance - config.WAKE_DISTANCE_CM) / self.velocity)
@@ -0,0 +1,49 @@
+"""Реестр движков STT / LLM / TTS.
+
+Модуль движка импортируется только когда его выбрали в config.BACKENDS,
+поэтому конфигурации без OpenAI не тянут openai/httpx при старте.
+"""
+
+import importlib
+
+import config
+
+# stage → имя → "модуль:Класс"
+REGISTRY = {
+    "stt": {
+        "openai": "backends.openai_backend:OpenAISTT",
+        "local": "backends.local_backend:LocalSTT",
+        "null": "backends.null_backend:NullSTT",
+        "replay": "backends.replay_backend:ReplaySTT",  # нужен corpus= (replay.py)
+    },
+    "llm": {
+        "openai": "backends.openai_backend:OpenAILLM",
+        "local": "backends.local_backend:LocalLLM",
+        "null": "backends.null_backend:NullLLM",
+        "replay": "backends.replay_backend:ReplayLLM",  # нужен corpus= (replay.py)
+    },
+    "tts": {
+        "openai": "backends.openai_backend:OpenAITTS",
+        "local": "backends.local_backend:LocalTTS",
+        "null": "backends.null_backend:NullTTS",
+        "replay": "backends.replay_backend:ReplayTTS",  # нужен corpus= (replay.py)
+    },
+}
+
+
+def register(stage, name, target):
+    """Добавить движок: register("stt", "vosk", "my_vosk:VoskSTT")."""
+    REGISTRY[stage][name] = target
+
+
+def create(stage, name=None, **kwargs):
+    """Создать движок для стадии. name — из реестра или сразу "модуль:Класс"."""
+    name = name or config.BACKENDS[stage]
+    target = REGISTRY[stage].get(name, name)
+    module_name, _, class_name = target.partition(":")
+    if not class_name:
+        known = ", ".join(sorted(REGISTRY[stage]))
+        raise ValueError(f"Неизвестный движок {stage}: {name} (есть: {known})")
+
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)(**kwargs)
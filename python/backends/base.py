@@ -0,0 +1,69 @@
+"""Интерфейсы движков STT / LLM / TTS."""
+
+
+def approx_usage(messages, answer):
+    """Грубая оценка токенов по словам — для движков без счётчика."""
+    prompt = sum(len(m["content"].split()) for m in messages)
+    return {"prompt_tokens": prompt, "completion_tokens": len(answer.split())}
+
+
+class STTBackend:
+    """Распознавание речи: WAV-байты → текст."""
+
+    name = "base"
+
+    def __init__(self, transport=None):
+        self.transport = transport
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        """Текст расшифровки.
+
+        audio — WAV: bytes или memoryview в буфере записи (не копировать целиком).
+        details — dict, куда движок кладёт что знает об уверенности:
+        duration, no_speech_prob, avg_logprob (для фильтра галлюцинаций).
+        """
+        raise NotImplementedError
+
+    def warmup(self):
+        pass
+
+
+class LLMBackend:
+    """Генерация ответа по списку messages в формате OpenAI Chat."""
+
+    name = "base"
+
+    def __init__(self, transport=None):
+        self.transport = transport
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        """Полный ответ строкой."""
+        raise NotImplementedError
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        """Итератор кусочков текста по мере генерации.
+
+        usage — dict, куда движок по окончании кладёт prompt_tokens / completion_tokens.
+        """
+        raise NotImplementedError
+
+    def warmup(self):
+        pass
+
+
+class TTSBackend:
+    """Синтез речи: текст → байты аудио в формате audio_format."""
+
+    name = "base"
+    audio_format = "mp3"
+
+    def __init__(self, transport=None, audio_format=None):
+        self.transport = transport
+        if audio_format:
+            self.audio_format = audio_format
+
+    def synthesize(self, text, voice, timeout):
+        raise NotImplementedError
+
+    def warmup(self):
+        pass
@@ -0,0 +1,72 @@
+"""Локальные заглушки — без сети, но с задержками как у облака.
+
+Нужны для офлайн-экспериментов с латентностью и долгих прогонов:
+пайплайн ведёт себя по времени как настоящий, но ничего не стоит.
+Как и облачные, занимают слот общего лимита вызовов API.
+"""
+
+import random
+import time
+
+import config
+from backends.base import LLMBackend, STTBackend, TTSBackend, approx_usage
+from backends.null_backend import silent_wav
+from transport import get_transport
+
+CANNED_ANSWERS = [
+    "Слушай сюда, братан. Это уровень. Мысли масштабнее!",
+    "Вопрос хороший. Но чемпионы не спрашивают, они делают.",
+    "Я тут, братан. Говори по делу.",
+]
+
+
+def _slot(backend):
+    return (backend.transport or get_transport()).slot()
+
+
+def _sleep(key):
+    """Задержка с небольшим разбросом вокруг config.LOCAL_BACKEND_LATENCY[key]."""
+    base = config.LOCAL_BACKEND_LATENCY[key]
+    time.sleep(base * random.uniform(0.8, 1.2))
+
+
+class LocalSTT(STTBackend):
+    name = "local"
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        with _slot(self):
+            _sleep("stt")
+        return config.NULL_STT_TEXT
+
+
+class LocalLLM(LLMBackend):
+    name = "local"
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        return "".join(self.stream(messages, model, max_tokens, temperature, timeout))
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        with _slot(self):
+            _sleep("llm_ttft")
+            answer = random.choice(CANNED_ANSWERS)
+            for i, word in enumerate(answer.split(" ")):
+                if i:
+                    _sleep("llm_token")
+                yield word + " "
+        if usage is not None:
+            usage.update(approx_usage(messages, answer))
+
+
+class LocalTTS(TTSBackend):
+    """Тишина длиной как у произнесённой фразы."""
+
+    name = "local"
+    audio_format = "wav"
+
+    def __init__(self, transport=None, audio_format=None):
+        super().__init__(transport)  # всегда wav
+
+    def synthesize(self, text, voice, timeout):
+        with _slot(self):
+            _sleep("tts")
+        return silent_wav(len(text) / config.LOCAL_SPEECH_CHARS_PER_SEC)
@@ -0,0 +1,58 @@
+"""Null-движки — мгновенное эхо без сети, для нагрузочных тестов."""
+
+import io
+import wave
+
+import config
+from backends.base import LLMBackend, STTBackend, TTSBackend, approx_usage
+
+
+def silent_wav(seconds, sample_rate=24000):
+    """WAV с тишиной заданной длины (pygame умеет его играть)."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(b"\x00\x00" * int(sample_rate * seconds))
+    return buf.getvalue()
+
+
+class NullSTT(STTBackend):
+    """Всегда «слышит» одну и ту же фразу."""
+
+    name = "null"
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        return config.NULL_STT_TEXT
+
+
+class NullLLM(LLMBackend):
+    """Повторяет последнюю реплику пользователя."""
+
+    name = "null"
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        return "".join(self.stream(messages, model, max_tokens, temperature, timeout))
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        last = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        answer = f"Эхо: {last}."
+        for word in answer.split(" "):
+            yield word + " "
+        if usage is not None:
+            usage.update(approx_usage(messages, answer))
+
+
+class NullTTS(TTSBackend):
+    """Короткая тишина вместо голоса."""
+
+    name = "null"
+    audio_format = "wav"
+
+    def __init__(self, transport=None, audio_format=None):
+        super().__init__(transport)  # всегда wav
+        self._audio = silent_wav(0.05)
+
+    def synthesize(self, text, voice, timeout):
+        return self._audio
@@ -0,0 +1,186 @@
+"""Движки OpenAI: Whisper, GPT, TTS поверх общего HTTP-пула."""
+
+import io
+import os
+import time
+from contextlib import contextmanager
+
+import config
+from backends.base import LLMBackend, STTBackend, TTSBackend
+from metrics import get_metrics
+from retry import classify_error
+from transport import get_transport
+
+_calls = get_metrics().counter(
+    "zhopa_api_calls_total", "Вызовы OpenAI API: outcome — ok или класс ошибки",
+    ("stage", "outcome"))
+_latency = get_metrics().histogram(
+    "zhopa_api_call_seconds", "Длительность успешного вызова OpenAI API (stream — до конца)",
+    ("stage",))
+
+
+@contextmanager
+def _metered(stage):
+    """Счёт вызова и его исхода; досрочно закрытый поток — не ошибка."""
+    started = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except Exception as e:
+        outcome = classify_error(e)
+        raise
+    finally:
+        _calls.inc(stage, outcome)
+        if outcome == "ok":
+            _latency.observe(time.monotonic() - started, stage)
+
+
+class _OpenAIMixin:
+    def _init_client(self, transport):
+        self.transport = transport or get_transport()
+        self.client = self.transport.client
+
+    def warmup(self):
+        self.transport.warmup()
+
+
+class _BufferReader(io.RawIOBase):
+    """Файл поверх memoryview: httpx читает кусками, буфер целиком не копируется.
+
+    Свой курсор на каждый запрос — hedged-дубликаты читают один буфер.
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, out):
+        size = min(len(out), len(self._view) - self._pos)
+        out[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _upload(audio):
+    return audio if isinstance(audio, bytes) else _BufferReader(memoryview(audio))
+
+
+def _segment_stats(result):
+    """Средние по сегментам Whisper, взвешенные по длительности."""
+    stats = {"duration": getattr(result, "duration", None)}
+    segments = getattr(result, "segments", None) or []
+    total = 0.0
+    no_speech = 0.0
+    logprob = 0.0
+    for seg in segments:
+        get = seg.get if isinstance(seg, dict) else lambda k, s=seg: getattr(s, k, None)
+        weight = max(0.01, (get("end") or 0.0) - (get("start") or 0.0))
+        total += weight
+        no_speech += weight * (get("no_speech_prob") or 0.0)
+        logprob += weight * (get("avg_logprob") or 0.0)
+    if total:
+        stats["no_speech_prob"] = no_speech / total
+        stats["avg_logprob"] = logprob / total
+    return stats
+
+
+class OpenAISTT(_OpenAIMixin, STTBackend):
+    name = "openai"
+
+    def __init__(self, transport=None):
+        self._init_client(transport)
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        # verbose_json — вероятность тишины и уверенность по сегментам
+        extra = {"response_format": "verbose_json"} if details is not None else {}
+        with self.transport.slot(), _metered("stt"):
+            result = self.client.audio.transcriptions.create(
+                model=config.WHISPER_MODEL,
+                file=(filename, _upload(audio)),
+                language=language,
+                timeout=self.transport.timeout("stt", timeout),
+                **extra,
+            )
+        if details is not None:
+            details.update(_segment_stats(result))
+        return result.text
+
+
+class OpenAILLM(_OpenAIMixin, LLMBackend):
+    name = "openai"
+
+    def __init__(self, transport=None):
+        self._init_client(transport)
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        with self.transport.slot(), _metered("llm"):
+            response = self.client.chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=messages,
+                timeout=self.transport.timeout("chat", timeout),
+            )
+        return response.choices[0].message.content
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        # Слот держится, пока идёт поток — соединение занято всё это время
+        with self.transport.slot(), _metered("llm"):
+            stream = self.client.chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=self.transport.timeout("chat", timeout),
+            )
+            try:
+                for chunk in stream:
+                    # Последний chunk: пустой choices + usage
+                    if chunk.usage is not None and usage is not None:
+                        usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                        usage["completion_tokens"] = chunk.usage.completion_tokens
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        yield delta.content
+            finally:
+                # Досрочный выход (хватило предложений) — генерация на сервере обрывается
+                stream.close()
+
+
+class OpenAITTS(_OpenAIMixin, TTSBackend):
+    name = "openai"
+    audio_format = "mp3"
+
+    def __init__(self, transport=None, audio_format=None):
+        self._init_client(transport)
+        # pcm — для вывода на отдельное устройство (DeviceOutput)
+        self.audio_format = audio_format or config.TTS_FORMAT
+
+    def synthesize(self, text, voice, timeout):
+        with self.transport.slot(), _metered("tts"):
+            response = self.client.audio.speech.create(
+                model=config.TTS_MODEL,
+                voice=voice,
+                input=text,
+                response_format=self.audio_format,
+                timeout=self.transport.timeout("tts", timeout),
+            )
+        return response.content
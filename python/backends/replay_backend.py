@@ -0,0 +1,115 @@
+"""Replay-движки — отдают записанное (recorder.py) с исходными задержками.
+
+speed — во сколько раз быстрее оригинала; None — без задержек вообще.
+"""
+
+import time
+from collections import deque
+
+from backends.base import LLMBackend, STTBackend, TTSBackend
+from backends.null_backend import NullLLM, silent_wav
+
+
+def _pause(seconds, speed):
+    if speed and seconds > 0:
+        time.sleep(seconds / speed)
+
+
+class ReplaySTT(STTBackend):
+    """Расшифровки по порядку записи (черновики — отдельной очередью)."""
+
+    name = "replay"
+
+    def __init__(self, corpus, speed=1.0, transport=None):
+        super().__init__(transport)
+        self.speed = speed
+        self._final = deque()
+        self._drafts = deque()
+        for r in corpus.records("stt"):
+            queue = self._drafts if r.meta.get("filename") == "draft.wav" else self._final
+            queue.append((r.text, r.meta.get("latency", 0.0), r.meta.get("details")))
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        queue = self._drafts if filename == "draft.wav" else self._final
+        if not queue:
+            return ""
+        text, latency, recorded = queue.popleft()
+        _pause(latency, self.speed)
+        if details is not None and recorded:
+            details.update(recorded)
+        return text
+
+
+class ReplayLLM(LLMBackend):
+    """Потоки ответа по порядку записи, кусочки — с исходными интервалами."""
+
+    name = "replay"
+
+    def __init__(self, corpus, speed=1.0, transport=None):
+        super().__init__(transport)
+        self.speed = speed
+        self._streams = deque()
+        self._completions = deque()
+        current = None
+        for r in corpus.records("llm_start", "llm_delta", "llm_end", "llm_complete"):
+            if r.kind == "llm_start":
+                current = {"deltas": [], "usage": None}
+                self._streams.append(current)
+            elif r.kind == "llm_delta" and current is not None:
+                current["deltas"].append((r.meta.get("dt", 0.0), r.text))
+            elif r.kind == "llm_end" and current is not None:
+                current["usage"] = r.meta.get("usage")
+            elif r.kind == "llm_complete":
+                self._completions.append((r.text, r.meta.get("latency", 0.0)))
+        self._fallback = NullLLM()
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        if not self._completions:
+            return self._fallback.complete(messages, model, max_tokens, temperature, timeout)
+        text, latency = self._completions.popleft()
+        _pause(latency, self.speed)
+        return text
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        if not self._streams:
+            yield from self._fallback.stream(messages, model, max_tokens, temperature,
+                                             timeout, usage=usage)
+            return
+        recorded = self._streams.popleft()
+        previous = 0.0
+        for dt, delta in recorded["deltas"]:
+            _pause(dt - previous, self.speed)
+            previous = dt
+            yield delta
+        if usage is not None and recorded["usage"]:
+            usage.update(recorded["usage"])
+
+
+class ReplayTTS(TTSBackend):
+    """Аудио по тексту фразы; незаписанные фразы — тишина."""
+
+    name = "replay"
+
+    def __init__(self, corpus, speed=1.0, transport=None, audio_format=None):
+        super().__init__(transport)
+        self.speed = speed
+        self._audio = {}
+        for r in corpus.records("tts"):
+            self._audio.setdefault(r.meta.get("text"), (r.data, r.meta.get("latency", 0.0)))
+            self.audio_format = r.meta.get("format", self.audio_format)
+
+    def synthesize(self, text, voice, timeout):
+        found = self._audio.get(text)
+        if found is None:
+            return self._silence()
+        audio, latency = found
+        _pause(latency, self.speed)
+        return bytes(audio)
+
+    def _silence(self):
+        """Фразы не было в записи (другой ответ) — тишина в формате записи."""
+        if self.audio_format == "wav":
+            return silent_wav(0.05)
+        if self.audio_format == "pcm":
+            return bytes(2400)
+        return None  # mp3 без декодера не собрать — просто не играем
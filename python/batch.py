@@ -0,0 +1,146 @@
+"""Пакетный режим — прогон корпуса вопросов через ask_stream с замером TTFT.
+
+Вход — JSONL, по объекту на строку:
+  {"id": "q1", "prompt": "как дела?"}
+  {"id": "q2", "prompt": "а ты кто?", "session": "visitor7"}
+
+Строки с одинаковым session идут по порядку в одной истории разговора,
+без session — каждая в своей. Разные сессии идут параллельно.
+
+Выход — JSONL: id, session, prompt, answer, ttft, total, prompt_tokens,
+completion_tokens, sentences, error. error — класс и тип исключения
+(«network: APIConnectionError: ...»), в том числе оборванного потока,
+на который ответил fallback; если ответить не удалось совсем, answer
+пустой — голосовая фраза об ошибке ответом не считается.
+Сводка — в stderr.
+"""
+
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai import JarvisAI
+from text import contains_wake_word, strip_wake_word
+from transport import get_transport
+
+
+def read_prompts(stream):
+    """Прочитать JSONL; строка без JSON считается просто текстом вопроса."""
+    prompts = []
+    for n, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            item = {"prompt": line}
+        if isinstance(item, str):
+            item = {"prompt": item}
+        item.setdefault("id", str(n))
+        prompts.append(item)
+    return prompts
+
+
+def run_batch(source=None, output=None, concurrency=4):
+    """Прогнать вопросы из файла (или stdin) и записать результаты в JSONL."""
+    in_stream = open(source, encoding="utf-8") if source else sys.stdin
+    try:
+        prompts = read_prompts(in_stream)
+    finally:
+        if source:
+            in_stream.close()
+
+    out_stream = open(output, "w", encoding="utf-8") if output else sys.stdout
+    write_lock = threading.Lock()
+    results = []
+
+    # Группы по сессиям: внутри — последовательно, между — параллельно
+    sessions = {}
+    for item in prompts:
+        key = item.get("session") or f"_{item['id']}"
+        sessions.setdefault(key, []).append(item)
+
+    transport = get_transport()
+
+    def run_session(items):
+        # Память киоска не подмешиваем — каждая сессия начинается с чистого листа
+        ai = JarvisAI(transport=transport, memory_file=os.devnull)
+        for item in items:
+            result = _run_prompt(ai, item)
+            with write_lock:
+                results.append(result)
+                out_stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out_stream.flush()
+
+    started = time.monotonic()
+    # Логи модулей — в stderr, чтобы stdout оставался чистым JSONL
+    with contextlib.redirect_stdout(sys.stderr):
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            list(pool.map(run_session, sessions.values()))
+    elapsed = time.monotonic() - started
+
+    if output:
+        out_stream.close()
+    _print_summary(results, elapsed, concurrency)
+    return results
+
+
+def _run_prompt(ai, item):
+    prompt = item["prompt"]
+    command = strip_wake_word(prompt) if contains_wake_word(prompt) else prompt
+    sentences = []
+    error = None
+    try:
+        sentences = list(ai.ask_stream(command))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    stats = ai.last_stats
+    if error is None and stats.get("error"):
+        error = stats["error"]
+        if stats.get("failed"):
+            sentences = []  # ответа нет — прозвучала только фраза об ошибке
+    return {
+        "id": item["id"],
+        "session": item.get("session"),
+        "prompt": prompt,
+        "answer": " ".join(sentences),
+        "ttft": _round(stats.get("ttft")),
+        "total": _round(stats.get("total")),
+        "prompt_tokens": stats.get("prompt_tokens"),
+        "completion_tokens": stats.get("completion_tokens"),
+        "sentences": len(sentences),
+        "fallback": stats.get("fallback", False),
+        "error": error,
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def _print_summary(results, elapsed, concurrency):
+    ttfts = sorted(r["ttft"] for r in results if r["ttft"] is not None)
+    totals = sorted(r["total"] for r in results if r["total"] is not None)
+    tokens = sum(r["completion_tokens"] or 0 for r in results)
+    errors = sum(1 for r in results if r["error"] or r["fallback"])
+
+    def p(values, q):
+        return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+    print(f"[Batch] Вопросов: {len(results)} за {elapsed:.1f} с, параллельно: {concurrency}",
+          file=sys.stderr)
+    if ttfts:
+        print(f"[Batch] TTFT: p50 {p(ttfts, 50):.2f} с, p95 {p(ttfts, 95):.2f} с, "
+              f"среднее {statistics.mean(ttfts):.2f} с", file=sys.stderr)
+    if totals:
+        print(f"[Batch] Ответ целиком: p50 {p(totals, 50):.2f} с, p95 {p(totals, 95):.2f} с",
+              file=sys.stderr)
+    print(f"[Batch] Токенов ответа: {tokens} ({tokens / elapsed if elapsed else 0:.1f}/с), "
+          f"ошибок/fallback: {errors}", file=sys.stderr)
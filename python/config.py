@@ -7,10 +7,71 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GPT_MODEL = "gpt-4o-mini"
 GPT_MAX_TOKENS = 300
 GPT_TEMPERATURE = 0.9
+# Маршруты генерации: модель, лимит токенов и сколько предложений озвучить.
+# Поток закрывается после max_sentences — хвост не генерируется и не оплачивается.
+GPT_ROUTES = {
+    "short": {"model": GPT_MODEL, "max_tokens": 80, "max_sentences": 1},    # приветствие, «кто ты»
+    "normal": {"model": GPT_MODEL, "max_tokens": 160, "max_sentences": 2},
+    "long": {"model": GPT_MODEL, "max_tokens": GPT_MAX_TOKENS, "max_sentences": 3},  # «расскажи», «почему»
+}
+ROUTE_SHORT_WORDS = 3            # команда до стольких слов без вопроса «почему/как» — short
+ROUTE_LONG_WORDS = 12            # длиннее — long
+ROUTE_LOG_FILE = None            # "route_log.jsonl" — решения + TTFT для подбора порогов
 TTS_MODEL = "tts-1"
 TTS_VOICE = "onyx"
+TTS_FORMAT = "mp3"               # mp3 / wav / pcm (pcm — 24 кГц, 16 бит, моно)
 WHISPER_MODEL = "whisper-1"
 
+# === HTTP транспорт (общий пул для Whisper / GPT / TTS) ===
+HTTP_POOL_SIZE = 8               # макс. одновременных соединений
+HTTP_KEEPALIVE_CONNECTIONS = 4   # сколько idle-соединений держать открытыми
+HTTP_KEEPALIVE_EXPIRY = 120      # сек — через сколько закрывать idle-соединение
+HTTP2_ENABLED = False            # нужен пакет h2 (pip install h2)
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_TIMEOUTS = {                # сек — полный таймаут по типу вызова
+    "stt": 20.0,
+    "chat": 30.0,
+    "tts": 20.0,
+    "warmup": 5.0,
+}
+HTTP_WARM_CONNECTIONS = 2        # сколько соединений открывать при прогреве
+KEEPALIVE_INTERVAL_SEC = 25      # пинг пока человек рядом
+UPSTREAM_CONCURRENCY = 6         # одновременных вызовов API на весь процесс
+
+# === Retry / дедлайны ===
+TURN_BUDGET_SEC = 10.0           # STT + GPT: бюджет одного хода на retry
+TTS_SENTENCE_BUDGET_SEC = 5.0    # бюджет на озвучку одного предложения
+RETRY_MIN_ATTEMPT_SEC = 1.0      # меньше остатка бюджета — retry не делаем
+RETRY_POLICIES = {
+    "stt":  {"max_attempts": 3, "base_delay": 0.3, "max_delay": 2.0, "hedge": True},
+    "chat": {"max_attempts": 3, "base_delay": 0.5, "max_delay": 4.0, "hedge": False},
+    "tts":  {"max_attempts": 3, "base_delay": 0.2, "max_delay": 1.5, "hedge": True},
+}
+HEDGE_MIN_SAMPLES = 10           # hedging включается, когда накоплено столько замеров
+LATENCY_WINDOW = 50              # окно для p95
+
+# === Движки (backends) ===
+# openai — облако; local — офлайн-заглушка с задержками как у облака;
+# null — мгновенное эхо для нагрузочных тестов; или "модуль:Класс" своего движка
+BACKENDS = {
+    "stt": os.environ.get("ZHOPA_STT_BACKEND", "openai"),
+    "llm": os.environ.get("ZHOPA_LLM_BACKEND", "openai"),
+    "tts": os.environ.get("ZHOPA_TTS_BACKEND", "openai"),
+}
+NULL_STT_TEXT = "жопа, привет"   # что «слышат» local/null STT
+LOCAL_BACKEND_LATENCY = {        # сек — задержки local-движков
+    "stt": 0.6,
+    "llm_ttft": 0.5,
+    "llm_token": 0.03,
+    "tts": 0.4,
+}
+LOCAL_SPEECH_CHARS_PER_SEC = 15  # длина «озвучки» local TTS
+
+# === Кэш TTS ===
+TTS_CACHE_SIZE = 64              # фраз в LRU-кэше синтезированного аудио
+TTS_SYNTH_WORKERS = 4            # потоки синтеза на весь процесс (все станции), пока играет текущее
+AUDIO_ECHO_TAIL_SEC = 0.25       # микрофон молчит ещё столько после звука (эхо)
+
 # === Wake-word ===
 WAKE_WORDS = ["жопа", "жопу", "жоп", "zhopa"]
 
@@ -25,15 +86,72 @@ MAX_RECORD_SEC = 15
 LISTEN_TIMEOUT = 10
 MIN_SILENCE_THRESHOLD = 300
 
+# === VAD (адаптивный шумовой фон) ===
+VAD_START_RATIO = 2.0         # вход в речь: уровень > шум × ratio
+VAD_STOP_RATIO = 1.4          # выход: уровень < шум × ratio (гистерезис)
+VAD_MIN_SPEECH_SEC = 0.2      # короче — щелчок/хлопок, не речь
+VAD_NOISE_WINDOW_SEC = 3.0    # окно для оценки шума
+VAD_NOISE_PERCENTILE = 20     # шум = этот перцентиль окна
+VAD_NOISE_ALPHA = 0.1         # скорость подстройки шума (EWMA)
+VAD_SPEECH_ALPHA = 0.05       # скорость подстройки уровня речи (EWMA)
+VAD_STOP_SPEECH_SHARE = 0.4   # нижний порог — не выше этой доли пути от шума к речи
+VAD_PREROLL_CHUNKS = 2        # chunks до срабатывания, которые попадут в запись
+
+# === Фильтр расшифровок (шум, галлюцинации Whisper) ===
+GATE_ENABLED = True
+GATE_NO_SPEECH_PROB = 0.6        # Whisper считает, что речи не было
+GATE_MIN_AVG_LOGPROB = -1.0      # ниже — слова угаданы наобум
+GATE_MAX_CHARS_PER_SEC = 30      # быстрее так не говорят — текст выдуман
+GATE_MIN_CHARS_PER_SEC = 0.8     # почти ничего за долгую запись…
+GATE_MIN_RATE_AFTER_SEC = 5.0    # …проверяем только для записей длиннее
+GATE_TURN_COST = {"usd": 0.002, "sec": 4.0}  # оценка хода GPT + TTS — для счётчика экономии
+HALLUCINATION_PHRASES = [
+    "продолжение следует",
+    "субтитры сделал",
+    "субтитры создавал",
+    "субтитры подготовил",
+    "редактор субтитров",
+    "спасибо за просмотр",
+    "подписывайтесь на канал",
+    "ставьте лайки",
+    "dimatorzok",
+    "amara org",
+]
+GATE_HALLUCINATION_EXTRA_WORDS = 1  # слов сверх известных фраз — больше, значит это команда
+
+# === Конец реплики (endpointing) ===
+ENDPOINT_ENABLED = True          # False — только адаптивная пауза SILENCE_*
+ENDPOINT_MIN_SILENCE_SEC = 0.5   # раньше этого не обрываем никогда
+ENDPOINT_MAX_SILENCE_SEC = 2.5   # потолок ожидания, если человек явно не договорил
+ENDPOINT_CONTOUR_CHUNKS = 4      # последние chunks речи для контура энергии
+ENDPOINT_WEIGHTS = {"decay": 1.0, "contour": 1.0, "draft": 2.0}
+ENDPOINT_DRAFT_STT = False       # черновая расшифровка на паузе (лишние вызовы STT)
+ENDPOINT_DRAFT_AFTER_SEC = 0.3   # через сколько тишины просить черновик
+
 # === Разговор ===
 MAX_HISTORY = 20
 SUMMARY_THRESHOLD = 15       # при достижении — суммаризировать
 MEMORY_FILE = os.path.expanduser("~/.zhopa_memory.json")
 
+# === Сервер станций (python main.py --server) ===
+# input_device / output_device — индексы устройств PyAudio (None — по умолчанию)
+STATIONS = [
+    # {"name": "kiosk1", "port": "COM3", "input_device": 1, "output_device": 3},
+    # {"name": "kiosk2", "port": "COM4", "input_device": 2, "output_device": 4},
+]
+STATION_QUEUE_SIZE = 2           # фраз в очереди станции; больше — отбрасываем
+
 # === Arduino ===
 BAUD_RATE = 9600
 WAKE_DISTANCE_CM = 80
 SLEEP_TIMEOUT_SEC = 12
+DISTANCE_STREAM = False          # True — просить у Arduino поток D<см> (нужна прошивка с D1)
+DISTANCE_MAX_CM = 400            # дальше — HC-SR04 не видит (999 — нет эха)
+APPROACH_SMOOTHING = 0.4         # EWMA скорости: доля нового замера
+APPROACH_SPEED_CM_S = 25         # приближается быстрее — «идёт к нам»
+APPROACH_MAX_CM = 250            # дальше — прохожий, не реагируем
+APPROACH_COOLDOWN_SEC = 10       # не чаще одного события на подход
+APPROACH_WAKE_WINDOW_SEC = 10    # WAKE позже этого — подход не засчитываем
 
 # === Приветствия при WAKE ===
 WAKE_GREETINGS = [
@@ -45,6 +163,30 @@ WAKE_GREETINGS = [
     "Говори, я весь внимание!",
 ]
 
+# === Локальные команды (без GPT) ===
+INTENT_REPLIES = {
+    "exit": "Ладно, братан. Отдыхай.",
+    "time": "Сейчас {time}, братан.",
+    "date": "Сегодня {weekday}, {day} {month}.",
+    "repeat_empty": "Я ещё ничего не говорил, братан.",
+    "volume_up": "Сделал громче.",
+    "volume_down": "Сделал тише.",
+    "volume_up_limit": "Громче уже некуда.",
+    "volume_down_limit": "Тише уже некуда.",
+    "no_sound": "Звука нет, братан, я в текстовом режиме.",
+}
+TTS_VOLUME = 1.0        # начальная громкость, 0.0–1.0
+VOLUME_STEP = 0.2
+
+# === Заполнение паузы, пока GPT думает ===
+FILLER_AFTER_SEC = 0.8  # первое предложение не готово за это время — говорим филлер
+FILLER_PHRASES = [      # синтезируются заранее; пусто — выключено
+    "Слушай сюда...",
+    "Так, братан...",
+    "Щас скажу...",
+    "Ну смотри...",
+]
+
 # === Ошибки (фразы для голосового фидбека) ===
 ERROR_MESSAGES = {
     "network": "Братан, связь потерялась. Жди пока вернётся.",
@@ -57,3 +199,33 @@ ERROR_MESSAGES = {
 BEEP_FREQUENCY = 660    # Hz
 BEEP_DURATION = 120     # ms
 BEEP_VOLUME = 0.3
+
+# === Профайлер (python main.py --profile) ===
+PROFILE_RATE_HZ = 50             # сэмплов в секунду на весь процесс
+PROFILE_MAX_DEPTH = 48           # кадров стека на сэмпл
+PROFILE_OUTPUT = "profile.collapsed"
+
+# === Soak-тест утечек (python soak.py) ===
+SOAK_WARMUP_SHARE = 0.2          # первые 20% циклов — прогрев (кэши, пулы), рост не считается
+SOAK_TRACE_FRAMES = 1            # глубина стека tracemalloc (каждый кадр — заметно медленнее)
+SOAK_LIMITS = {                  # допустимый рост после прогрева
+    "rss_mb": 15.0,
+    "traced_mb": 2.0,
+    "threads": 2,
+    "fds": 2,
+    "temp_files": 0,
+    "temp_kb": 0,
+}
+
+# === Воспроизведение записи (python replay.py) ===
+REPLAY_SEED = 0                  # random приветствий и заглушек — одинаковый в каждом прогоне
+
+# === Метрики и health (python main.py --metrics [порт]) ===
+METRICS_PORT = None              # 9108 — поднять /metrics и /health при любом запуске; None — выкл.
+METRICS_DEFAULT_PORT = 9108      # порт для --metrics без номера
+METRICS_HOST = "127.0.0.1"       # только локально; "0.0.0.0" — если Prometheus на другой машине
+METRICS_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)  # сек — корзины гистограмм задержек
+HEALTH_UPSTREAM_HOST = "api.openai.com"
+HEALTH_UPSTREAM_FRESH_SEC = 60   # API отвечал недавно — сеть не проверяем
+HEALTH_PROBE_TIMEOUT = 2.0       # сек — TCP-проба до API
+HEALTH_PROBE_CACHE_SEC = 15      # результат пробы живёт столько — частый /health не долбит сеть
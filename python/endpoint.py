@@ -0,0 +1,249 @@
+"""Определение конца реплики — раньше, чем фиксированные 1.2–2 с тишины.
+
+Сигналы:
+  - глубина тишины: уровень пауз у шумового фона (а не «эээ» чуть ниже порога);
+  - контур энергии: к концу фразы громкость падает, в середине — держится;
+  - черновая расшифровка (если включена): законченный вопрос/фраза
+    vs оборванная на «и», «но», «что».
+
+Уверенность в конце реплики c ∈ [0, 1] сокращает ожидание от обычного
+адаптивного до ENDPOINT_MIN_SILENCE_SEC; признаки колебания растягивают
+его до ENDPOINT_MAX_SILENCE_SEC.
+
+Замер на записях (WAV 16 кГц моно):
+  python endpoint.py corpus/   — corpus/speech/*.wav
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+import config
+from vad import VoiceActivityDetector, _wav_reader, adaptive_silence_chunks, capture, rms
+
+# Слова, после которых фраза явно не закончена
+CONTINUATION_WORDS = re.compile(
+    r"(?:\b(?:и|а|но|или|что|чтобы|потому|если|когда|как|ну|это|в|на|с|по|для|про|эээ|ммм))[\s,.…]*$",
+    re.IGNORECASE,
+)
+COMPLETE_ENDING = re.compile(r"[.!?]\s*$")
+
+
+class Endpointer:
+    """Решает, закончил ли человек говорить, по паузе, контуру энергии и черновику."""
+
+    def __init__(self, chunk_sec):
+        self.chunk_sec = chunk_sec
+        self.min_chunks = max(1, int(config.ENDPOINT_MIN_SILENCE_SEC / chunk_sec))
+        self.max_chunks = max(1, int(config.ENDPOINT_MAX_SILENCE_SEC / chunk_sec))
+        # На какой chunk паузы просить черновую расшифровку
+        self.draft_chunks = max(1, int(config.ENDPOINT_DRAFT_AFTER_SEC / chunk_sec))
+        self._speech_levels = deque(maxlen=config.ENDPOINT_CONTOUR_CHUNKS * 2)
+        self._silence_levels = []
+        self.last_decision = None
+
+    def reset(self):
+        self._speech_levels.clear()
+        self._silence_levels = []
+        self.last_decision = None
+
+    def observe(self, level, detector):
+        """Учесть chunk фазы записи (после detector.update)."""
+        if detector.silent_chunks == 0:
+            self._speech_levels.append(level)
+            self._silence_levels = []
+        else:
+            self._silence_levels.append((level, detector.noise, detector.stop_threshold))
+
+    def should_stop(self, detector, draft=None):
+        """True — реплика закончилась."""
+        silent = detector.silent_chunks
+        if silent < self.min_chunks:
+            return False
+
+        baseline = adaptive_silence_chunks(detector.speech_chunks, self.chunk_sec)
+        confidence, hesitant = self._confidence(draft)
+        if hesitant:
+            required = max(baseline, self.max_chunks)
+        else:
+            required = baseline - confidence * (baseline - self.min_chunks)
+        required = min(max(required, self.min_chunks), self.max_chunks)
+
+        if silent >= required:
+            self.last_decision = {
+                "silence_sec": silent * self.chunk_sec,
+                "baseline_sec": baseline * self.chunk_sec,
+                "confidence": round(confidence, 2),
+                "hesitant": hesitant,
+            }
+            return True
+        return False
+
+    # === Внутренние методы ===
+
+    def _confidence(self, draft):
+        weights = config.ENDPOINT_WEIGHTS
+        score = (
+            weights["decay"] * self._decay_score()
+            + weights["contour"] * self._contour_score()
+        )
+        total = weights["decay"] + weights["contour"]
+
+        hesitant = False
+        if draft:
+            draft = draft.strip()
+            if CONTINUATION_WORDS.search(draft):
+                hesitant = True
+            elif COMPLETE_ENDING.search(draft) and len(draft.split()) >= 2:
+                score += weights["draft"]
+            total += weights["draft"]
+        return (score / total if total else 0.0), hesitant
+
+    def _decay_score(self):
+        """1 — пауза на уровне шума (тишина), 0 — у нижнего порога (мычание, дыхание)."""
+        if not self._silence_levels:
+            return 0.0
+        parts = []
+        for level, noise, stop in self._silence_levels:
+            span = max(1.0, stop - noise)
+            parts.append(1.0 - min(1.0, max(0.0, (level - noise) / span)))
+        return sum(parts) / len(parts)
+
+    def _contour_score(self):
+        """1 — энергия к концу фразы падала, 0 — держалась или росла."""
+        n = config.ENDPOINT_CONTOUR_CHUNKS
+        levels = list(self._speech_levels)
+        if len(levels) < n + 2:
+            return 0.0
+        tail = sum(levels[-n:]) / n
+        head = sum(levels[:-n]) / len(levels[:-n])
+        if head <= 0:
+            return 0.0
+        ratio = tail / head
+        # ratio 0.5 и ниже — явный спад, 1.0 и выше — спада нет
+        return min(1.0, max(0.0, (1.0 - ratio) / 0.5))
+
+
+class DraftTranscriber:
+    """Черновая расшифровка уже записанного во время паузы (в фоне).
+
+    Если после черновика речи не было — его текст идёт как итоговый,
+    второй запрос к STT не нужен. details — уверенность STT для фильтра
+    галлюцинаций, pcm_length — сколько байт записи покрыл черновик,
+    started — когда он запрошен (с этого момента считается бюджет хода).
+    """
+
+    def __init__(self, transcribe):
+        self._transcribe = transcribe  # fn(pcm) → (текст, details)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._generation = getattr(self, "_generation", 0) + 1
+            self._clear()
+
+    def _clear(self):
+        self.text = None
+        self.details = None
+        self.pcm_length = None
+        self.started = None
+        self._pending = False
+
+    def request(self, pcm):
+        """Запустить расшифровку записанного, если ещё не запущена для этой паузы."""
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+            self.started = time.monotonic()
+            generation = self._generation
+        # Своя копия: запись продолжается, а буфер переиспользуется следующей фразой
+        snapshot = bytes(pcm)
+        count = len(snapshot)
+
+        def work():
+            try:
+                text, details = self._transcribe(snapshot)
+            except Exception as e:
+                print(f"[Endpoint] Черновик не удался: {e}")
+                text, details = None, None
+            with self._lock:
+                if generation == self._generation:
+                    self.text = text
+                    self.details = details
+                    self.pcm_length = count
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def speech_resumed(self):
+        """Речь продолжилась — черновик устарел."""
+        with self._lock:
+            if self._pending or self.text is not None:
+                self._generation += 1
+                self._clear()
+
+
+# === Замер на записях ===
+
+def _run_file(path, use_endpointer, chunk):
+    """(речевых chunks, тишина в конце записи, сек) для первой фразы файла."""
+    chunk_sec = chunk / config.SAMPLE_RATE
+    wf, read = _wav_reader(path, chunk)
+    try:
+        detector = VoiceActivityDetector(chunk_sec)
+        detector.seed([rms(read()) for _ in range(int(1 / chunk_sec))])
+        endpointer = Endpointer(chunk_sec) if use_endpointer else None
+        pcm, speech_chunks = capture(
+            read, detector,
+            timeout_chunks=int(config.LISTEN_TIMEOUT / chunk_sec),
+            max_chunks=int(config.MAX_RECORD_SEC / chunk_sec),
+            endpointer=endpointer,
+        )
+    finally:
+        wf.close()
+    if not pcm:
+        return None
+    return speech_chunks, detector.silent_chunks * chunk_sec
+
+
+def evaluate(corpus_dir, chunk=None):
+    """Сэкономленное время и доля ранних обрывов: Endpointer vs адаптивная пауза."""
+    chunk = chunk or config.CHUNK
+    folder = os.path.join(corpus_dir, "speech")
+    saved, early, files = [], 0, 0
+
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(".wav"):
+            continue
+        path = os.path.join(folder, name)
+        base = _run_file(path, False, chunk)
+        new = _run_file(path, True, chunk)
+        if base is None or new is None:
+            continue
+        (base_speech, base_tail), (new_speech, new_tail) = base, new
+        files += 1
+        # Ранний обрыв — обычный алгоритм записал больше речи после нашей точки
+        if base_speech > new_speech:
+            early += 1
+            print(f"[Endpoint] {name}: ранний обрыв ({new_speech} из {base_speech} речевых chunks)")
+        else:
+            saved.append(base_tail - new_tail)
+
+    if not files:
+        print("[Endpoint] Нет записей в corpus/speech/")
+        return None
+    avg_saved = sum(saved) / len(saved) if saved else 0.0
+    print(f"[Endpoint] Фраз: {files}, экономия на ход: {avg_saved:.2f} с в среднем, "
+          f"ранних обрывов: {early} ({early / files * 100:.0f}%)")
+    return {"files": files, "avg_saved_sec": avg_saved, "early_cutoffs": early}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python endpoint.py corpus/  (corpus/speech/*.wav)")
+        sys.exit(1)
+    evaluate(sys.argv[1])
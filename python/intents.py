@@ -0,0 +1,114 @@
+"""Локальные команды — ответ без GPT: время, дата, «повтори», громкость, выход.
+
+Таблица шаблонов компилируется один раз при импорте. Команда сравнивается
+целиком (после нормализации), поэтому «сколько времени лететь до Марса»
+уходит в GPT, а «сколько времени?» — нет. Ответы — шаблоны из
+config.INTENT_REPLIES, постоянные фразы озвучиваются из кэша TTS.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+import config
+from text import normalize
+
+# Вежливые приставки и хвосты не мешают узнать команду
+_PREFIX = r"^(?:(?:а|ну|скажи|подскажи|пожалуйста|слушай)\s+)*"
+_SUFFIX = r"(?:\s+пожалуйста)?$"
+
+
+def _whole(body):
+    return re.compile(_PREFIX + f"(?:{body})" + _SUFFIX)
+
+
+# (интент, шаблон) — порядок важен, первый совпавший выигрывает
+INTENT_PATTERNS = [
+    # «До свидания, Жопа» — имя в конце фразы strip_wake_word не отрезает
+    ("exit", _whole(r"(?:выключись|спи|иди спать|до свидания)(?: жоп[ауеы]?)?")),
+    ("time", _whole(r"который час|сколько (?:сейчас )?времени|сколько время|время")),
+    ("date", _whole(r"какое (?:сегодня )?число|какая (?:сегодня )?дата|какой сегодня день"
+                    r"|какой день недели|какой сегодня день недели")),
+    ("repeat", _whole(r"повтори(?:те)?(?: еще раз)?|еще раз|что ты сказал")),
+    ("volume_up", _whole(r"(?:сделай )?(?:по)?громче")),
+    ("volume_down", _whole(r"(?:сделай )?(?:по)?тише")),
+]
+
+# Постоянные ответы — синтезируются заранее вместе с приветствиями
+FIXED_REPLIES = [reply for name, reply in config.INTENT_REPLIES.items()
+                 if "{" not in reply and name != "no_sound"]
+
+WEEKDAYS = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
+MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+          "августа", "сентября", "октября", "ноября", "декабря"]
+
+
+class IntentRouter:
+    """Команда → (интент, ответ) или None, если нужен GPT."""
+
+    def __init__(self, ai=None, tts=None):
+        self.ai = ai
+        self.tts = tts
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=500)  # сек от фразы до конца ответа
+        self.stats = {"local": 0, "offline": 0, "intents": {}}
+
+    def route(self, command):
+        norm = normalize(command)
+        for name, pattern in INTENT_PATTERNS:
+            if pattern.search(norm):
+                return name, getattr(self, f"_{name}")()
+        return None
+
+    def record(self, name, latency, offline):
+        """Учесть ход, обслуженный локально; offline — и TTS из кэша."""
+        with self._lock:
+            self.stats["local"] += 1
+            self.stats["offline"] += int(offline)
+            self.stats["intents"][name] = self.stats["intents"].get(name, 0) + 1
+            self.latencies.append(latency)
+
+    def summary(self, turns):
+        st = self.stats
+        share = st["local"] / turns * 100 if turns else 0.0
+        line = (f"локально {st['local']} из {turns} ходов ({share:.0f}%), "
+                f"совсем без сети {st['offline']}")
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            line += f", задержка p50 {ordered[len(ordered) // 2]:.2f} с"
+        return line
+
+    # === Обработчики ===
+
+    def _exit(self):
+        return config.INTENT_REPLIES["exit"]
+
+    def _time(self):
+        now = time.localtime()
+        return config.INTENT_REPLIES["time"].format(time=f"{now.tm_hour}:{now.tm_min:02d}")
+
+    def _date(self):
+        now = time.localtime()
+        return config.INTENT_REPLIES["date"].format(
+            weekday=WEEKDAYS[now.tm_wday], day=now.tm_mday, month=MONTHS[now.tm_mon - 1]
+        )
+
+    def _repeat(self):
+        last = self.ai.last_answer() if self.ai is not None else None
+        return last or config.INTENT_REPLIES["repeat_empty"]
+
+    def _volume_up(self):
+        return self._change_volume(+config.VOLUME_STEP, "volume_up")
+
+    def _volume_down(self):
+        return self._change_volume(-config.VOLUME_STEP, "volume_down")
+
+    def _change_volume(self, step, name):
+        if self.tts is None:
+            return config.INTENT_REPLIES["no_sound"]
+        before = self.tts.volume
+        self.tts.set_volume(before + step)
+        if self.tts.volume == before:
+            return config.INTENT_REPLIES[f"{name}_limit"]
+        return config.INTENT_REPLIES[name]
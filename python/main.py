@@ -10,37 +10,24 @@
 Запуск:
   python main.py              — текстовый режим
   python main.py --voice COM9 — голосовой + Arduino
+  python main.py --voice COM9 --record s.zrec — с записью сессии (python replay.py s.zrec)
+  python main.py --server     — несколько станций из config.STATIONS
+  python main.py --batch q.jsonl --concurrency 8 --out r.jsonl — прогон корпуса
+
+  --profile [файл] [--profile-seconds N] — сэмплирующий профайлер всех
+  потоков (в любом режиме); снимок в любой момент — kill -USR1 <pid>
+  --metrics [порт] — HTTP /metrics (Prometheus) и /health (в любом режиме)
 """
 
-import random
-import re
 import sys
-import time
-import threading
-
-from openai import OpenAI
 
 import config
 from ai import JarvisAI
-
-# Regex для wake-word (как отдельное слово)
-WAKE_PATTERN = re.compile(r'\bжоп[ауеы]?\b|\bzhopa\b', re.IGNORECASE)
-
-
-def contains_wake_word(text):
-    """Проверяет есть ли имя ЖОПА в тексте (regex, не substring)."""
-    return bool(WAKE_PATTERN.search(text))
-
-
-def strip_wake_word(text):
-    """Убирает имя из фразы, оставляет команду."""
-    # Находим wake-word и берём всё после него
-    match = WAKE_PATTERN.search(text)
-    if match:
-        after = text[match.end():].strip(" ,!.?")
-        if after:
-            return after
-    return text
+from intents import FIXED_REPLIES, IntentRouter
+from session import VoiceSession
+from startup import Startup
+from text import contains_wake_word, strip_wake_word
+from transport import get_transport
 
 
 # === ТЕКСТОВЫЙ РЕЖИМ ===
@@ -54,8 +41,9 @@ def run_text_mode():
     print("  Примеры: 'ЖОПА, как дела?', 'ЖОПА, кто ты?'")
     print("  'выход' — завершить.\n")
 
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
-    ai = JarvisAI(client=client)
+    ai = JarvisAI(transport=get_transport())
+    ai.router.echo = False  # маршрут — в строке после ответа, не посреди токенов
+    router = IntentRouter(ai)
 
     while True:
         try:
@@ -78,68 +66,52 @@ def run_text_mode():
         if not command or command.lower() == text.lower():
             command = "привет"
 
-        answer = ai.ask(command)
-        print(f"\nЖОПА: {answer}\n")
+        routed = router.route(command)
+        if routed is not None:
+            print(f"\nЖОПА: {routed[1]}\n[Intent] {routed[0]}, без GPT\n")
+            if routed[0] == "exit":
+                break
+            continue
 
+        # Печатаем токены по мере генерации
+        print("\nЖОПА: ", end="", flush=True)
+        for _ in ai.ask_stream(command, on_token=lambda t: print(t, end="", flush=True)):
+            pass
+        stats = ai.last_stats
+        ttft = stats.get("ttft")
+        print(f"\n[TTFT {ttft:.2f} с, маршрут {stats['route']}]\n" if ttft is not None else "\n")
 
-# === ГОЛОСОВОЙ РЕЖИМ ===
 
-def run_voice_mode(port=None):
-    """Голосовой режим с Arduino и streaming."""
-    from serial_comm import ArduinoSerial
-    from speech import SpeechRecognizer
-    from tts import TextToSpeech
+# === ГОЛОСОВОЙ РЕЖИМ ===
 
+def run_voice_mode(port=None, record=None):
+    """Голосовой режим с Arduino и streaming. record — файл записи сессии (replay.py)."""
     print("=" * 50)
     print("  ЖОПА — голосовой режим")
     print("  Скажи 'ЖОПА' + команду для активации")
     print("=" * 50)
 
-    # --- Единый OpenAI клиент ---
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
+    # --- Единый HTTP-пул для Whisper / GPT / TTS ---
+    transport = get_transport()
+
+    recorder = None
+    if record:
+        from recorder import SessionRecorder
+        recorder = SessionRecorder(record)
+
+    # --- Инициализация: независимые шаги параллельно ---
+    ready = _voice_startup(port, transport, recorder)
+    arduino = ready["arduino"]
+    recognizer = ready["mic"]
+    ai = ready["ai"]
+    tts = ready["tts"]
 
-    # --- Инициализация ---
-    arduino = ArduinoSerial(port=port)
     if not arduino.connected:
         print("\n[!] Arduino не подключена — без дисплея и датчика.")
         print("    Укажи порт: python main.py --voice COM9\n")
 
-    recognizer = SpeechRecognizer(client=client, language="ru")
-    ai = JarvisAI(client=client)
-    tts = TextToSpeech(client=client)
-
-    # Прогрев HTTP соединения
-    ai.warmup()
-
-    # --- Состояния ---
-    is_awake = threading.Event()
-
-    if arduino.connected:
-        def on_wake():
-            if not is_awake.is_set():
-                print("\n[Датчик] Кто-то подошёл!")
-                is_awake.set()
-                # Звук пробуждения + приветствие в отдельном потоке
-                threading.Thread(target=_wake_greeting, args=(tts, arduino), daemon=True).start()
-
-        def on_sleep():
-            print("\n[Датчик] Ушёл. Засыпаю...")
-            is_awake.clear()
-            ai.clear_history()  # сохраняет память и чистит историю
-            tts.play_sleep_sound()
-
-        arduino.on_wake(on_wake)
-        arduino.on_sleep(on_sleep)
-        arduino.start_reading()
-
-        # Анимация рта привязана к TTS
-        tts.on_start(lambda: arduino.start_talking_animation())
-        tts.on_end(lambda: arduino.stop_animation())
-    else:
-        is_awake.set()  # без Arduino — всегда активен
-
-    # Калибровка микрофона
-    recognizer.calibrate(duration=1)
+    session = VoiceSession(ai, tts, recognizer=recognizer, arduino=arduino, transport=transport)
+    session.attach()
 
     print("\n[ЖОПА] Система готова.")
     if arduino.connected:
@@ -149,102 +121,91 @@ def run_voice_mode(port=None):
 
     # --- Главный цикл ---
     try:
-        while True:
-            # Ждём пробуждения от датчика
-            if not is_awake.is_set():
-                is_awake.wait(timeout=1)
-                continue
-
-            # Слушаем
-            if arduino.connected:
-                arduino.start_listening_animation()
-
-            text = recognizer.listen()
-
-            if text is None:
-                if arduino.connected:
-                    arduino.mouth_closed()
-                continue
-
-            print(f"\n[Mic] {text}")
-
-            # Проверяем wake-word
-            if not contains_wake_word(text):
-                print("[...] Нет имени — игнорирую")
-                if arduino.connected:
-                    arduino.mouth_closed()
-                continue
-
-            # Beep — подтверждение что услышал
-            tts.play_beep()
-            if arduino.connected:
-                arduino.blink_confirm()
-
-            # Извлекаем команду
-            command = strip_wake_word(text)
-
-            # Команда выхода
-            lower = command.lower()
-            if any(cmd in lower for cmd in ["выключись", "спи", "до свидания"]):
-                tts.speak("Ладно, братан. Отдыхай.")
-                if arduino.connected:
-                    arduino.sleep_mode()
-                    is_awake.clear()
-                    ai.clear_history()
-                continue
-
-            # Если сказали просто "ЖОПА" без команды
-            if not command or len(command) < 2:
-                command = "тебя позвали, ответь коротко что ты тут"
-
-            # AI ответ — STREAMING
-            if arduino.connected:
-                arduino.mouth_closed()
-
-            full_answer = ""
-            is_first = True
-            last_sentence = None
-
-            for sentence in ai.ask_stream(command):
-                if last_sentence is not None:
-                    tts.speak_chunk(last_sentence, is_first=is_first, is_last=False)
-                    is_first = False
-                last_sentence = sentence
-                full_answer += sentence + " "
-
-            # Последнее предложение
-            if last_sentence is not None:
-                tts.speak_chunk(last_sentence, is_first=is_first, is_last=True)
-
-            # Эмоция на дисплее
-            if arduino.connected and full_answer:
-                emotion = ai.detect_emotion(full_answer)
-                if emotion:
-                    arduino.set_emotion(emotion)
-
-            if arduino.connected:
-                arduino.mouth_closed()
-
+        session.run()
     except KeyboardInterrupt:
         print("\n\n[ЖОПА] Выключаюсь...")
     finally:
-        if arduino.connected:
-            arduino.stop_animation()
-            arduino.sleep_mode()
-            time.sleep(0.3)
-            arduino.close()
-        recognizer.close()
+        session.close()
+        if recorder is not None:
+            recorder.close()
+        if recognizer.gate is not None:
+            print(f"[Фильтр STT] {recognizer.gate.summary()}")
+        print(f"[Intent] {session.router.summary(session.stats['turns'])}")
+        print(f"[Route] {ai.router.summary()}")
+        if session.stats["approaches"]:
+            print(f"[Датчик] {session.approach_summary()}")
+        print(f"[HTTP] {transport.summary()}")
+        transport.close()
         print("[ЖОПА] Пока, братан!")
 
 
-def _wake_greeting(tts, arduino):
-    """Приветствие при пробуждении (запускается в отдельном потоке)."""
-    try:
-        tts.play_wake_sound()
-        greeting = random.choice(config.WAKE_GREETINGS)
-        tts.speak(greeting)
-    except Exception as e:
-        print(f"[Wake] Ошибка приветствия: {e}")
+def _voice_startup(port, transport, recorder=None):
+    """Холодный старт: Serial, микрофон, TTS и прогрев сети одновременно.
+
+    Тяжёлые импорты (pyserial, pyaudio, pygame, openai) происходят внутри
+    шагов, в своих потоках. Время до готовности ≈ самый долгий шаг.
+    """
+    def connect_arduino(_):
+        from serial_comm import ArduinoSerial
+        arduino = ArduinoSerial(port=port)
+        if recorder is not None:
+            recorder.attach(arduino=arduino)
+        return arduino
+
+    def create_ai(_):
+        ai = JarvisAI(transport=transport)
+        if recorder is not None:
+            recorder.attach(ai=ai)
+        return ai
+
+    def create_recognizer(_):
+        from speech import SpeechRecognizer
+        recognizer = SpeechRecognizer(language="ru", transport=transport)
+        if recorder is not None:
+            recorder.attach(recognizer=recognizer)  # до калибровки — её звук тоже пишем
+        return recognizer
+
+    def create_tts(_):
+        from tts import TextToSpeech
+        tts = TextToSpeech(transport=transport)
+        if recorder is not None:
+            recorder.attach(tts=tts)
+        return tts
+
+    startup = Startup()
+    startup.add("arduino", connect_arduino)
+    startup.add("ai", create_ai)
+    startup.add("warmup", lambda r: r["ai"].warmup(), deps=["ai"], optional=True)
+    startup.add("mic", create_recognizer)
+    startup.add("calibrate", lambda r: r["mic"].calibrate(duration=1), deps=["mic"])
+    startup.add("tts", create_tts)
+    # Приветствия, филлеры и ответы команд синтезируем в фоне — готовность системы их не ждёт
+    startup.add(
+        "greetings", lambda r: r["tts"].prefetch(
+            config.WAKE_GREETINGS + config.FILLER_PHRASES + FIXED_REPLIES),
+        deps=["tts", "warmup"], optional=True, background=True,
+    )
+
+    ready = startup.run()
+    startup.report()
+    return ready
+
+
+# === МЕТРИКИ ===
+
+def _start_metrics(port):
+    """Эндпоинт /metrics и /health + общие для станций метрики транспорта и кэша."""
+    from metrics import get_metrics, start_metrics_server
+    from tts import get_tts_cache
+
+    transport = get_transport()
+    registry = get_metrics()
+    registry.gauge("zhopa_api_inflight", "Вызовов API прямо сейчас").track(
+        lambda: transport.inflight)
+    registry.gauge("zhopa_tts_cache_items", "Фраз в кэше TTS").track(
+        lambda: len(get_tts_cache()))
+    registry.add_check("upstream", transport.upstream_status)
+    start_metrics_server(port)
 
 
 # === ENTRY POINT ===
@@ -252,10 +213,49 @@ def _wake_greeting(tts, arduino):
 def main():
     args = sys.argv[1:]
 
-    if "--voice" in args:
+    if "--profile" in args:
+        from profiler import start_profiler
+        i = args.index("--profile")
+        output = None
+        if i + 1 < len(args) and not args[i + 1].startswith("--"):
+            output = args.pop(i + 1)
+        args.pop(i)
+        duration = None
+        if "--profile-seconds" in args:
+            j = args.index("--profile-seconds")
+            duration = float(args[j + 1])
+            del args[j:j + 2]
+        start_profiler(output=output, duration=duration)
+
+    metrics_port = config.METRICS_PORT
+    if "--metrics" in args:
+        i = args.index("--metrics")
+        metrics_port = config.METRICS_DEFAULT_PORT
+        if i + 1 < len(args) and args[i + 1].isdigit():
+            metrics_port = int(args.pop(i + 1))
+        args.pop(i)
+    if metrics_port is not None:
+        _start_metrics(metrics_port)
+
+    if "--batch" in args:
+        from batch import run_batch
+        i = args.index("--batch")
+        source = args[i + 1] if i + 1 < len(args) and not args[i + 1].startswith("--") else None
+        output = args[args.index("--out") + 1] if "--out" in args else None
+        concurrency = int(args[args.index("--concurrency") + 1]) if "--concurrency" in args else 4
+        run_batch(source, output=output, concurrency=concurrency)
+    elif "--server" in args:
+        from server import run_server
+        run_server()
+    elif "--voice" in args:
         args.remove("--voice")
+        record = None
+        if "--record" in args:
+            i = args.index("--record")
+            record = args[i + 1]
+            del args[i:i + 2]
         port = args[0] if args else None
-        run_voice_mode(port=port)
+        run_voice_mode(port=port, record=record)
     else:
         run_text_mode()
 
@@ -0,0 +1,277 @@
+"""Живые метрики и проверка здоровья работающей станции.
+
+Счётчики и гистограммы копятся прямо в процессе: один инкремент —
+лок и сложение, без сети и без потоков. Глубины очередей и состояние
+устройств не копятся вовсе — это функции, которые вызываются только
+при запросе. По желанию поднимается локальный HTTP-эндпоинт:
+
+  GET /metrics — текстовый формат Prometheus (counter, gauge, histogram)
+  GET /health  — JSON с проверками: Arduino, аудио, доступность API;
+                 200 — всё в порядке, 503 — что-то не так
+
+  python main.py --voice COM9 --metrics [порт]   — или config.METRICS_PORT
+"""
+
+import json
+import threading
+import time
+
+import config
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик; значения меток — позиционно, в порядке labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, key)} {_number(v)}" for key, v in values]
+
+
+class Histogram:
+    """Распределение задержек по корзинам (границы — секунды, по возрастанию)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets or config.METRICS_BUCKETS) + (float("inf"),)
+        self._values = {}  # метки → [счётчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            return state[-1] if state else 0
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        lines = []
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _labels(self.labels, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(state[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    """Текущее значение: функция, которая вызывается при каждом запросе /metrics."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._sources = {}  # метки → fn()
+        self._lock = threading.Lock()
+
+    def track(self, fn, *labels):
+        with self._lock:
+            self._sources[labels] = fn
+
+    def untrack(self, *labels):
+        with self._lock:
+            self._sources.pop(labels, None)
+
+    def render(self):
+        with self._lock:
+            sources = sorted(self._sources.items(), key=lambda kv: kv[0])
+        lines = []
+        for key, fn in sources:
+            try:
+                value = fn()
+            except Exception:
+                continue  # устройство закрыли между запросами — просто нет значения
+            if value is not None:
+                lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Все метрики и проверки здоровья процесса."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._checks = {}  # имя → fn() → (ok, подробности)
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=None):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, labels, buckets)
+            return self._metrics[name]
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def add_check(self, name, fn):
+        with self._lock:
+            self._checks[name] = fn
+
+    def remove_check(self, name):
+        with self._lock:
+            self._checks.pop(name, None)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def health(self):
+        """(ok, отчёт): все проверки; упавшая проверка — тоже «не в порядке»."""
+        with self._lock:
+            checks = sorted(self._checks.items())
+        report = {}
+        for name, fn in checks:
+            try:
+                ok, detail = fn()
+            except Exception as e:
+                ok, detail = False, f"проверка упала: {e}"
+            report[name] = {"ok": bool(ok), "detail": detail}
+        ok = all(check["ok"] for check in report.values())
+        return ok, {"status": "ok" if ok else "degraded",
+                    "uptime_sec": round(time.monotonic() - self.started),
+                    "checks": report}
+
+    # === Внутренние методы ===
+
+    def _get(self, cls, name, help_text, labels):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, help_text, labels)
+            return self._metrics[name]
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    """Реестр метрик процесса."""
+    return _registry
+
+
+class MetricsServer:
+    """HTTP /metrics и /health в фоновом потоке."""
+
+    def __init__(self, registry, port, host=None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    self._reply(200, "text/plain; version=0.0.4; charset=utf-8",
+                                registry.render())
+                elif path == "/health":
+                    ok, report = registry.health()
+                    self._reply(200 if ok else 503, "application/json; charset=utf-8",
+                                json.dumps(report, ensure_ascii=False))
+                else:
+                    self._reply(404, "text/plain; charset=utf-8", "/metrics, /health\n")
+
+            def _reply(self, status, content_type, body):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass  # каждый scrape в консоль — шум
+
+        self.host = host or config.METRICS_HOST
+        self._server = ThreadingHTTPServer((self.host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        print(f"[Metrics] http://{self.host}:{self.port}/metrics и /health")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_server = None
+
+
+def start_metrics_server(port=None, host=None):
+    """Поднять эндпоинт (один на процесс). port=0 — любой свободный."""
+    global _server
+    if _server is None:
+        port = config.METRICS_PORT if port is None else port
+        try:
+            _server = MetricsServer(_registry, port, host)
+        except OSError as e:
+            print(f"[Metrics] Не удалось открыть порт {port}: {e}")
+            return None
+        _server.start()
+    return _server
@@ -0,0 +1,222 @@
+"""Очередь вывода звука — один динамик, один поток, приоритеты.
+
+Приветствие, beep, ответ и звук засыпания раньше играли из разных потоков
+(main loop, поток приветствия, поток Serial) и перебивали друг друга,
+а микрофон записывал приветствие. Теперь всё идёт через AudioScheduler:
+  - submit() не блокирует и возвращает Future: True — доиграло,
+    False — прервано или выкинуто из очереди;
+  - звук с большим приоритетом прерывает текущий менее важный
+    и выкидывает из очереди всё менее важное;
+  - одинаковый приоритет — строго по порядку (предложения ответа);
+  - is_active() — динамик звучит (или только что звучал — эхо),
+    микрофон в это время не пишет.
+
+Вывод (tts.py) обязан уметь stop() и reset(): reset() взводит его перед
+каждым звуком под локом планировщика, stop() обрывает и ещё не начатый.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from metrics import get_metrics
+
+# Синтез, который не удался после всех повторов (tts.py), и ошибки вывода здесь
+tts_failures = get_metrics().counter(
+    "zhopa_tts_failures_total", "Сбои озвучки: synth — синтез, playback — вывод звука", ("stage",))
+
+PRIORITY_GREETING = 1  # приветствие — уступает всему
+PRIORITY_ANSWER = 2    # beep подтверждения и ответ
+PRIORITY_SLEEP = 3     # человек ушёл — обрывает всё
+
+
+class _Item:
+    __slots__ = ("priority", "play", "prepare", "before", "after", "future", "cancelled")
+
+    def __init__(self, priority, play, prepare, before, after):
+        self.priority = priority
+        self.play = play
+        self.prepare = prepare
+        self.before = before
+        self.after = after
+        self.future = Future()
+        self.cancelled = False
+
+
+class AudioScheduler:
+    """Единственный владелец вывода звука станции."""
+
+    def __init__(self, output, echo_tail_sec=None):
+        self.output = output
+        self.echo_tail_sec = config.AUDIO_ECHO_TAIL_SEC if echo_tail_sec is None else echo_tail_sec
+        self.speaking = threading.Event()  # что-то играет или ждёт в очереди
+        self.stats = {"played": 0, "preempted": 0, "dropped": 0}
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._current = None
+        self._last_end = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def submit(self, play, priority=PRIORITY_ANSWER, prepare=None, before=None, after=None):
+        """Поставить звук в очередь. Не блокирует.
+
+        play() — блокирующее воспроизведение; с prepare (Future, например
+        синтез) — play(prepare.result()), ожидание не занимает динамик.
+        before/after — вызываются в потоке вывода вокруг play; after —
+        при любом исходе, в том числе если звук выкинули из очереди.
+        """
+        item = _Item(priority, play, prepare, before, after)
+        with self._cond:
+            if self._closed:
+                dropped = [item]
+            else:
+                dropped = self._preempt(priority)
+                heapq.heappush(self._queue, (-priority, next(self._seq), item))
+                self.speaking.set()
+                self._cond.notify()
+        self._finish(dropped, played=False)
+        return item.future
+
+    def clear(self):
+        """Оборвать текущий звук и очистить очередь."""
+        with self._cond:
+            dropped = self._preempt(PRIORITY_SLEEP + 1)
+            if self._current is None and self.speaking.is_set():
+                # Выкинули звук, который поток вывода ещё не взял, — иначе
+                # speaking так и остался бы поднят, а микрофон глух
+                self._last_end = time.monotonic()
+                self.speaking.clear()
+            self._cond.notify_all()
+        self._finish(dropped, played=False)
+
+    @property
+    def depth(self):
+        """Звуков в очереди вместе с играющим."""
+        with self._cond:
+            return len(self._queue) + (self._current is not None)
+
+    @property
+    def alive(self):
+        """Поток вывода жив — без него станция молчит."""
+        return self._thread.is_alive()
+
+    def is_active(self):
+        """Динамик звучит или замолчал меньше echo_tail_sec назад."""
+        if self.speaking.is_set():
+            return True
+        return time.monotonic() - self._last_end < self.echo_tail_sec
+
+    def wait_idle(self, timeout=None):
+        """Дождаться, пока очередь опустеет. False — не дождались."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._queue or self._current is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        self.clear()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+    # === Внутренние методы ===
+
+    def _preempt(self, priority):
+        """Под локом: прервать текущий и выкинуть из очереди всё, что ниже priority."""
+        current = self._current
+        if current is not None and current.priority < priority and not current.cancelled:
+            current.cancelled = True
+            self.stats["preempted"] += 1
+            self.output.stop()
+
+        dropped = [item for _, _, item in self._queue if item.priority < priority]
+        if dropped:
+            self._queue = [entry for entry in self._queue if entry[2].priority >= priority]
+            heapq.heapify(self._queue)
+            self.stats["dropped"] += len(dropped)
+            for item in dropped:
+                item.cancelled = True
+        return dropped
+
+    def _finish(self, items, played):
+        for item in items:
+            self._call(item.after)
+            if not item.future.done():
+                item.future.set_result(played)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, item = heapq.heappop(self._queue)
+                self._current = item
+
+            played = self._play(item)
+
+            with self._cond:
+                self._current = None
+                if played:
+                    self.stats["played"] += 1
+                if not self._queue:
+                    self._last_end = time.monotonic()
+                    self.speaking.clear()
+                self._cond.notify_all()
+            self._finish([item], played)
+
+    def _play(self, item):
+        """Проиграть один звук. True — доиграл до конца."""
+        payload = None
+        if item.prepare is not None:
+            # Синтез ещё идёт — ждём, но реагируем на вытеснение
+            while not item.prepare.done():
+                if item.cancelled:
+                    return False
+                time.sleep(0.02)
+            try:
+                payload = item.prepare.result()
+            except Exception as e:
+                print(f"[Audio] Подготовка звука не удалась: {e}")
+                tts_failures.inc("synth")
+                return False
+
+        with self._cond:
+            # Проверка и взвод вывода — под тем же локом, что и _preempt:
+            # stop() после этой точки уже не потеряется
+            if item.cancelled:
+                return False
+            self.output.reset()
+        self._call(item.before)
+        try:
+            if item.prepare is not None:
+                item.play(payload)
+            else:
+                item.play()
+        except Exception as e:
+            print(f"[Audio] Ошибка воспроизведения: {e}")
+            tts_failures.inc("playback")
+            return False
+        return not item.cancelled
+
+    @staticmethod
+    def _call(callback):
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            print(f"[Audio] Ошибка в callback: {e}")
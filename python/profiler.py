@@ -0,0 +1,244 @@
+"""Сэмплирующий профайлер всего процесса — все потоки, с разбивкой по этапам.
+
+Раз в 1/PROFILE_RATE_HZ секунды снимает стеки всех потоков
+(sys._current_frames), относит каждый сэмпл к этапу конвейера
+(mic / stt / llm / tts / playback / serial / http ...) и копит
+collapsed stacks — формат flamegraph.pl и speedscope:
+
+  поток;этап;модуль:функция;...;модуль:функция <сэмплов>
+
+Два файла: <out> — только потоки на CPU (состояние R в /proc, на Linux),
+<out>.wall — все сэмплы, включая ожидание сети и звука.
+
+Запуск:
+  python main.py --voice COM9 --profile                 — до выхода
+  python main.py --voice COM9 --profile out.txt --profile-seconds 60
+  kill -USR1 <pid>                                      — снимок в любой момент
+"""
+
+import atexit
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+import config
+
+# Этап по кадру стека: (этап, файл, функции или None — любая). Ищем от листа к корню.
+STAGE_RULES = [
+    ("stt", "speech.py", {"_transcribe_with_retry", "_transcribe_draft"}),
+    ("mic", "speech.py", None),
+    ("mic", "vad.py", None),
+    ("mic", "endpoint.py", None),
+    ("stt", "openai_backend.py", {"transcribe"}),
+    ("llm", "openai_backend.py", {"complete", "stream"}),
+    ("tts", "openai_backend.py", {"synthesize"}),
+    ("playback", "tts.py", {"play_audio", "play_pcm", "_play_audio", "_tone"}),
+    ("tts", "tts.py", None),
+    ("playback", "playback.py", None),
+    ("llm", "ai.py", None),
+    ("serial", "serial_comm.py", None),
+    ("http", "transport.py", None),
+    ("startup", "startup.py", None),
+    ("session", "session.py", None),
+    ("session", "server.py", None),
+    ("batch", "batch.py", None),
+]
+
+
+_THREAD_NUMBER = re.compile(r"[-_]\d+")
+
+
+class SamplingProfiler:
+    """Фоновый поток-сэмплер. start() / stop() / dump(); повторный start — новое окно."""
+
+    def __init__(self, output=None, rate_hz=None, max_depth=None):
+        self.output = output or config.PROFILE_OUTPUT
+        self.interval = 1.0 / (rate_hz or config.PROFILE_RATE_HZ)
+        self.max_depth = max_depth or config.PROFILE_MAX_DEPTH
+        self._wall = Counter()
+        self._cpu = Counter()
+        self._stage_wall = Counter()
+        self._stage_cpu = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._codes = {}  # code object → («модуль:функция», этап) — не считать на каждом сэмпле
+        self._has_proc = os.path.isdir(f"/proc/{os.getpid()}/task")
+        self.samples = 0
+        self._dumped_at = 0  # сколько сэмплов было при последней записи
+        self.sample_time = 0.0  # сколько сам сэмплер потратил (накладные расходы)
+        self.started = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None):
+        """Начать сэмплирование; duration — окно в секундах, потом stop() и запись."""
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self.started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._loop, args=(duration, self._stop), name="profiler", daemon=True
+        )
+        self._thread.start()
+        print(f"[Profile] Сэмплирую {1 / self.interval:.0f} Гц"
+              + (f" {duration:.0f} с" if duration else "") + f" → {self.output}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+    def install(self, signum=None):
+        """atexit — запись при выходе; сигнал (SIGUSR1) — снимок без остановки."""
+        atexit.register(self._at_exit)
+        signum = signum or getattr(signal, "SIGUSR1", None)
+        if signum is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signum, lambda *_: self.dump())
+
+    def dump(self, output=None):
+        """Записать collapsed stacks и сводку по этапам."""
+        output = output or self.output
+        with self._lock:
+            wall = dict(self._wall)
+            cpu = dict(self._cpu)
+            stage_cpu = Counter(self._stage_cpu)
+            stage_wall = Counter(self._stage_wall)
+            samples = self.samples
+            self._dumped_at = samples
+        if not samples:
+            print("[Profile] Сэмплов нет")
+            return
+
+        _write_collapsed(output, cpu if self._has_proc else wall)
+        _write_collapsed(f"{output}.wall", wall)
+        self._report(output, stage_cpu, stage_wall, samples)
+
+    # === Внутренние методы ===
+
+    def _at_exit(self):
+        self.stop()
+        if self.samples != self._dumped_at:
+            self.dump()
+
+    def _loop(self, duration, stop):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        while not stop.wait(self.interval):
+            started = time.perf_counter()
+            self._sample(own)
+            self.sample_time += time.perf_counter() - started
+            if deadline and time.monotonic() >= deadline:
+                break
+        if deadline and not stop.is_set():
+            # Окно закончилось само — пишем сразу, процесс живёт дальше без накладных
+            self.dump()
+
+    def _sample(self, own):
+        frames = sys._current_frames()
+        threads = {t.ident: t for t in threading.enumerate()}
+        batch = []
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            thread = threads.get(ident)
+            name = _thread_label(thread)
+            stack, stage = self._walk(frame)
+            on_cpu = self._on_cpu(thread)
+            batch.append(((name, stage) + stack, stage, on_cpu))
+        del frames
+
+        with self._lock:
+            self.samples += 1
+            for key, stage, on_cpu in batch:
+                self._wall[key] += 1
+                self._stage_wall[stage] += 1
+                if on_cpu:
+                    self._cpu[key] += 1
+                    self._stage_cpu[stage] += 1
+
+    def _walk(self, frame):
+        """(кадры от корня к листу, этап)."""
+        labels = []
+        stage = None
+        depth = 0
+        while frame is not None and depth < self.max_depth:
+            code = frame.f_code
+            known = self._codes.get(code)
+            if known is None:
+                known = (f"{os.path.basename(code.co_filename)}:{code.co_name}", _stage_for(code))
+                self._codes[code] = known
+            labels.append(known[0])
+            if stage is None:
+                stage = known[1]
+            frame = frame.f_back
+            depth += 1
+        labels.reverse()
+        return tuple(labels), stage or "other"
+
+    def _on_cpu(self, thread):
+        """Поток сейчас на CPU? Без /proc считаем, что да."""
+        native_id = getattr(thread, "native_id", None)
+        if not self._has_proc or native_id is None:
+            return True
+        try:
+            with open(f"/proc/self/task/{native_id}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            return False
+        # Поле состояния — сразу после «(имя) »
+        state = stat.rindex(b")") + 2
+        return stat[state:state + 1] == b"R"
+
+    def _report(self, output, stage_cpu, stage_wall, samples):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        overhead = self.sample_time / elapsed * 100 if elapsed else 0.0
+        cpu_total = sum(stage_cpu.values()) or 1
+        wall_total = sum(stage_wall.values()) or 1
+
+        print(f"[Profile] Сэмплов: {samples} за {elapsed:.0f} с, накладные {overhead:.1f}% CPU")
+        for stage, wall in stage_wall.most_common():
+            cpu = stage_cpu.get(stage, 0)
+            print(f"[Profile]   {stage:<9} CPU {cpu / cpu_total * 100:5.1f}%  "
+                  f"стенка {wall / wall_total * 100:5.1f}%")
+        print(f"[Profile] Записано: {output}, {output}.wall")
+
+
+def _stage_for(code):
+    filename = os.path.basename(code.co_filename)
+    for stage, rule_file, funcs in STAGE_RULES:
+        if filename == rule_file and (funcs is None or code.co_name in funcs):
+            return stage
+    return None
+
+
+def _thread_label(thread):
+    if thread is None:
+        return "thread"
+    # Пулы нумеруют потоки (hedge_3, tts_0, Thread-7) — схлопываем, иначе граф дробится
+    return _THREAD_NUMBER.sub("", thread.name) or thread.name
+
+
+def _write_collapsed(path, counter):
+    with open(path, "w", encoding="utf-8") as f:
+        for key, count in sorted(counter.items(), key=lambda kv: -kv[1]):
+            f.write(";".join(key) + f" {count}\n")
+
+
+_profiler = None
+
+
+def start_profiler(output=None, duration=None):
+    """Профайлер процесса: запись при выходе и по SIGUSR1."""
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(output=output)
+        _profiler.install()
+    _profiler.start(duration=duration)
+    return _profiler
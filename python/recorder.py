@@ -0,0 +1,203 @@
+"""Запись сессии станции для воспроизведения один в один (replay.py).
+
+Пишется всё, что приходит снаружи: сырой звук микрофона каждого хода,
+расшифровки STT, кусочки потока LLM с таймингами, байты TTS и строки
+от Arduino. Формат — один файл, записи подряд:
+
+  ZREC1\\n
+  [kind: u8][t: f64][meta_len: u32][data_len: u32][meta JSON][data]
+
+t — секунды от начала записи. Читается через mmap: звук и аудио TTS
+отдаются memoryview-срезами без копирования всего файла в память.
+
+Запись: python main.py --voice COM9 --record session.zrec
+"""
+
+import json
+import mmap
+import struct
+import threading
+import time
+
+MAGIC = b"ZREC1\n"
+HEADER = struct.Struct("<BdII")
+
+KINDS = {
+    "mic": 1,           # сырой PCM одного listen()/calibrate()
+    "stt": 2,           # итоговая расшифровка
+    "llm_start": 3,     # начало потока ответа
+    "llm_delta": 4,     # кусочек текста
+    "llm_end": 5,       # конец потока (usage)
+    "llm_complete": 6,  # нестриминговый ответ (память, fallback)
+    "tts": 7,           # синтезированное аудио
+    "serial": 8,        # строка от Arduino
+}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+
+
+class SessionRecorder:
+    """Дописывает записи в файл; безопасен из нескольких потоков."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.records = 0
+
+    def now(self):
+        return time.monotonic() - self._start
+
+    def record(self, kind, data=b"", meta=None, t=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8") if meta else b""
+        header = HEADER.pack(KINDS[kind], self.now() if t is None else t,
+                             len(meta_bytes), len(data))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(header)
+            self._file.write(meta_bytes)
+            self._file.write(data)
+            self.records += 1
+
+    def wrap(self, stage, backend):
+        """Движок, который пишет всё, что через него проходит."""
+        wrappers = {"stt": _RecordingSTT, "llm": _RecordingLLM, "tts": _RecordingTTS}
+        return wrappers[stage](backend, self)
+
+    def attach(self, recognizer=None, ai=None, tts=None, arduino=None):
+        """Подключить запись к компонентам станции."""
+        if recognizer is not None:
+            recognizer.recorder = self
+            recognizer.stt = self.wrap("stt", recognizer.stt)
+        if ai is not None:
+            ai.llm = self.wrap("llm", ai.llm)
+        if tts is not None:
+            tts.engine = self.wrap("tts", tts.engine)
+        if arduino is not None:
+            arduino.recorder = self
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        print(f"[Record] Записей: {self.records} → {self.path}")
+
+
+class Record:
+    __slots__ = ("kind", "t", "meta", "data")
+
+    def __init__(self, kind, t, meta, data):
+        self.kind = kind
+        self.t = t
+        self.meta = meta
+        self.data = data  # memoryview в mmap — действителен до SessionCorpus.close()
+
+    @property
+    def text(self):
+        return bytes(self.data).decode("utf-8")
+
+
+class SessionCorpus:
+    """Чтение записи сессии через mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не запись сессии (нет {MAGIC!r})")
+        self._records = list(self._parse())
+
+    def records(self, *kinds):
+        """Записи по порядку; kinds — фильтр по типу."""
+        return [r for r in self._records if not kinds or r.kind in kinds]
+
+    def summary(self):
+        counts = {}
+        for r in self._records:
+            counts[r.kind] = counts.get(r.kind, 0) + 1
+        duration = self._records[-1].t if self._records else 0.0
+        return counts, duration
+
+    def close(self):
+        self._records = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # кто-то ещё держит memoryview — закроется вместе с ним
+        self._file.close()
+
+    def _parse(self):
+        view = memoryview(self._mmap)
+        offset = len(MAGIC)
+        size = len(view)
+        while offset + HEADER.size <= size:
+            code, t, meta_len, data_len = HEADER.unpack_from(view, offset)
+            offset += HEADER.size
+            end = offset + meta_len + data_len
+            if end > size:
+                break  # запись оборвалась (станцию выключили из розетки)
+            meta = json.loads(bytes(view[offset:offset + meta_len])) if meta_len else {}
+            data = view[offset + meta_len:end]
+            yield Record(KIND_NAMES.get(code, str(code)), t, meta, data)
+            offset = end
+
+
+# === Движки-обёртки для записи ===
+
+class _RecordingBackend:
+    def __init__(self, backend, recorder):
+        self._backend = backend
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+
+class _RecordingSTT(_RecordingBackend):
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        started = time.monotonic()
+        text = self._backend.transcribe(audio, filename, language, timeout, details=details)
+        self._recorder.record("stt", text or "", {
+            "filename": filename, "latency": time.monotonic() - started, "details": details,
+        })
+        return text
+
+
+class _RecordingLLM(_RecordingBackend):
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        started = time.monotonic()
+        text = self._backend.complete(messages, model, max_tokens, temperature, timeout)
+        self._recorder.record("llm_complete", text or "", {"latency": time.monotonic() - started})
+        return text
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        recorder = self._recorder
+        started = time.monotonic()
+        recorder.record("llm_start", meta={"model": model, "max_tokens": max_tokens,
+                                           "messages": len(messages)})
+        stream = self._backend.stream(messages, model, max_tokens, temperature, timeout,
+                                      usage=usage)
+        try:
+            for delta in stream:
+                recorder.record("llm_delta", delta, {"dt": time.monotonic() - started})
+                yield delta
+        finally:
+            stream.close()
+            recorder.record("llm_end", meta={"dt": time.monotonic() - started, "usage": usage})
+
+
+class _RecordingTTS(_RecordingBackend):
+    def synthesize(self, text, voice, timeout):
+        started = time.monotonic()
+        audio = self._backend.synthesize(text, voice, timeout)
+        self._recorder.record("tts", audio or b"", {
+            "text": text, "format": self._backend.audio_format,
+            "latency": time.monotonic() - started,
+        })
+        return audio
@@ -0,0 +1,183 @@
+"""Воспроизведение записанной сессии через настоящий конвейер станции.
+
+Звук микрофона идёт в SpeechRecognizer (VAD, endpointing), расшифровки,
+поток LLM и аудио TTS — из записи с исходными задержками, строки
+Arduino — в ArduinoSerial через loop:// pyserial. Вывод звука — NullOutput
+с реальной длительностью. Так две версии кода сравниваются на одних
+и тех же входах.
+
+  python replay.py session.zrec                 — в исходном темпе
+  python replay.py session.zrec --speed 4       — в 4 раза быстрее
+  python replay.py session.zrec --speed 0       — без пауз
+  python replay.py session.zrec --live-stt      — STT настоящий (сравнить движки)
+"""
+
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+
+import backends
+import config
+from recorder import SessionCorpus
+
+
+class ReplayAudio:
+    """PyAudio-совместимый источник: каждый open() — следующая запись микрофона."""
+
+    FORMAT = 8  # pyaudio.paInt16
+
+    def __init__(self, corpus, speed, gate=None):
+        self.speed = speed
+        self.gate = gate  # gate(t) — дождаться событий Serial до этого момента записи
+        self._mics = deque(corpus.records("mic"))
+        self.opened = 0
+        self.done = threading.Event()
+
+    def open(self, rate=None, frames_per_buffer=None, **kwargs):
+        if not self._mics:
+            self.done.set()
+            return _ReplayStream(b"", rate or config.SAMPLE_RATE, None)
+        record = self._mics.popleft()
+        if self.gate is not None:
+            self.gate(record.meta.get("start", record.t))
+        self.opened += 1
+        return _ReplayStream(record.data, record.meta.get("sample_rate", rate), self.speed)
+
+    def get_sample_size(self, fmt):
+        return 2
+
+    def terminate(self):
+        pass
+
+
+class _ReplayStream:
+    def __init__(self, data, rate, speed):
+        self._data = data
+        self._offset = 0
+        self._rate = rate
+        self._speed = speed
+
+    def read(self, frames, exception_on_overflow=True):
+        size = frames * 2
+        chunk = bytes(self._data[self._offset:self._offset + size])
+        self._offset += len(chunk)
+        if chunk and self._speed:
+            time.sleep(frames / self._rate / self._speed)
+        return chunk
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SerialFeeder:
+    """Строки Arduino из записи → loop:// в момент, когда они пришли в оригинале."""
+
+    def __init__(self, corpus, arduino, speed):
+        self.arduino = arduino
+        self.speed = speed
+        self._events = deque(corpus.records("serial"))
+        self._cond = threading.Condition()
+        self._started = None
+
+    def gate(self, t):
+        """Микрофон ждёт, пока не уйдут все строки, пришедшие раньше t."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._events or self._events[0].t >= t)
+
+    def run(self, stop):
+        self._started = time.monotonic()
+        while self._events and not stop.is_set():
+            event = self._events[0]
+            if self.speed:
+                delay = event.t / self.speed - (time.monotonic() - self._started)
+                if delay > 0 and stop.wait(delay):
+                    return
+            line = bytes(event.data)
+            self.arduino.ser.write(line + b"\n")
+            if not line.startswith(b"D"):
+                # Дать _read_loop разобрать WAKE/SLEEP до следующего хода
+                time.sleep(0.1)
+            with self._cond:
+                self._events.popleft()
+                self._cond.notify_all()
+
+
+def replay(path, speed=1.0, live_stt=False):
+    """Прогнать запись через станцию. Возвращает задержки ходов (сек)."""
+    from ai import JarvisAI
+    from session import VoiceSession
+    from speech import SpeechRecognizer
+    from tts import NullOutput, TextToSpeech
+
+    corpus = SessionCorpus(path)
+    counts, duration = corpus.summary()
+    print(f"[Replay] {path}: {duration:.0f} с записи, {counts}")
+    speed = speed or None
+
+    arduino = None
+    feeder = None
+    if corpus.records("serial"):
+        try:
+            from serial_comm import ArduinoSerial
+            arduino = ArduinoSerial(port="loop://")
+            feeder = SerialFeeder(corpus, arduino, speed)
+        except ImportError:
+            print("[Replay] pyserial не установлен — без Arduino, станция всегда активна")
+
+    audio = ReplayAudio(corpus, speed, gate=feeder.gate if feeder else None)
+    stt = None if live_stt else backends.create("stt", "replay", corpus=corpus, speed=speed)
+    recognizer = SpeechRecognizer(stt=stt, audio=audio)
+    # Память не пишем в настоящий файл станции, случайные фразы — одни и те же
+    random.seed(config.REPLAY_SEED)
+    ai = JarvisAI(llm=backends.create("llm", "replay", corpus=corpus, speed=speed),
+                  memory_file=os.devnull)
+    tts = TextToSpeech(engine=backends.create("tts", "replay", corpus=corpus, speed=speed),
+                       output=NullOutput(realtime=bool(speed), speed=speed or 1.0))
+
+    recognizer.calibrate(duration=1)
+    session = VoiceSession(ai, tts, recognizer=recognizer, arduino=arduino, name="replay")
+    session.attach()
+    # Эхо динамика уже вырезано при записи — второй раз не гейтим, иначе съедим речь
+    recognizer.speaker = None
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=session.run, args=(stop,), daemon=True)]
+    if feeder:
+        threads.append(threading.Thread(target=feeder.run, args=(stop,), daemon=True))
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    audio.done.wait()
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=10)
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(session.latencies)
+    session.close()
+    corpus.close()
+
+    print(f"[Replay] Ходов: {session.stats['turns']}, игнор {session.stats['ignored']}, "
+          f"прослушиваний {audio.opened}, за {elapsed:.1f} с")
+    if latencies:
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"[Replay] Задержка хода: среднее {statistics.mean(latencies):.2f} с, "
+              f"p95 {p95:.2f} с")
+    return latencies
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print("Использование: python replay.py session.zrec [--speed N] [--live-stt]")
+        sys.exit(1)
+    speed = float(args[args.index("--speed") + 1]) if "--speed" in args else 1.0
+    replay(args[0], speed=speed, live_stt="--live-stt" in args)
@@ -0,0 +1,316 @@
+"""Единая политика retry — дедлайны хода, backoff с jitter, hedged-запросы."""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+import config
+from metrics import get_metrics
+
+# Классы ошибок, после которых есть смысл повторить запрос
+RETRYABLE = {"rate_limit", "network", "server", "unknown"}
+
+# Класс ошибки → ключ голосового сообщения в config.ERROR_MESSAGES
+ERROR_MESSAGE_KEYS = {
+    "rate_limit": "rate_limit",
+    "network": "network",
+    "server": "api_error",
+    "fatal": "api_error",
+    "unknown": "api_error",
+}
+
+
+_retries = get_metrics().counter(
+    "zhopa_retries_total", "Повторы вызовов по политике retry", ("kind", "error"))
+_hedges = get_metrics().counter(
+    "zhopa_hedges_total", "Запущенные hedged-дубликаты", ("kind",))
+_hedge_wins = get_metrics().counter(
+    "zhopa_hedge_wins_total", "Hedged-дубликат ответил раньше первого запроса", ("kind",))
+_failures = get_metrics().counter(
+    "zhopa_call_failures_total", "Вызовы, упавшие после всех повторов", ("kind", "error"))
+
+
+class Deadline:
+    """Бюджет времени на ход: сколько ещё можно потратить на retry."""
+
+    def __init__(self, budget, start=None):
+        self.budget = budget
+        self.start = start if start is not None else time.monotonic()
+        self.expires = self.start + budget
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def classify_error(error):
+    """Класс ошибки по типу исключения SDK: rate_limit, network, server, fatal, unknown."""
+    try:
+        import openai
+    except ImportError:
+        openai = None
+
+    if openai is not None:
+        if isinstance(error, openai.RateLimitError):
+            return "rate_limit"
+        # APITimeoutError — подкласс APIConnectionError
+        if isinstance(error, openai.APIConnectionError):
+            return "network"
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code >= 500 or error.status_code in (408, 409):
+                return "server"
+            return "fatal"
+
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+
+    # Обрыв посреди streaming — исключения httpx доходят как есть
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return "network"
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return "network"
+    return "unknown"
+
+
+def error_message(error):
+    """Фраза для голосового фидбека по ошибке."""
+    key = ERROR_MESSAGE_KEYS[classify_error(error)]
+    return config.ERROR_MESSAGES.get(key, config.ERROR_MESSAGES["api_error"])
+
+
+class SlotBusy(TimeoutError):
+    """Дубликат не отправлен: свободного слота транспорта нет."""
+
+
+class Attempt:
+    """Одна попытка hedged-вызова: кто ответил первым, отменяет остальных.
+
+    hedge=True — это дубликат: транспорт не ждёт для него слот, а сразу
+    бросает SlotBusy, если все слоты заняты.
+    """
+
+    def __init__(self, hedge=False):
+        self.hedge = hedge
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+_attempt = threading.local()
+
+
+def current_attempt():
+    """Attempt, внутри которой работает этот поток (None — вызов без hedging)."""
+    return getattr(_attempt, "value", None)
+
+
+class LatencyTracker:
+    """Скользящее окно латентностей успешных вызовов."""
+
+    def __init__(self, window=None):
+        self._samples = deque(maxlen=window or config.LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """p-й перцентиль или None, пока данных мало."""
+        with self._lock:
+            if len(self._samples) < config.HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class RetryPolicy:
+    """Retry с экспоненциальным backoff + jitter, учётом дедлайна и hedging.
+
+    fn получает один аргумент — таймаут попытки в секундах.
+    """
+
+    def __init__(self, kind, max_attempts=2, base_delay=0.5, max_delay=4.0, hedge=False):
+        self.kind = kind
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.timeout = config.HTTP_TIMEOUTS.get(kind, config.HTTP_TIMEOUTS["chat"])
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedges_skipped": 0,
+                      "hedge_wins": 0, "failures": 0}
+        self._stats_lock = threading.Lock()  # политика общая на все станции
+
+    def call(self, fn, deadline=None, previous_error=None):
+        """Выполнить fn с retry. previous_error — первая попытка уже упала снаружи."""
+        self._count("calls")
+        attempt = 0
+        if previous_error is not None:
+            attempt = 1
+            self._backoff(previous_error, attempt, deadline)
+
+        while True:
+            try:
+                return self._attempt(fn, deadline, first=attempt == 0)
+            except Exception as e:
+                attempt += 1
+                self._backoff(e, attempt, deadline)
+
+    # === Внутренние методы ===
+
+    def _attempt(self, fn, deadline, first):
+        timeout = self.timeout
+        # Первая попытка всегда получает полный таймаут, retry — только остаток бюджета
+        if deadline is not None and not first:
+            timeout = min(timeout, deadline.remaining())
+
+        p95 = self.latency.percentile(95) if self.hedge else None
+        started = time.monotonic()
+        if p95 is None or p95 >= timeout:
+            result = fn(timeout)
+        else:
+            result = self._hedged(fn, timeout, p95)
+        self.latency.add(time.monotonic() - started)
+        return result
+
+    def _hedged(self, fn, timeout, p95):
+        """Если первый запрос дольше p95 — запускаем дубликат, берём кто быстрее.
+
+        Дубликат уходит, только если у транспорта есть свободный слот —
+        иначе ждём первый запрос. Проигравшую попытку отменяем: ещё не
+        начатая не стартует, идущая дорабатывает в своём потоке и держит
+        слот, пока запрос действительно не вернётся.
+        """
+        attempts = {}
+
+        def submit(attempt_timeout, hedge=False):
+            attempt = Attempt(hedge)
+            future = _spawn(attempt, fn, attempt_timeout)
+            attempts[future] = attempt
+            return future
+
+        first = submit(timeout)
+        done, _ = wait([first], timeout=p95)
+        if done:
+            return first.result()
+
+        second = submit(max(0.1, timeout - p95), hedge=True)
+        pending = {first, second}
+        error = None
+        skipped = False
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        if future is second:
+                            self._count("hedge_wins")
+                            _hedge_wins.inc(self.kind)
+                        return future.result()
+                    if isinstance(future.exception(), SlotBusy):
+                        skipped = True  # дубликат не ушёл — ждём первый
+                        continue
+                    error = future.exception()
+        finally:
+            for future in pending:
+                future.cancel()
+                attempts[future].cancel()
+            if skipped:
+                self._count("hedges_skipped")
+            else:
+                self._count("hedges")
+                _hedges.inc(self.kind)
+        raise error or TimeoutError(f"{self.kind}: hedged-запрос не уложился в {timeout:.1f}с")
+
+    def _backoff(self, error, attempt, deadline):
+        """Решить, повторять ли; подождать или пробросить ошибку."""
+        error_class = classify_error(error)
+        if error_class not in RETRYABLE or attempt >= self.max_attempts:
+            self._count("failures")
+            _failures.inc(self.kind, error_class)
+            raise error
+
+        delay = self._delay(attempt, error)
+        if deadline is not None and deadline.remaining() < delay + config.RETRY_MIN_ATTEMPT_SEC:
+            print(f"[Retry] {self.kind}: бюджет хода исчерпан, не повторяю")
+            self._count("failures")
+            _failures.inc(self.kind, error_class)
+            raise error
+
+        self._count("retries")
+        _retries.inc(self.kind, error_class)
+        print(f"[Retry] {self.kind}: {error_class}, попытка {attempt + 1} через {delay:.2f}с")
+        time.sleep(delay)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _delay(self, attempt, error):
+        """Экспоненциальный backoff с jitter: от половины до полного base * 2^(n-1)."""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(cap / 2, cap)
+        # Rate limit: сервер сам говорит, сколько ждать
+        response = getattr(error, "response", None)
+        retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_delay))
+            except ValueError:
+                pass
+        return delay
+
+
+def _run_attempt(attempt, fn, timeout):
+    if attempt.cancelled:
+        raise TimeoutError("попытка отменена")
+    _attempt.value = attempt
+    try:
+        return fn(timeout)
+    finally:
+        _attempt.value = None
+
+
+def _spawn(attempt, fn, timeout):
+    """Попытка в своём потоке: зависший проигравший не занимает общий пул,
+    и первый запрос следующего вызова не ждёт в очереди за ним."""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = _run_attempt(attempt, fn, timeout)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+_policies_lock = threading.Lock()
+_policies = {}
+
+
+def get_policy(kind):
+    """Общая политика для типа вызова: stt, chat, tts."""
+    with _policies_lock:
+        if kind not in _policies:
+            _policies[kind] = RetryPolicy(kind, **config.RETRY_POLICIES[kind])
+        return _policies[kind]
@@ -0,0 +1,124 @@
+"""Выбор модели и лимитов генерации под каждую команду — локально, без запросов.
+
+SYSTEM_PROMPT просит одно предложение на простой вопрос, но раньше каждый
+запрос шёл с max_tokens=300: модель иногда договаривала лишнее, а станция
+ждала и озвучивала. Теперь команда классифицируется по длине, виду вопроса
+и состоянию диалога (уточнение к прошлому ответу), маршрут из
+config.GPT_ROUTES задаёт модель, max_tokens и предел предложений, после
+которого ask_stream закрывает поток.
+
+Решения и итоговые TTFT / полное время пишутся в лог ([Route]) и, если
+задан config.ROUTE_LOG_FILE, в JSONL — по нему подбираются пороги.
+"""
+
+import json
+import re
+import threading
+from collections import deque
+
+import config
+from text import normalize
+
+# Просьба рассказать подробно или вопрос, на который одним предложением не ответить
+LONG_PATTERN = re.compile(
+    r"\b(?:расскажи|объясни|опиши|почему|зачем|как работает|как устроен|что такое|кто такой"
+    r"|в чем разница|сравни|история|подробн\w*|придумай|сочини)\b"
+)
+# Приветствия и болтовня — хватит одной фразы
+SHORT_PATTERN = re.compile(
+    r"^(?:привет\w*|здорово|здравствуй\w*|хай|как дела|как ты|кто ты|ты кто|спасибо|пока"
+    r"|тебя позвали.*|молодец|круто|да|нет|ок|окей)$"
+)
+# Уточнение к прошлому ответу — продолжаем развёрнуто
+FOLLOW_UP_PATTERN = re.compile(r"^(?:а )?(?:еще|подробнее|дальше|продолжай|и что|а потом)\b")
+
+
+class Route:
+    __slots__ = ("name", "model", "max_tokens", "max_sentences", "reason")
+
+    def __init__(self, name, reason):
+        spec = config.GPT_ROUTES[name]
+        self.name = name
+        self.model = spec["model"]
+        self.max_tokens = spec["max_tokens"]
+        self.max_sentences = spec["max_sentences"]
+        self.reason = reason
+
+    def __repr__(self):
+        return (f"{self.name} ({self.reason}): {self.model}, {self.max_tokens} ток., "
+                f"≤{self.max_sentences} предл.")
+
+
+class ModelRouter:
+    """Команда → Route; копит TTFT и полное время по маршрутам."""
+
+    def __init__(self, log_file=None, echo=True):
+        self.log_file = log_file or config.ROUTE_LOG_FILE
+        self.echo = echo  # False — не печатать [Route]: текстовый режим печатает токены в ту же строку
+        self._lock = threading.Lock()
+        self._samples = {name: deque(maxlen=500) for name in config.GPT_ROUTES}
+        self.stats = {name: {"turns": 0, "truncated": 0} for name in config.GPT_ROUTES}
+
+    def choose(self, command, history=()):
+        """history — сообщения диалога до этой команды."""
+        norm = normalize(command)
+        words = len(norm.split())
+        answered = any(m["role"] == "assistant" for m in history)
+
+        if answered and FOLLOW_UP_PATTERN.search(norm):
+            route = Route("long", "уточнение")
+        elif LONG_PATTERN.search(norm):
+            route = Route("long", "развёрнутый вопрос")
+        elif words > config.ROUTE_LONG_WORDS:
+            route = Route("long", f"{words} слов")
+        elif SHORT_PATTERN.match(norm):
+            route = Route("short", "болтовня")
+        elif words <= config.ROUTE_SHORT_WORDS:
+            route = Route("short", f"{words} слов")
+        else:
+            route = Route("normal", f"{words} слов")
+        if self.echo:
+            print(f"[Route] {route!r}")
+        return route
+
+    def record(self, route, command, stats):
+        """Итог хода по маршруту: stats — JarvisAI.last_stats."""
+        ttft, total = stats.get("ttft"), stats.get("total")
+        with self._lock:
+            st = self.stats[route.name]
+            st["turns"] += 1
+            st["truncated"] += int(stats.get("truncated", False))
+            if ttft is not None and total is not None:
+                self._samples[route.name].append((ttft, total))
+
+        ttft_text = f"{ttft:.2f} с" if ttft is not None else "—"
+        total_text = f"{total:.2f} с" if total is not None else "—"
+        cut = ", поток закрыт досрочно" if stats.get("truncated") else ""
+        if self.echo:
+            print(f"[Route] {route.name}: TTFT {ttft_text}, всего {total_text}, "
+                  f"токенов {stats.get('completion_tokens')}{cut}")
+
+        if self.log_file:
+            entry = {"command": command, "route": route.name, "reason": route.reason,
+                     "model": route.model, "max_tokens": route.max_tokens,
+                     "max_sentences": route.max_sentences, **stats}
+            try:
+                with self._lock, open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"[Route] Не записать лог: {e}")
+
+    def summary(self):
+        parts = []
+        for name, st in self.stats.items():
+            if not st["turns"]:
+                continue
+            line = f"{name} {st['turns']}"
+            samples = list(self._samples[name])
+            if samples:
+                ttft = sorted(s[0] for s in samples)[len(samples) // 2]
+                total = sorted(s[1] for s in samples)[len(samples) // 2]
+                line += (f" (TTFT p50 {ttft:.2f} с, всего p50 {total:.2f} с, "
+                         f"обрезано {st['truncated']})")
+            parts.append(line)
+        return ", ".join(parts) or "—"
@@ -7,10 +7,15 @@ import serial
 import serial.tools.list_ports
 
 import config
+from approach import ApproachTracker, parse_distance
+from metrics import get_metrics
+
+_reconnects = get_metrics().counter(
+    "zhopa_serial_reconnects_total", "Попытки переподключения к Arduino", ("outcome",))
 
 
 class ArduinoSerial:
-    """Управление связью с Arduino: отправка команд, приём WAKE/SLEEP."""
+    """Управление связью с Arduino: отправка команд, приём WAKE/SLEEP и расстояния."""
 
     def __init__(self, port=None):
         self.baud_rate = config.BAUD_RATE
@@ -19,8 +24,11 @@ class ArduinoSerial:
         self._reader_thread = None
         self._on_wake = None
         self._on_sleep = None
+        self._on_approach = None
+        self.approach = ApproachTracker()
         self._port = port
         self._reconnect_lock = threading.Lock()
+        self.recorder = None  # SessionRecorder — пишет строки от Arduino
 
         if port:
             self._connect(port)
@@ -45,14 +53,21 @@ class ArduinoSerial:
     def _connect(self, port):
         """Подключение к порту."""
         try:
-            self.ser = serial.Serial(port, self.baud_rate, timeout=1)
+            self.ser = self._open(port)
             self._port = port
-            time.sleep(2)  # ждём перезагрузку Arduino
             print(f"[Serial] Подключено к {port}")
         except serial.SerialException as e:
             print(f"[Serial] Ошибка подключения к {port}: {e}")
             self.ser = None
 
+    def _open(self, port):
+        """Порт или URL pyserial (loop://, socket://...) — для replay и тестов."""
+        if "://" in port:
+            return serial.serial_for_url(port, self.baud_rate, timeout=1)
+        ser = serial.Serial(port, self.baud_rate, timeout=1)
+        time.sleep(2)  # ждём перезагрузку Arduino
+        return ser
+
     def _reconnect(self):
         """Попытка переподключения."""
         with self._reconnect_lock:
@@ -67,12 +82,15 @@ class ArduinoSerial:
             except Exception:
                 pass
             try:
-                self.ser = serial.Serial(port, self.baud_rate, timeout=1)
-                time.sleep(2)
+                self.ser = self._open(port)
                 print(f"[Serial] Переподключено к {port}")
+                _reconnects.inc("ok")
+                if self._running:
+                    self._request_distance(True)  # Arduino перезагрузилась — поток выключен
                 return True
             except serial.SerialException:
                 self.ser = None
+                _reconnects.inc("failed")
                 return False
 
     @property
@@ -82,12 +100,27 @@ class ArduinoSerial:
         except Exception:
             return False
 
+    def status(self):
+        """Проверка здоровья: (ok, подробности)."""
+        if self.connected:
+            return True, f"подключена ({self._port})"
+        return False, f"нет связи ({self._port or 'порт не найден'})"
+
     def on_wake(self, callback):
         self._on_wake = callback
 
     def on_sleep(self, callback):
         self._on_sleep = callback
 
+    def on_approach(self, callback):
+        """callback(distance_cm, eta_sec) — к станции идут, WAKE ещё не было."""
+        self._on_approach = callback
+
+    @property
+    def distance(self):
+        """Последнее расстояние, см (None — никого или нет потока)."""
+        return self.approach.distance
+
     def start_reading(self):
         """Запуск фонового потока чтения Serial."""
         if not self.connected:
@@ -96,6 +129,7 @@ class ArduinoSerial:
         self._running = True
         self._reader_thread = threading.Thread(target=self._read_loop, daemon=True)
         self._reader_thread.start()
+        self._request_distance(True)
 
     def stop_reading(self):
         self._running = False
@@ -116,7 +150,11 @@ class ArduinoSerial:
                     line = self.ser.readline().decode("utf-8", errors="ignore").strip()
                     if not line:
                         continue
-                    if line == "WAKE" and self._on_wake:
+                    if self.recorder is not None:
+                        self.recorder.record("serial", line)
+                    if line.startswith("D"):
+                        self._handle_distance(line)
+                    elif line == "WAKE" and self._on_wake:
                         self._on_wake()
                     elif line == "SLEEP" and self._on_sleep:
                         self._on_sleep()
@@ -133,6 +171,18 @@ class ArduinoSerial:
                 self.ser = None
                 time.sleep(3)
 
+    def _handle_distance(self, line):
+        """D<см> — замер дальномера; при подходе — on_approach."""
+        cm = parse_distance(line)
+        if cm is None:
+            return
+        if self.approach.update(cm, time.monotonic()) and self._on_approach:
+            self._on_approach(cm, self.approach.eta)
+
+    def _request_distance(self, enabled):
+        if config.DISTANCE_STREAM:
+            self.send("D1" if enabled else "D0")
+
     def send(self, command):
         """Отправка команды на Arduino (graceful — не падает при потере)."""
         if not self.connected:
@@ -184,6 +234,8 @@ class ArduinoSerial:
         self.send("BL")
 
     def close(self):
+        if self._running:
+            self._request_distance(False)
         self.stop_reading()
         if self.ser and self.ser.is_open:
             self.ser.close()
@@ -0,0 +1,255 @@
+"""Сервер станций — несколько киосков с Arduino в одном процессе.
+
+У каждой станции своя сессия: история, память, Serial-порт, микрофон
+и динамик. Общие на всех: HTTP-пул с лимитом вызовов API, кэш TTS
+и пул потоков hedged-запросов.
+
+Запуск:
+  python main.py --server                       — станции из config.STATIONS
+  python server.py --simulate 8                 — офлайн нагрузочный тест
+  python server.py --simulate 8 --turns 30 --backend null --interval 0.2
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import config
+from ai import JarvisAI
+from intents import FIXED_REPLIES
+from session import VoiceSession
+from startup import Startup
+from transport import get_transport
+
+SIMULATED_PHRASES = [
+    "жопа, как дела?",
+    "жопа, кто ты?",
+    "жопа, расскажи про Python",
+    "жопа, дай совет на день",
+    "ну и погода сегодня",  # без имени — должно игнорироваться
+]
+
+
+class KioskServer:
+    """N станций в одном процессе, каждая в своём потоке."""
+
+    def __init__(self, stations, simulated=False):
+        shared = [s["name"] for s in stations if s.get("output_device") is None]
+        if not simulated and len(shared) > 1:
+            # Без output_device станция играет через pygame.mixer — он один на процесс,
+            # и stop() одной станции (перебивание, SLEEP) оборвал бы звук всех
+            raise ValueError(f"станции {', '.join(shared)} без output_device делили бы "
+                             f"один pygame.mixer — укажи output_device всем, кроме одной")
+        self.specs = stations
+        self.simulated = simulated
+        self.transport = get_transport()
+        self.sessions = []
+        self._stop = threading.Event()
+        self._threads = []
+        self._memory_dir = tempfile.mkdtemp(prefix="zhopa_sim_") if simulated else None
+
+    def start(self):
+        """Поднять все станции параллельно и запустить их циклы."""
+        startup = Startup()
+        for spec in self.specs:
+            startup.add(spec["name"], lambda _, spec=spec: self._build_session(spec))
+        ready = startup.run()
+        startup.report()
+
+        for spec in self.specs:
+            session = ready[spec["name"]]
+            session.attach()
+            self.sessions.append(session)
+            thread = threading.Thread(
+                target=self._run_session, args=(session,),
+                name=f"station-{spec['name']}", daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._prefetch, name="prefetch", daemon=True).start()
+        print(f"[Сервер] Станций запущено: {len(self.sessions)}")
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for session in self.sessions:
+            session.close()
+        self.transport.close()
+
+    def wait_idle(self, timeout=None):
+        """Ждать, пока все очереди станций опустеют (для симуляции)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while not all(s.idle for s in self.sessions):
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def report(self):
+        """Сводка по станциям и общим ресурсам."""
+        from tts import get_tts_cache
+
+        all_latencies = []
+        for session in self.sessions:
+            lat = sorted(session.latencies)
+            all_latencies.extend(lat)
+            p50 = _percentile(lat, 50)
+            p95 = _percentile(lat, 95)
+            st = session.stats
+            print(f"[Сервер] {session.name}: ходов {st['turns']}, игнор {st['ignored']}, "
+                  f"отброшено {st['dropped']}, макс. очередь {st['max_queue']}, филлеров {st['fillers']}, "
+                  f"p50 {p50:.2f} с, p95 {p95:.2f} с")
+            gate = getattr(session.recognizer, "gate", None)
+            if gate is not None:
+                print(f"[Сервер] {session.name}: фильтр STT — {gate.summary()}")
+            print(f"[Сервер] {session.name}: команды — {session.router.summary(st['turns'])}")
+            print(f"[Сервер] {session.name}: маршруты GPT — {session.ai.router.summary()}")
+            if st["approaches"]:
+                print(f"[Сервер] {session.name}: датчик — {session.approach_summary()}")
+
+        if all_latencies:
+            all_latencies.sort()
+            print(f"[Сервер] Всего фраз: {len(all_latencies)}, "
+                  f"среднее {statistics.mean(all_latencies):.2f} с, "
+                  f"p95 {_percentile(all_latencies, 95):.2f} с")
+        cache = get_tts_cache()
+        print(f"[Сервер] Кэш TTS: {len(cache)} фраз, попаданий {cache.hits}, промахов {cache.misses}")
+        print(f"[HTTP] {self.transport.summary()}")
+
+    # === Внутренние методы ===
+
+    def _build_session(self, spec):
+        from tts import NullOutput, TextToSpeech, get_tts_cache
+
+        name = spec["name"]
+        ai = JarvisAI(transport=self.transport, memory_file=self._memory_file(name))
+
+        if self.simulated:
+            tts = TextToSpeech(transport=self.transport, cache=get_tts_cache(),
+                               output=NullOutput(realtime=True))
+            return VoiceSession(ai, tts, transport=self.transport, name=name)
+
+        import backends
+        from serial_comm import ArduinoSerial
+        from speech import SpeechRecognizer
+        from tts import DeviceOutput
+
+        output = None
+        engine = None
+        if spec.get("output_device") is not None:
+            # У pygame одно устройство на процесс — своим динамикам нужен pcm через PyAudio
+            output = DeviceOutput(spec["output_device"])
+            engine = backends.create("tts", transport=self.transport, audio_format="pcm")
+        tts = TextToSpeech(engine=engine, transport=self.transport,
+                           cache=get_tts_cache(), output=output)
+
+        recognizer = SpeechRecognizer(language="ru", transport=self.transport,
+                                      input_device=spec.get("input_device"))
+        recognizer.calibrate(duration=1)
+        arduino = ArduinoSerial(port=spec.get("port"))
+        if not arduino.connected:
+            print(f"[Сервер] {name}: Arduino не подключена — станция всегда активна")
+
+        return VoiceSession(ai, tts, recognizer=recognizer, arduino=arduino,
+                            transport=self.transport, name=name)
+
+    def _prefetch(self):
+        """Приветствия и филлеры — в общий кэш; у станций с тем же форматом это попадания."""
+        phrases = config.WAKE_GREETINGS + config.FILLER_PHRASES + FIXED_REPLIES
+        for session in self.sessions:
+            session.tts.prefetch(phrases)
+
+    def _memory_file(self, name):
+        """Своя память у каждой станции."""
+        if self._memory_dir:
+            return os.path.join(self._memory_dir, f"{name}.json")
+        base, ext = os.path.splitext(config.MEMORY_FILE)
+        return f"{base}.{name}{ext}"
+
+    def _run_session(self, session):
+        try:
+            session.run(stop=self._stop)
+        except Exception as e:
+            print(f"[Сервер] {session.name}: станция упала: {e}")
+
+
+def _percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def run_server():
+    """Станции из config.STATIONS."""
+    if not config.STATIONS:
+        print("[Сервер] config.STATIONS пуст — добавь станции")
+        return
+
+    try:
+        server = KioskServer(config.STATIONS)
+    except ValueError as e:
+        print(f"[Сервер] {e}")
+        return
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n[Сервер] Выключаюсь...")
+    finally:
+        server.report()
+        server.stop()
+
+
+def run_simulation(stations=4, turns=20, backend="local", interval=0.5):
+    """Офлайн нагрузочный тест: N станций без железа и без сети."""
+    for stage in config.BACKENDS:
+        config.BACKENDS[stage] = backend
+
+    specs = [{"name": f"sim{i + 1}"} for i in range(stations)]
+    server = KioskServer(specs, simulated=True)
+    server.start()
+
+    started = time.monotonic()
+
+    def visitor(session):
+        for _ in range(turns):
+            session.submit(random.choice(SIMULATED_PHRASES))
+            time.sleep(interval * random.uniform(0.5, 1.5))
+
+    visitors = [threading.Thread(target=visitor, args=(s,), daemon=True) for s in server.sessions]
+    for v in visitors:
+        v.start()
+    for v in visitors:
+        v.join()
+    server.wait_idle(timeout=120)
+
+    elapsed = time.monotonic() - started
+    print(f"\n[Сервер] Симуляция: {stations} станций × {turns} фраз за {elapsed:.1f} с "
+          f"(движки: {backend}, лимит API: {config.UPSTREAM_CONCURRENCY})")
+    server.report()
+    server.stop()
+
+
+def _arg(args, name, default, cast):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--simulate" in args:
+        run_simulation(
+            stations=_arg(args, "--simulate", 4, int),
+            turns=_arg(args, "--turns", 20, int),
+            backend=_arg(args, "--backend", "local", str),
+            interval=_arg(args, "--interval", 0.5, float),
+        )
+    else:
+        run_server()
@@ -0,0 +1,375 @@
+"""Сессия станции — микрофон + ИИ + голос + Arduino одного киоска.
+
+Голосовой режим — одна сессия; сервер станций — несколько сессий
+в одном процессе с общим HTTP-пулом и кэшем TTS.
+"""
+
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import config
+from ai import split_sentences
+from intents import IntentRouter
+from metrics import get_metrics
+from playback import PRIORITY_GREETING
+from retry import Deadline
+from text import contains_wake_word, strip_wake_word
+from transport import get_transport
+
+_phrases = get_metrics().counter(
+    "zhopa_phrases_total",
+    "Фразы станции: turn — с именем, ignored — без имени, dropped — очередь полна",
+    ("station", "result"))
+_turn_seconds = get_metrics().histogram(
+    "zhopa_turn_seconds", "От конца фразы до конца ответа", ("station",))
+_queue_depth = get_metrics().gauge(
+    "zhopa_queue_depth", "Очереди станции: text — фразы, synth — синтез, audio — вывод звука",
+    ("station", "queue"))
+_awake = get_metrics().gauge("zhopa_awake", "Станция проснулась (1) или спит (0)", ("station",))
+_serial_connected = get_metrics().gauge(
+    "zhopa_serial_connected", "Связь с Arduino есть (1) или нет (0)", ("station",))
+
+
+class VoiceSession:
+    """Один киоск: своя история, память, Serial-порт и аудиоустройства."""
+
+    def __init__(self, ai, tts, recognizer=None, arduino=None, transport=None, name=None):
+        self.ai = ai
+        self.tts = tts
+        self.recognizer = recognizer
+        self.arduino = arduino
+        self.transport = transport or get_transport()
+        self.name = name
+        self._tag = f"[{name}] " if name else ""
+        self._station = name or "main"  # метка в метриках
+        self.router = IntentRouter(ai, tts)
+
+        self.is_awake = threading.Event()
+        self._keepalive = False
+        self._texts = queue.Queue(maxsize=config.STATION_QUEUE_SIZE)
+        self._busy = threading.Event()
+        self._approach = None  # (время, приветствие) — к станции идут, WAKE ещё не было
+
+        self.latencies = deque(maxlen=500)  # сек от фразы до конца ответа
+        self.stats = {"turns": 0, "ignored": 0, "dropped": 0, "max_queue": 0, "fillers": 0,
+                      "approaches": 0, "predicted_wakes": 0, "approach_lead": 0.0}
+
+    @property
+    def has_arduino(self):
+        return self.arduino is not None and self.arduino.connected
+
+    def attach(self):
+        """Подписка на датчик и анимации; без Arduino — всегда активен."""
+        if self.recognizer is not None:
+            # Пока говорит динамик, микрофон не пишет — своё приветствие не распознаём
+            self.recognizer.speaker = self.tts.scheduler
+
+        if self.has_arduino:
+            self.arduino.on_wake(self.on_wake)
+            self.arduino.on_sleep(self.on_sleep)
+            self.arduino.on_approach(self.on_approach)
+            self.arduino.start_reading()
+
+            # Анимация рта привязана к TTS
+            self.tts.on_start(lambda: self.arduino.start_talking_animation())
+            self.tts.on_end(lambda: self.arduino.stop_animation())
+        else:
+            self._set_awake(True)
+        self._watch_metrics()
+
+    # === События датчика ===
+
+    def on_approach(self, distance, eta):
+        """Человек идёт к станции — греем соединения и приветствие, пока он идёт."""
+        if self.is_awake.is_set():
+            return
+        eta_text = f", у станции через ~{eta:.1f} с" if eta is not None else ""
+        print(f"\n{self._tag}[Датчик] Кто-то идёт: {distance} см{eta_text}")
+        greeting = random.choice(config.WAKE_GREETINGS)
+        self._approach = (time.monotonic(), greeting)
+        self.stats["approaches"] += 1
+        self.transport.warmup(background=True)
+        # Обычно уже в кэше; если вытеснено — синтез успеет до WAKE
+        threading.Thread(target=self.tts.prefetch, args=([greeting],), daemon=True).start()
+
+    def on_wake(self):
+        if self.is_awake.is_set():
+            return
+        print(f"\n{self._tag}[Датчик] Кто-то подошёл!")
+        greeting = random.choice(config.WAKE_GREETINGS)
+        approach = self._approach
+        lead = self._approach_lead(approach)
+        if lead is not None:
+            greeting = approach[1]
+            self.stats["predicted_wakes"] += 1
+            self.stats["approach_lead"] += lead
+            print(f"{self._tag}[Датчик] Подход замечен за {lead:.1f} с до WAKE")
+        self._set_awake(True)
+        # Звук пробуждения + приветствие — в очереди вывода, уступают ответу
+        self.tts.play_wake_sound()
+        self.tts.speak(greeting, priority=PRIORITY_GREETING)
+
+    def on_sleep(self):
+        print(f"\n{self._tag}[Датчик] Ушёл. Засыпаю...")
+        self._set_awake(False)
+        self.ai.clear_history()  # сохраняет память и чистит историю
+        self.tts.play_sleep_sound()  # обрывает недоговорённый ответ
+
+    def approach_summary(self):
+        st = self.stats
+        lead = st["approach_lead"] / st["predicted_wakes"] if st["predicted_wakes"] else 0.0
+        return (f"подходов {st['approaches']}, из них до WAKE {st['predicted_wakes']}, "
+                f"фора в среднем {lead:.1f} с")
+
+    # === Ввод без микрофона (симуляция, нагрузочные тесты) ===
+
+    def submit(self, text):
+        """Поставить фразу в очередь станции. False — очередь полна (backpressure)."""
+        try:
+            self._texts.put_nowait((text, time.monotonic()))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            _phrases.inc(self._station, "dropped")
+            return False
+        self.stats["max_queue"] = max(self.stats["max_queue"], self._texts.qsize())
+        return True
+
+    @property
+    def idle(self):
+        return self._texts.empty() and not self._busy.is_set()
+
+    # === Главный цикл ===
+
+    def run(self, stop=None):
+        """Цикл станции: ждём пробуждения → слушаем → отвечаем."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            # Ждём пробуждения от датчика
+            if not self.is_awake.is_set():
+                self.is_awake.wait(timeout=1)
+                continue
+
+            text, started = self._next_text()
+            if text is None:
+                if self.has_arduino:
+                    self.arduino.mouth_closed()
+                continue
+
+            self._busy.set()
+            try:
+                self.handle_text(text, deadline=Deadline(config.TURN_BUDGET_SEC, start=started))
+                latency = time.monotonic() - started
+                self.latencies.append(latency)
+                _turn_seconds.observe(latency, self._station)
+            finally:
+                self._busy.clear()
+
+    def handle_text(self, text, deadline=None):
+        """Один ход: wake-word → beep → команда → streaming-ответ. Возвращает ответ."""
+        print(f"\n{self._tag}[Mic] {text}")
+
+        # Проверяем wake-word
+        if not contains_wake_word(text):
+            print(f"{self._tag}[...] Нет имени — игнорирую")
+            self.stats["ignored"] += 1
+            _phrases.inc(self._station, "ignored")
+            if self.has_arduino:
+                self.arduino.mouth_closed()
+            return None
+
+        self.stats["turns"] += 1
+        _phrases.inc(self._station, "turn")
+
+        # Beep — подтверждение что услышал
+        self.tts.play_beep()
+        if self.has_arduino:
+            self.arduino.blink_confirm()
+
+        # Извлекаем команду
+        command = strip_wake_word(text)
+
+        # Локальные команды (время, «повтори», громкость, выход) — без GPT
+        routed = self.router.route(command)
+        if routed is not None:
+            return self.answer_locally(*routed, deadline=deadline)
+
+        # Если сказали просто "ЖОПА" без команды
+        if not command or len(command) < 2:
+            command = "тебя позвали, ответь коротко что ты тут"
+
+        return self.respond(command, deadline=deadline)
+
+    def answer_locally(self, intent, answer, deadline=None):
+        """Ответ без GPT; постоянные фразы звучат из кэша TTS."""
+        print(f"{self._tag}[Intent] {intent}")
+        sentences = split_sentences(answer)
+        offline = all(self.tts.is_cached(s) for s in sentences)
+        for i, sentence in enumerate(sentences):
+            self.tts.speak_chunk(sentence, is_first=i == 0)
+        if sentences:
+            self.tts.end_chunks().result()
+
+        if intent == "exit" and self.has_arduino:
+            self.arduino.sleep_mode()
+            self._set_awake(False)
+            self.ai.clear_history()
+
+        self.router.record(intent, deadline.elapsed() if deadline else 0.0, offline)
+        return answer
+
+    def respond(self, command, deadline=None):
+        """AI ответ — STREAMING: каждое предложение сразу уходит на синтез и в очередь.
+
+        Если первое предложение не готово за FILLER_AFTER_SEC — звучит
+        короткий филлер из кэша, ответ встаёт в очередь сразу за ним.
+        """
+        if self.has_arduino:
+            self.arduino.mouth_closed()
+
+        full_answer = ""
+        is_first = True
+        first_lock = threading.Lock()
+        filler = {"answered": False, "played": False}
+
+        def play_filler():
+            with first_lock:
+                if filler["answered"]:
+                    return
+                if self.tts.speak_cached(random.choice(config.FILLER_PHRASES)) is not None:
+                    filler["played"] = True
+                    self.stats["fillers"] += 1
+
+        timer = None
+        if config.FILLER_PHRASES:
+            timer = threading.Timer(config.FILLER_AFTER_SEC, play_filler)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            for sentence in self.ai.ask_stream(command, deadline=deadline):
+                if not self.is_awake.is_set():
+                    break  # человек ушёл — звук засыпания уже оборвал ответ
+                if is_first:
+                    # Под локом: филлер либо уже в очереди перед ответом, либо не прозвучит
+                    with first_lock:
+                        filler["answered"] = True
+                        self.tts.speak_chunk(sentence, is_first=not filler["played"])
+                else:
+                    self.tts.speak_chunk(sentence)
+                is_first = False
+                full_answer += sentence + " "
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        # Ждём, пока договорит: следующий ход начинается после ответа
+        with first_lock:
+            filler["answered"] = True
+            spoke = not is_first or filler["played"]
+        if spoke:
+            self.tts.end_chunks().result()
+
+        # Эмоция на дисплее
+        if self.has_arduino and full_answer:
+            emotion = self.ai.detect_emotion(full_answer)
+            if emotion:
+                self.arduino.set_emotion(emotion)
+
+        if self.has_arduino:
+            self.arduino.mouth_closed()
+
+        return full_answer.strip()
+
+    def audio_status(self):
+        """Проверка здоровья: вывод звука и микрофон станции."""
+        ok, detail = self.tts.status()
+        details = [f"вывод: {detail}"]
+        if self.recognizer is not None:
+            mic_ok, mic = self.recognizer.status()
+            ok = ok and mic_ok
+            details.append(f"микрофон: {mic}")
+        return ok, "; ".join(details)
+
+    def close(self):
+        self._unwatch_metrics()
+        self._set_awake(False)
+        if self.has_arduino:
+            self.arduino.stop_animation()
+            self.arduino.sleep_mode()
+            time.sleep(0.3)
+            self.arduino.close()
+        if self.recognizer is not None:
+            self.recognizer.close()
+        self.tts.close()
+
+    # === Внутренние методы ===
+
+    def _next_text(self):
+        """Следующая фраза: с микрофона или из очереди. (None, _) — ничего."""
+        if self.recognizer is None:
+            try:
+                return self._texts.get(timeout=1)
+            except queue.Empty:
+                return None, None
+
+        if self.has_arduino:
+            self.arduino.start_listening_animation()
+        text = self.recognizer.listen()
+        deadline = self.recognizer.turn_deadline
+        return text, deadline.start if deadline else time.monotonic()
+
+    def _check_name(self, check):
+        return f"{self.name}.{check}" if self.name else check
+
+    def _watch_metrics(self):
+        """Глубины очередей и проверки станции — считаются только при запросе."""
+        station = self._station
+        _queue_depth.track(self._texts.qsize, station, "text")
+        _queue_depth.track(lambda: self.tts.pending, station, "synth")
+        _queue_depth.track(lambda: self.tts.scheduler.depth, station, "audio")
+        _awake.track(lambda: int(self.is_awake.is_set()), station)
+        registry = get_metrics()
+        registry.add_check(self._check_name("audio"), self.audio_status)
+        if self.arduino is not None:
+            _serial_connected.track(lambda: int(self.arduino.connected), station)
+            registry.add_check(self._check_name("arduino"), self.arduino.status)
+
+    def _unwatch_metrics(self):
+        station = self._station
+        for queue_name in ("text", "synth", "audio"):
+            _queue_depth.untrack(station, queue_name)
+        _awake.untrack(station)
+        _serial_connected.untrack(station)
+        registry = get_metrics()
+        registry.remove_check(self._check_name("audio"))
+        registry.remove_check(self._check_name("arduino"))
+
+    @staticmethod
+    def _approach_lead(approach):
+        """Сколько секунд назад замечен подход (None — не было или давно)."""
+        if approach is None:
+            return None
+        lead = time.monotonic() - approach[0]
+        return lead if lead <= config.APPROACH_WAKE_WINDOW_SEC else None
+
+    def _set_awake(self, awake):
+        """Смена состояния + keep-alive общего HTTP-пула, пока человек рядом."""
+        if awake:
+            self.is_awake.set()
+            if not self._keepalive:
+                self._keepalive = True
+                # Соединения могли протухнуть за время простоя — греем сразу,
+                # если их уже не прогрели при подходе
+                lead = self._approach_lead(self._approach)
+                if lead is None or lead > config.KEEPALIVE_INTERVAL_SEC:
+                    self.transport.warmup(background=True)
+                self.transport.start_keepalive()
+        else:
+            self._approach = None
+            self.is_awake.clear()
+            if self._keepalive:
+                self._keepalive = False
+                self.transport.stop_keepalive()
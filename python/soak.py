@@ -0,0 +1,362 @@
+"""Soak-тест станции: тысячи циклов WAKE → ходы → SLEEP без железа и сети.
+
+Киоски работают неделями, и утечка в один файл или поток за ход
+за месяц становится отказом. Харнесс гоняет весь конвейер одной станции:
+синтетический звук микрофона через VAD и endpointing, запись WAV для STT,
+local-движки STT/GPT/TTS (задержки — config.LOCAL_BACKEND_LATENCY × scale),
+очередь вывода и PygameOutput с временным файлом на каждый звук (mixer
+подменён — SyntheticPygame), локальные команды, подход/пробуждение/засыпание
+с сохранением памяти. Каждые N циклов снимаются:
+  - RSS процесса;
+  - tracemalloc — сколько выделено и какие строки растут больше всего;
+  - число потоков;
+  - открытые файловые дескрипторы;
+  - файлы и байты во временном каталоге (у прогона — свой).
+
+После прогрева рост каждой метрики сравнивается с config.SOAK_LIMITS;
+превышение — FAIL и код выхода 1.
+
+  python soak.py                              — 2000 циклов
+  python soak.py --cycles 10000 --turns 3 --latency-scale 0.1
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import config
+
+# Фразы текстовых ходов: GPT, локальные команды и фразы без имени
+SOAK_PHRASES = [
+    "жопа, как дела?",
+    "жопа, расскажи про Python",
+    "жопа, который час",
+    "жопа, повтори",
+    "жопа, сделай тише",
+    "жопа, громче",
+    "ну и погода сегодня",
+]
+
+
+class SyntheticAudio:
+    """PyAudio-совместимый микрофон: тишина → «речь» → тишина на каждый open().
+
+    Первый open() — калибровка, там только тишина.
+    """
+
+    FORMAT = 8  # pyaudio.paInt16
+
+    def __init__(self, chunk=None, seed=1):
+        chunk = chunk or config.CHUNK
+        rng = random.Random(seed)
+        # Заранее — генерировать шум на каждый chunk дорого и шумит в tracemalloc
+        self.quiet = [_noise(rng, chunk, 60) for _ in range(4)]
+        self.loud = [_noise(rng, chunk, 4000) for _ in range(4)]
+        self.opened = 0
+
+    def open(self, frames_per_buffer=None, **kwargs):
+        self.opened += 1
+        return _SyntheticStream(self, speech_chunks=0 if self.opened == 1 else 12)
+
+    def get_sample_size(self, fmt):
+        return 2
+
+    def terminate(self):
+        pass
+
+
+class _SyntheticStream:
+    def __init__(self, audio, speech_chunks, lead_chunks=5):
+        self._audio = audio
+        self._lead = lead_chunks
+        self._speech = speech_chunks
+        self._index = 0
+
+    def read(self, frames, exception_on_overflow=True):
+        i = self._index
+        self._index += 1
+        if self._lead <= i < self._lead + self._speech:
+            return self._audio.loud[i % 4]
+        return self._audio.quiet[i % 4]
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SyntheticPygame:
+    """Подмена модуля pygame для PygameOutput: без звуковой карты, но тот же путь.
+
+    music.load() открывает файл и держит его до unload(), как настоящий
+    mixer, — незакрытый дескриптор или неудалённый временный mp3/wav
+    из play_audio виден в замерах fd и temp.
+    """
+
+    def __init__(self):
+        self.mixer = _SyntheticMixer()
+        self.time = self
+
+    @staticmethod
+    def wait(ms):
+        pass
+
+
+class _SyntheticMixer:
+    def __init__(self):
+        self.music = _SyntheticMusic()
+        self._init = None
+
+    def init(self, frequency=None, size=None, channels=None):
+        self._init = (frequency, size, channels)
+
+    def get_init(self):
+        return self._init
+
+    def Sound(self, buffer):
+        return _SyntheticSound()
+
+    def stop(self):
+        pass
+
+
+class _SyntheticMusic:
+    def __init__(self):
+        self._file = None
+
+    def load(self, path):
+        self.unload()
+        self._file = open(path, "rb")
+
+    def unload(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def set_volume(self, volume):
+        pass
+
+    def play(self):
+        self._file.read()
+
+    def get_busy(self):
+        return False
+
+    def stop(self):
+        pass
+
+
+class _SyntheticSound:
+    def set_volume(self, volume):
+        pass
+
+    def play(self):
+        return None
+
+
+def _noise(rng, frames, amplitude):
+    samples = [int(rng.uniform(-amplitude, amplitude)) for _ in range(frames)]
+    return b"".join(s.to_bytes(2, "little", signed=True) for s in samples)
+
+
+# === Метрики процесса ===
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3  # пик, Linux — КБ
+
+
+def _open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return 0
+
+
+def _temp_usage(path):
+    files = 0
+    size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass  # удалили, пока обходили
+    return files, size / 1e3
+
+
+def sample(temp_dir):
+    temp_files, temp_kb = _temp_usage(temp_dir)
+    return {
+        "rss_mb": _rss_mb(),
+        "traced_mb": tracemalloc.get_traced_memory()[0] / 1e6,
+        "threads": threading.active_count(),
+        "fds": _open_fds(),
+        "temp_files": temp_files,
+        "temp_kb": temp_kb,
+    }
+
+
+# === Прогон ===
+
+class Soak:
+    """Одна станция на local-движках + снятие метрик по ходу прогона."""
+
+    def __init__(self, turns=2, latency_scale=0.0):
+        from ai import JarvisAI
+        from session import VoiceSession
+        from speech import SpeechRecognizer
+        from tts import PygameOutput, TextToSpeech
+
+        self.turns = turns
+        # Свой временный каталог: чужие файлы в /tmp не маскируют и не имитируют утечку
+        self.temp_dir = tempfile.mkdtemp(prefix="zhopa_soak_")
+        # Файл памяти перезаписывается на каждом SLEEP — его размер гуляет, держим отдельно
+        self.memory_dir = tempfile.mkdtemp(prefix="zhopa_soak_memory_")
+        tempfile.tempdir = self.temp_dir
+
+        for stage in config.BACKENDS:
+            config.BACKENDS[stage] = "local"
+        for key in config.LOCAL_BACKEND_LATENCY:
+            config.LOCAL_BACKEND_LATENCY[key] *= latency_scale
+
+        self.audio = SyntheticAudio()
+        self.recognizer = SpeechRecognizer(audio=self.audio)
+        self.recognizer.calibrate(duration=1)
+        ai = JarvisAI(memory_file=os.path.join(self.memory_dir, "memory.json"))
+        # Вывод — настоящий PygameOutput (временный файл на каждый звук) поверх подмены mixer
+        self._pygame = sys.modules.get("pygame")
+        sys.modules["pygame"] = SyntheticPygame()
+        tts = TextToSpeech(output=PygameOutput())
+        # Без attach(): пробуждением управляет cycle(), а эхо-гейт при мгновенном
+        # звуке и микрофоне без пауз только крутил бы цикл
+        self.session = VoiceSession(ai, tts, recognizer=self.recognizer, name="soak")
+
+    def cycle(self, n):
+        session = self.session
+        if n % 3 == 0:
+            session.on_approach(200, 1.0)
+        session.on_wake()
+        for turn in range(self.turns):
+            deadline = None
+            if turn % 2 == 0:
+                text = self.recognizer.listen()
+                deadline = self.recognizer.turn_deadline
+            else:
+                text = random.choice(SOAK_PHRASES)
+            if text:
+                session.handle_text(text, deadline=deadline)
+        session.on_sleep()
+        session.tts.scheduler.wait_idle()
+
+    def close(self):
+        self.session.close()
+        if self._pygame is None:
+            sys.modules.pop("pygame", None)
+        else:
+            sys.modules["pygame"] = self._pygame
+        tempfile.tempdir = None
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        shutil.rmtree(self.memory_dir, ignore_errors=True)
+
+
+def run(cycles=2000, turns=2, every=None, latency_scale=0.0, top=10):
+    """Прогнать soak. Возвращает True, если ни одна метрика не растёт."""
+    every = every or max(1, cycles // 20)
+    warmup = max(every, int(cycles * config.SOAK_WARMUP_SHARE))
+    tracemalloc.start(config.SOAK_TRACE_FRAMES)
+
+    soak = Soak(turns=turns, latency_scale=latency_scale)
+    samples = []
+    baseline = None
+    started = time.monotonic()
+    # Вывод станции за тысячи ходов не нужен — оставляем только строки [Soak]
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        for n in range(1, cycles + 1):
+            soak.cycle(n)
+            if n == warmup:
+                baseline = tracemalloc.take_snapshot()
+            if n % every == 0:
+                samples.append((n, sample(soak.temp_dir)))
+                _print(stdout, _format(*samples[-1]))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        final = tracemalloc.take_snapshot()
+        soak.close()
+        tracemalloc.stop()
+
+    elapsed = time.monotonic() - started
+    print(f"[Soak] {cycles} циклов × {turns} ходов за {elapsed:.0f} с, "
+          f"микрофон открыт {soak.audio.opened} раз")
+
+    if baseline is not None:
+        print(f"[Soak] Рост выделений после прогрева (топ {top}):")
+        for stat in final.compare_to(baseline, "lineno")[:top]:
+            print(f"  {stat}")
+
+    return _verdict([(n, s) for n, s in samples if n >= warmup])
+
+
+def _verdict(samples):
+    if len(samples) < 2:
+        print("[Soak] Мало замеров после прогрева — увеличь --cycles")
+        return False
+
+    ok = True
+    first = samples[0][1]
+    # Медиана последних замеров — разовый всплеск (GC, фоновый поток) не считается ростом
+    tail = [s for _, s in samples[-3:]]
+    for metric, limit in config.SOAK_LIMITS.items():
+        final = sorted(s[metric] for s in tail)[len(tail) // 2]
+        growth = final - first[metric]
+        status = "OK" if growth <= limit else "FAIL"
+        ok = ok and status == "OK"
+        print(f"[Soak] {metric}: {first[metric]:.1f} → {final:.1f} "
+              f"(рост {growth:+.1f}, допуск {limit}) {status}")
+    print(f"[Soak] {'OK' if ok else 'FAIL — есть утечка'}")
+    return ok
+
+
+def _format(n, s):
+    return (f"[Soak] цикл {n}: RSS {s['rss_mb']:.1f} МБ, tracemalloc {s['traced_mb']:.2f} МБ, "
+            f"потоков {s['threads']}, fd {s['fds']}, "
+            f"temp {s['temp_files']} файлов / {s['temp_kb']:.0f} КБ")
+
+
+def _print(stream, line):
+    stream.write(line + "\n")
+    stream.flush()
+
+
+def _arg(args, name, default, cast):
+    if name in args:
+        return cast(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    passed = run(
+        cycles=_arg(args, "--cycles", 2000, int),
+        turns=_arg(args, "--turns", 2, int),
+        every=_arg(args, "--every", None, int),
+        latency_scale=_arg(args, "--latency-scale", 0.0, float),
+    )
+    sys.exit(0 if passed else 1)
@@ -1,186 +1,249 @@
-"""Модуль распознавания речи — OpenAI Whisper с адаптивным определением тишины."""
+"""Модуль распознавания речи — запись с микрофона + движок STT (по умолчанию Whisper)."""
 
-import os
-import struct
-import tempfile
-import time
+import io
 import wave
 
-import pyaudio
-from openai import OpenAI
-
+import backends
 import config
+from retry import Deadline, classify_error, get_policy
+from transcript_gate import TranscriptGate
+from endpoint import DraftTranscriber, Endpointer
+from vad import CaptureBuffer, VoiceActivityDetector, capture, rms
 
 
 class SpeechRecognizer:
-    """Запись с микрофона + распознавание через OpenAI Whisper API."""
+    """Запись с микрофона + распознавание через выбранный движок STT."""
 
-    def __init__(self, client=None, language="ru"):
-        self.client = client or OpenAI(api_key=config.OPENAI_API_KEY)
+    def __init__(self, stt=None, language="ru", transport=None, input_device=None, audio=None):
+        self.stt = stt or backends.create("stt", transport=transport)
         self.language = language
 
         self.sample_rate = config.SAMPLE_RATE
         self.channels = config.CHANNELS
         self.chunk = config.CHUNK
-        self.format = pyaudio.paInt16
+        if audio is None:
+            import pyaudio  # тяжёлый импорт — только когда нужен микрофон
 
-        self.silence_threshold = config.MIN_SILENCE_THRESHOLD
+            audio = pyaudio.PyAudio()
+            self.format = pyaudio.paInt16
+        else:
+            # PyAudio-совместимый источник — например, запись сессии (replay.py)
+            self.format = audio.FORMAT
+
+        self.input_device = input_device  # индекс устройства PyAudio, None — по умолчанию
+        chunk_sec = self.chunk / self.sample_rate
+        self.vad = VoiceActivityDetector(chunk_sec)
+        self.endpointer = Endpointer(chunk_sec) if config.ENDPOINT_ENABLED else None
+        self.draft = None
+        if self.endpointer is not None and config.ENDPOINT_DRAFT_STT:
+            self.draft = DraftTranscriber(self._transcribe_draft)
         self.max_record_sec = config.MAX_RECORD_SEC
+        self._max_chunks = int(self.sample_rate / self.chunk * self.max_record_sec)
+        # Одна фраза — один предвыделенный буфер на всё время работы
+        self.buffer = CaptureBuffer(
+            self.chunk * 2 * self.channels, self._max_chunks,
+            self.vad.min_speech_chunks + config.VAD_PREROLL_CHUNKS,
+            sample_rate=self.sample_rate, channels=self.channels,
+        )
 
-        self.pa = pyaudio.PyAudio()
+        self.pa = audio
+        self.recorder = None  # SessionRecorder — пишет сырой звук каждого хода
+        self.turn_deadline = None  # бюджет текущего хода (с конца записи)
+        self.speaker = None  # AudioScheduler станции: пока звучит — не пишем
+        self.gate = TranscriptGate() if config.GATE_ENABLED else None
 
     def calibrate(self, duration=1):
-        """Калибровка шумового фона."""
+        """Начальная оценка шумового фона (дальше VAD подстраивается сам)."""
         print("[Mic] Калибровка...")
+        started = self.recorder.now() if self.recorder else None
         stream = self.pa.open(
             format=self.format, channels=self.channels,
             rate=self.sample_rate, input=True,
+            input_device_index=self.input_device,
             frames_per_buffer=self.chunk
         )
         levels = []
+        raw = []
         chunks_needed = int(self.sample_rate / self.chunk * duration)
         for _ in range(chunks_needed):
             data = stream.read(self.chunk, exception_on_overflow=False)
             levels.append(self._rms(data))
+            raw.append(data)
         stream.stop_stream()
         stream.close()
+        self._record_mic(raw, started, calibrate=True)
 
-        avg_noise = sum(levels) / len(levels) if levels else 300
-        self.silence_threshold = max(int(avg_noise * 1.8), config.MIN_SILENCE_THRESHOLD)
-        print(f"[Mic] Порог тишины: {self.silence_threshold}")
+        self.vad.seed(levels)
+        print(f"[Mic] Шум: {self.vad.noise:.0f}, порог речи: {self.vad.start_threshold:.0f}")
 
     def listen(self, timeout=None, phrase_time_limit=None):
         """
-        Слушает микрофон с адаптивным определением конца фразы.
+        Слушает микрофон с адаптивным VAD и определением конца фразы.
         Возвращает текст или None.
         """
         timeout = timeout or config.LISTEN_TIMEOUT
         stream = self.pa.open(
             format=self.format, channels=self.channels,
             rate=self.sample_rate, input=True,
+            input_device_index=self.input_device,
             frames_per_buffer=self.chunk
         )
 
-        frames = []
-        silent_chunks = 0
-        has_speech = False
-        speech_chunks = 0
-        max_chunks = int(self.sample_rate / self.chunk * self.max_record_sec)
         timeout_chunks = int(self.sample_rate / self.chunk * timeout)
-        waited = 0
 
         print("[Mic] Слушаю...")
+        started = self.recorder.now() if self.recorder else None
+        raw = [] if self.recorder else None
 
-        try:
-            # Фаза 1: ждём начала речи
-            while waited < timeout_chunks:
-                data = stream.read(self.chunk, exception_on_overflow=False)
-                level = self._rms(data)
-                if level > self.silence_threshold:
-                    has_speech = True
-                    frames.append(data)
-                    speech_chunks = 1
-                    break
-                waited += 1
-
-            if not has_speech:
-                print("[Mic] Тишина — никто не говорит")
-                stream.stop_stream()
-                stream.close()
-                return None
-
-            # Фаза 2: запись с адаптивным порогом тишины
-            for _ in range(max_chunks):
+        def read_chunk():
+            data = stream.read(self.chunk, exception_on_overflow=False)
+            # Звук из своего динамика — выбрасываем, поток читаем, чтобы не копился
+            while self.speaker is not None and self.speaker.is_active():
                 data = stream.read(self.chunk, exception_on_overflow=False)
-                frames.append(data)
-                level = self._rms(data)
-
-                if level >= self.silence_threshold:
-                    silent_chunks = 0
-                    speech_chunks += 1
-                else:
-                    silent_chunks += 1
-                    # Адаптивный порог тишины
-                    silence_limit = self._adaptive_silence_limit(speech_chunks)
-                    if silent_chunks >= silence_limit:
-                        break
+            if raw is not None:
+                raw.append(data)
+            return data
 
+        try:
+            pcm, speech_chunks = capture(
+                read_chunk, self.vad, timeout_chunks, self._max_chunks,
+                endpointer=self.endpointer, draft=self.draft, buffer=self.buffer,
+            )
         finally:
             stream.stop_stream()
             stream.close()
+        self._record_mic(raw, started)
 
-        if not frames:
+        if not pcm:
+            print("[Mic] Тишина — никто не говорит")
             return None
 
         speech_duration = speech_chunks * self.chunk / self.sample_rate
         print(f"[Mic] Записано {speech_duration:.1f} сек")
+        decision = self.endpointer.last_decision if self.endpointer else None
+        if decision:
+            print(f"[Mic] Конец фразы через {decision['silence_sec']:.2f} с тишины "
+                  f"(обычно {decision['baseline_sec']:.2f} с, уверенность {decision['confidence']})")
+
+        # Ход начинается с конца записи: STT + GPT укладываются в общий бюджет
+        self.turn_deadline = Deadline(config.TURN_BUDGET_SEC)
+
+        audio_sec = self.buffer.seconds
+
+        # Черновик уже покрывает всю речь — второй запрос к STT не нужен
+        draft_text = self._draft_covering_speech()
+        if draft_text:
+            # Бюджет хода пошёл с запроса черновика — речь к тому моменту кончилась
+            self.turn_deadline = Deadline(config.TURN_BUDGET_SEC, start=self.draft.started)
+            if self._rejected(draft_text, audio_sec, self.draft.details):
+                return None
+            print(f"[Mic] Распознано (черновик): {draft_text}")
+            return draft_text
 
-        # Сохраняем WAV
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            tmp_path = f.name
-            wf = wave.open(f, "wb")
-            wf.setnchannels(self.channels)
-            wf.setsampwidth(self.pa.get_sample_size(self.format))
-            wf.setframerate(self.sample_rate)
-            wf.writeframes(b"".join(frames))
-            wf.close()
+        # WAV-заголовок пишется прямо перед PCM в том же буфере — без склейки и файла
+        return self._transcribe_with_retry(self.buffer.wav(), deadline=self.turn_deadline,
+                                           audio_sec=audio_sec)
+
+    def status(self):
+        """Проверка здоровья микрофона: (ok, подробности).
 
-        # Отправляем в Whisper с retry
-        return self._transcribe_with_retry(tmp_path)
+        PortAudio читает список устройств при старте — выдернутый USB-микрофон
+        видно только после перезапуска, зато проверка не трогает поток записи.
+        """
+        if not hasattr(self.pa, "get_device_info_by_index"):
+            return True, "источник без устройства"  # запись сессии, синтетический звук
+        try:
+            if self.input_device is None:
+                info = self.pa.get_default_input_device_info()
+            else:
+                info = self.pa.get_device_info_by_index(self.input_device)
+        except OSError as e:
+            return False, f"микрофон недоступен: {e}"
+        if not info.get("maxInputChannels"):
+            return False, f"{info.get('name')}: нет входных каналов"
+        return True, info.get("name", "микрофон")
 
     def close(self):
         self.pa.terminate()
 
     # === Внутренние методы ===
 
-    def _adaptive_silence_limit(self, speech_chunks):
-        """Адаптивный порог тишины в chunks."""
-        speech_sec = speech_chunks * self.chunk / self.sample_rate
+    def _transcribe_with_retry(self, audio, deadline=None, audio_sec=None):
+        """Транскрибация через движок STT с retry по общей политике + фильтр.
 
-        if speech_sec < 3.0:
-            silence_sec = config.SILENCE_SHORT_PHRASE
-        elif speech_sec > 5.0:
-            silence_sec = config.SILENCE_LONG_PHRASE
-        else:
-            silence_sec = config.SILENCE_DURATION
-
-        return int(self.sample_rate / self.chunk * silence_sec)
-
-    def _transcribe_with_retry(self, audio_path, max_retries=2):
-        """Транскрибация через Whisper API с retry."""
-        for attempt in range(max_retries):
-            try:
-                with open(audio_path, "rb") as audio_file:
-                    result = self.client.audio.transcriptions.create(
-                        model=config.WHISPER_MODEL,
-                        file=audio_file,
-                        language=self.language,
-                    )
-                text = result.text.strip()
-                if text:
-                    print(f"[Mic] Распознано: {text}")
-                    return text
-                return None
-            except Exception as e:
-                print(f"[Mic] Ошибка Whisper (попытка {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-            finally:
-                if attempt == max_retries - 1:
-                    try:
-                        os.unlink(audio_path)
-                    except Exception:
-                        pass
-
-        print("[Mic] Whisper не отвечает")
-        return None
+        audio — WAV (bytes или memoryview в буфере записи): hedged-дубликаты
+        читают один и тот же буфер, каждый своим курсором.
+        """
+        # verbose_json нужен только фильтру. У каждой попытки свой dict:
+        # уверенность берём у той, чей текст победил
+        want_details = self.gate is not None
+
+        def transcribe(timeout):
+            attempt_details = {} if want_details else None
+            text = self.stt.transcribe(
+                audio, "speech.wav", self.language, timeout, details=attempt_details,
+            )
+            return text, attempt_details
+
+        try:
+            text, details = get_policy("stt").call(transcribe, deadline=deadline)
+        except Exception as e:
+            print(f"[Mic] STT не отвечает ({classify_error(e)}): {e}")
+            return None
+
+        text = (text or "").strip()
+        if not text or self._rejected(text, audio_sec, details):
+            return None
+        print(f"[Mic] Распознано: {text}")
+        return text
+
+    def _rejected(self, text, audio_sec, details=None):
+        """Фильтр галлюцинаций: True — текст выбрасываем, до GPT он не дойдёт."""
+        if self.gate is None:
+            return False
+        reason = self.gate.check(text, audio_sec=audio_sec, details=details)
+        if reason:
+            print(f"[Mic] Отброшено ({reason}): {text}")
+        return reason is not None
+
+    def _record_mic(self, raw, started, calibrate=False):
+        if self.recorder is None or raw is None:
+            return
+        self.recorder.record("mic", b"".join(raw), {
+            "start": started, "sample_rate": self.sample_rate,
+            "chunk": self.chunk, "calibrate": calibrate,
+        })
+
+    def _draft_covering_speech(self):
+        """Текст черновика, если после его кусочка VAD слышал только тишину; иначе ""."""
+        draft = self.draft
+        if draft is None or not (draft.text or "").strip() or draft.pcm_length is None:
+            return ""
+        uncovered = len(self.buffer.pcm) - draft.pcm_length
+        if uncovered > self.vad.silent_chunks * self.chunk * 2 * self.channels:
+            return ""  # в непокрытом хвосте была речь — нужен полный запрос
+        return draft.text.strip()
+
+    def _transcribe_draft(self, pcm):
+        """Черновая расшифровка уже записанного — из памяти, без retry.
+
+        Таймаут — не больше бюджета хода: черновик сам и есть начало хода.
+        Возвращает (текст, details) — details для фильтра галлюцинаций.
+        """
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(pcm)
+        details = {} if self.gate is not None else None
+        timeout = min(config.HTTP_TIMEOUTS["stt"], config.TURN_BUDGET_SEC)
+        text = self.stt.transcribe(
+            buf.getvalue(), "draft.wav", self.language, timeout, details=details
+        )
+        return text, details
 
     @staticmethod
     def _rms(data):
         """Среднеквадратичная амплитуда."""
-        count = len(data) // 2
-        if count == 0:
-            return 0
-        shorts = struct.unpack(f"{count}h", data)
-        sum_sq = sum(s * s for s in shorts)
-        return int((sum_sq / count) ** 0.5)
+        return rms(data)
@@ -0,0 +1,93 @@
+"""Параллельный холодный старт — независимые шаги идут одновременно."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StartupError(Exception):
+    """Обязательный шаг старта не выполнился."""
+
+
+class Startup:
+    """Запуск шагов с зависимостями в пуле потоков + разбивка по времени.
+
+    Шаг стартует, как только готовы его зависимости. background-шаги
+    не задерживают готовность системы — run() их не ждёт.
+    """
+
+    def __init__(self):
+        self._steps = {}  # name → (fn, deps, optional, background)
+        self._futures = {}
+        self._timings = {}  # name → (начало, конец) от t0
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._t0 = None
+        self._ready_at = None
+        self._executor = None
+
+    def add(self, name, fn, deps=(), optional=False, background=False):
+        """fn получает dict с результатами зависимостей."""
+        for dep in deps:
+            if dep not in self._steps:
+                raise ValueError(f"Шаг {name}: неизвестная зависимость {dep}")
+        self._steps[name] = (fn, tuple(deps), optional, background)
+
+    def run(self):
+        """Запустить все шаги; вернуть dict name → результат (None у упавших optional)."""
+        self._t0 = time.monotonic()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self._steps) or 1, thread_name_prefix="startup"
+        )
+        # Порядок add() уже топологический: зависимости добавлены раньше
+        for name in self._steps:
+            self._futures[name] = self._executor.submit(self._run_step, name)
+
+        results = {}
+        for name, (_, _, optional, background) in self._steps.items():
+            if background:
+                continue
+            try:
+                results[name] = self._futures[name].result()
+            except Exception as e:
+                if not optional:
+                    self._executor.shutdown(wait=False)
+                    raise StartupError(f"Шаг '{name}' не выполнился: {e}") from e
+                results[name] = None
+
+        self._ready_at = time.monotonic() - self._t0
+        # Пул закроется сам, когда доработают background-шаги
+        self._executor.shutdown(wait=False)
+        return results
+
+    def report(self):
+        """Печать разбивки времени старта."""
+        with self._lock:
+            timings = dict(self._timings)
+        for name, (start, end) in sorted(timings.items(), key=lambda kv: kv[1][0]):
+            mark = " (фон)" if self._steps[name][3] else ""
+            error = " — ОШИБКА" if name in self._errors else ""
+            print(f"[Старт] {name:<12} {start:5.2f} → {end:5.2f} с ({end - start:.2f} с){mark}{error}")
+        sequential = sum(end - start for name, (start, end) in timings.items()
+                         if not self._steps[name][3])
+        print(f"[Старт] Готов за {self._ready_at:.2f} с "
+              f"(последовательно было бы {sequential:.2f} с)")
+
+    # === Внутренние методы ===
+
+    def _run_step(self, name):
+        fn, deps, _, _ = self._steps[name]
+        # Ждём зависимости; упавшая зависимость роняет и этот шаг
+        dep_results = {dep: self._futures[dep].result() for dep in deps}
+
+        start = time.monotonic() - self._t0
+        try:
+            return fn(dep_results)
+        except Exception as e:
+            with self._lock:
+                self._errors[name] = e
+            print(f"[Старт] {name}: ошибка: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._timings[name] = (start, time.monotonic() - self._t0)
@@ -0,0 +1,6 @@
+"""Модули проекта плоские — тесты импортируют их из python/."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,147 @@
+"""JarvisAI.ask_stream на подставных движках LLM — без сети."""
+
+import os
+
+import pytest
+
+import config
+from ai import JarvisAI
+from backends.base import LLMBackend
+
+
+class BrokenLLM(LLMBackend):
+    name = "broken"
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        raise ConnectionError("нет сети")
+        yield  # генератор
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        raise ConnectionError("нет сети")
+
+
+class ScriptedLLM(LLMBackend):
+    """Отдаёт заранее заданные кусочки; счётчик токенов — только в последнем chunk."""
+
+    name = "scripted"
+
+    def __init__(self, deltas):
+        super().__init__()
+        self.deltas = deltas
+        self.closed = False
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        try:
+            yield from self.deltas
+            if usage is not None:
+                usage.update({"prompt_tokens": 100, "completion_tokens": 50})
+        finally:
+            self.closed = True
+
+
+class DroppingLLM(LLMBackend):
+    """Поток обрывается посреди первого предложения, без streaming отвечает."""
+
+    name = "dropping"
+
+    def __init__(self, answer):
+        super().__init__()
+        self.answer = answer
+
+    def stream(self, messages, model, max_tokens, temperature, timeout, usage=None):
+        yield "Привет, "
+        yield "бра"
+        raise ConnectionError("обрыв потока")
+
+    def complete(self, messages, model, max_tokens, temperature, timeout):
+        if self.answer is None:
+            raise ConnectionError("нет сети")
+        return self.answer
+
+
+@pytest.fixture(autouse=True)
+def fast_retry(monkeypatch):
+    monkeypatch.setitem(config.RETRY_POLICIES, "chat",
+                        {"max_attempts": 2, "base_delay": 0.01, "max_delay": 0.01, "hedge": False})
+    import retry
+    monkeypatch.setattr(retry, "_policies", {})
+
+
+def test_failed_answer_reaches_on_token_and_stats():
+    ai = JarvisAI(llm=BrokenLLM(), memory_file=os.devnull)
+    tokens = []
+    answer = list(ai.ask_stream("кто ты", on_token=tokens.append))
+    assert answer == [config.ERROR_MESSAGES["network"]]
+    assert tokens == answer  # текстовый режим печатает только on_token
+    assert ai.last_stats["fallback"]
+    assert ai.last_stats["error"].startswith("network: ConnectionError")
+
+
+def test_batch_reports_error_class():
+    import batch
+
+    ai = JarvisAI(llm=BrokenLLM(), memory_file=os.devnull)
+    result = batch._run_prompt(ai, {"id": "1", "prompt": "жопа, кто ты"})
+    assert result["answer"] == ""
+    assert result["sentences"] == 0
+    assert result["error"].startswith("network: ConnectionError")
+
+
+def test_truncated_stream_keeps_text_within_cap_and_estimates_usage():
+    # «привет» — маршрут short: одно предложение
+    llm = ScriptedLLM(["Привет", ", я Жопа.", " А ещё", " я умею петь."])
+    ai = JarvisAI(llm=llm, memory_file=os.devnull)
+    tokens = []
+    answer = list(ai.ask_stream("привет", on_token=tokens.append))
+    stats = ai.last_stats
+    assert answer == ["Привет, я Жопа."]
+    assert "".join(tokens).strip() == "Привет, я Жопа."
+    assert stats["truncated"] and llm.closed
+    assert stats["completion_tokens"] == 3
+    assert stats["prompt_tokens"] > 0
+    assert ai.history[-1] == {"role": "assistant", "content": "Привет, я Жопа."}
+
+
+def test_full_stream_uses_reported_usage():
+    llm = ScriptedLLM(["Привет", "!"])
+    ai = JarvisAI(llm=llm, memory_file=os.devnull)
+    assert list(ai.ask_stream("привет")) == ["Привет!"]
+    assert not ai.last_stats["truncated"]
+    assert ai.last_stats["completion_tokens"] == 50
+
+
+@pytest.mark.parametrize("answer, printed", [
+    ("Привет, братан.", "Привет, братан."),
+    ("Здорово, братан.", "Привет, бра\nЗдорово, братан."),
+])
+def test_fallback_after_partial_stream_does_not_repeat_text(answer, printed):
+    ai = JarvisAI(llm=DroppingLLM(answer), memory_file=os.devnull)
+    tokens = []
+    assert list(ai.ask_stream("привет", on_token=tokens.append)) == [answer]
+    assert "".join(tokens) == printed
+    stats = ai.last_stats
+    assert stats["fallback"] and not stats["failed"]
+    assert stats["error"].startswith("network: ConnectionError")
+
+
+def test_failed_fallback_after_partial_stream():
+    import batch
+
+    ai = JarvisAI(llm=DroppingLLM(None), memory_file=os.devnull)
+    tokens = []
+    list(ai.ask_stream("привет", on_token=tokens.append))
+    assert "".join(tokens) == "Привет, бра\n" + config.ERROR_MESSAGES["network"]
+    assert ai.last_stats["failed"]
+    result = batch._run_prompt(ai, {"id": "1", "prompt": "привет"})
+    assert result["answer"] == ""
+    assert result["error"].startswith("network")
+
+
+def test_batch_keeps_recovered_answer_and_reports_stream_error():
+    import batch
+
+    ai = JarvisAI(llm=DroppingLLM("Привет, братан."), memory_file=os.devnull)
+    result = batch._run_prompt(ai, {"id": "1", "prompt": "привет"})
+    assert result["answer"] == "Привет, братан."
+    assert result["fallback"]
+    assert result["error"].startswith("network: ConnectionError")
@@ -0,0 +1,105 @@
+"""CaptureBuffer: кольцо pre-roll, заголовок WAV и совпадение с прежней записью."""
+
+import io
+import random
+import wave
+
+import pytest
+
+import config
+from vad import CaptureBuffer, VoiceActivityDetector, _legacy_capture, capture
+
+CHUNK_BYTES = 8
+PREROLL = 4
+
+
+def _chunks(count, size=CHUNK_BYTES):
+    # Каждый chunk узнаётся по байтам: номер повторён size раз
+    return [bytes([n % 256]) * size for n in range(count)]
+
+
+@pytest.mark.parametrize("lead", range(1, 3 * PREROLL + 2))
+def test_ring_commit_keeps_last_chunks_in_order(lead):
+    buffer = CaptureBuffer(CHUNK_BYTES, max_chunks=10, preroll=PREROLL)
+    chunks = _chunks(lead)
+    for data in chunks:
+        assert bytes(buffer.ring_put(data)) == data
+    buffer.ring_commit()
+    assert bytes(buffer.pcm) == b"".join(chunks[-PREROLL:])
+    buffer.append(b"\xff" * CHUNK_BYTES)
+    assert bytes(buffer.pcm) == b"".join(chunks[-PREROLL:]) + b"\xff" * CHUNK_BYTES
+
+
+@pytest.mark.parametrize("lead", [1, PREROLL, PREROLL + 1, 2 * PREROLL - 1])
+def test_ring_commit_with_short_last_chunk(lead):
+    buffer = CaptureBuffer(CHUNK_BYTES, max_chunks=10, preroll=PREROLL)
+    chunks = _chunks(lead - 1) + [b"\xaa" * (CHUNK_BYTES // 2)]
+    for data in chunks:
+        buffer.ring_put(data)
+    buffer.ring_commit()
+    assert bytes(buffer.pcm) == b"".join(chunks[-PREROLL:])
+
+
+def test_reset_reuses_buffer():
+    buffer = CaptureBuffer(CHUNK_BYTES, max_chunks=2, preroll=PREROLL)
+    for data in _chunks(PREROLL + 3):
+        buffer.ring_put(data)
+    buffer.ring_commit()
+    buffer.reset()
+    assert len(buffer.pcm) == 0
+    buffer.ring_put(b"\x01" * CHUNK_BYTES)
+    buffer.ring_commit()
+    assert bytes(buffer.pcm) == b"\x01" * CHUNK_BYTES
+
+
+def test_append_stops_at_capacity():
+    buffer = CaptureBuffer(CHUNK_BYTES, max_chunks=2, preroll=1)
+    buffer.ring_put(b"\x01" * CHUNK_BYTES)
+    buffer.ring_commit()
+    assert buffer.append(b"\x02" * CHUNK_BYTES) is not None
+    assert buffer.append(b"\x03" * CHUNK_BYTES) is not None
+    assert buffer.append(b"\x04" * CHUNK_BYTES) is None
+    assert len(buffer.pcm) == buffer.capacity
+
+
+def test_wav_header_is_valid():
+    buffer = CaptureBuffer(CHUNK_BYTES, max_chunks=10, preroll=PREROLL, sample_rate=16000)
+    buffer.ring_put(b"\x01\x00" * (CHUNK_BYTES // 2))
+    buffer.ring_commit()
+    buffer.append(b"\x02\x00" * (CHUNK_BYTES // 2))
+    with wave.open(io.BytesIO(bytes(buffer.wav())), "rb") as wf:
+        assert wf.getnchannels() == 1
+        assert wf.getsampwidth() == 2
+        assert wf.getframerate() == 16000
+        assert wf.getnframes() == CHUNK_BYTES
+        assert wf.readframes(wf.getnframes()) == bytes(buffer.pcm)
+    assert buffer.seconds == pytest.approx(CHUNK_BYTES / 16000)
+
+
+def test_capture_matches_legacy_wav():
+    """Та же фраза — байт в байт тот же WAV, что у прежней записи."""
+    rng = random.Random(7)
+    chunk = config.CHUNK * 2
+
+    def noise(amplitude):
+        return b"".join(rng.randint(-amplitude, amplitude).to_bytes(2, "little", signed=True)
+                        for _ in range(config.CHUNK))
+
+    quiet = [noise(60) for _ in range(8)]
+    loud = [noise(4000) for _ in range(8)]
+    script = quiet * 2 + [loud[i % 8] for i in range(30)] + [quiet[i % 8] for i in range(60)]
+    chunk_sec = config.CHUNK / config.SAMPLE_RATE
+
+    def run(fn, **kwargs):
+        detector = VoiceActivityDetector(chunk_sec)
+        detector.seed([40] * 30)
+        source = iter(script)
+        return fn(lambda: next(source, b""), detector, 100, 200, **kwargs)
+
+    legacy = run(_legacy_capture)
+    preroll = VoiceActivityDetector(chunk_sec).min_speech_chunks + config.VAD_PREROLL_CHUNKS
+    buffer = CaptureBuffer(chunk, 200, preroll)
+    for _ in range(2):  # второй раз — тот же буфер после reset()
+        pcm, _ = run(capture, buffer=buffer)
+        assert len(pcm) > 0
+        assert bytes(buffer.wav()) == legacy
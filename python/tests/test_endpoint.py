@@ -0,0 +1,101 @@
+"""Endpointer и capture() на синтетическом PCM — без микрофона."""
+
+import array
+
+import config
+from endpoint import Endpointer
+from vad import VoiceActivityDetector, capture
+
+CHUNK_SEC = config.CHUNK / config.SAMPLE_RATE
+
+
+def _chunk(level):
+    """Chunk PCM 16 бит с RMS ≈ level."""
+    level = int(level)
+    return array.array("h", [level, -level] * (config.CHUNK // 2)).tobytes()
+
+
+def _seconds(sec):
+    return int(round(sec / CHUNK_SEC))
+
+
+def _run(levels, endpointer=None, draft_text=None):
+    detector = VoiceActivityDetector(CHUNK_SEC)
+    detector.seed([40] * 30)
+    chunks = iter([_chunk(level) for level in levels])
+    draft = _FixedDraft(draft_text) if draft_text is not None else None
+    pcm, speech_chunks = capture(lambda: next(chunks, b""), detector,
+                                 timeout_chunks=_seconds(5), max_chunks=_seconds(20),
+                                 endpointer=endpointer, draft=draft)
+    return len(pcm) / 2 / config.SAMPLE_RATE, speech_chunks
+
+
+class _FixedDraft:
+    """Черновик, который «уже расшифровал» заданный текст."""
+
+    def __init__(self, text):
+        self.text = text
+        self.requested = 0
+
+    def reset(self):
+        pass
+
+    def speech_resumed(self):
+        pass
+
+    def request(self, pcm):
+        self.requested += 1
+
+
+def _fading_phrase():
+    # Фраза 2 с, к концу тише, потом тишина на уровне фона
+    return ([40] * 5 + [2000] * _seconds(1.5)
+            + [1200, 900, 700, 500] + [40] * _seconds(4))
+
+
+def test_ends_earlier_than_fixed_pause_on_clear_end():
+    endpointer = Endpointer(CHUNK_SEC)
+    _run(_fading_phrase(), endpointer=endpointer)
+    decision = endpointer.last_decision
+    assert decision is not None
+    assert decision["silence_sec"] < decision["baseline_sec"]
+    assert decision["silence_sec"] >= config.ENDPOINT_MIN_SILENCE_SEC - CHUNK_SEC
+
+
+def test_never_stops_before_min_silence():
+    endpointer = Endpointer(CHUNK_SEC)
+    _run(_fading_phrase(), endpointer=endpointer, draft_text="Кто ты?")
+    assert endpointer.last_decision["silence_sec"] >= config.ENDPOINT_MIN_SILENCE_SEC - CHUNK_SEC
+
+
+def test_hesitant_draft_waits_longer():
+    endpointer = Endpointer(CHUNK_SEC)
+    _run(_fading_phrase(), endpointer=endpointer, draft_text="расскажи про Python и")
+    decision = endpointer.last_decision
+    assert decision["hesitant"]
+    assert decision["silence_sec"] >= decision["baseline_sec"]
+
+
+def test_complete_draft_raises_confidence():
+    # Ровная фраза без спада: уверенность даёт только черновик
+    levels = [40] * 5 + [2000] * _seconds(2) + [40] * _seconds(4)
+    plain = Endpointer(CHUNK_SEC)
+    _run(levels, endpointer=plain)
+    with_draft = Endpointer(CHUNK_SEC)
+    _run(levels, endpointer=with_draft, draft_text="Который час?")
+    assert with_draft.last_decision["confidence"] > plain.last_decision["confidence"]
+    assert with_draft.last_decision["silence_sec"] < plain.last_decision["silence_sec"]
+
+
+def test_long_question_is_recorded_whole():
+    """8 с речи, вторая половина тише — запись не обрывается посередине."""
+    levels = [40] * 5 + [2000] * _seconds(4) + [700] * _seconds(4) + [40] * _seconds(4)
+    for endpointer in (None, Endpointer(CHUNK_SEC)):
+        seconds, _ = _run(levels, endpointer=endpointer)
+        assert seconds >= 8.0
+
+
+def test_silence_only_returns_empty():
+    seconds, speech_chunks = _run([40] * _seconds(6))
+    assert seconds == 0
+    assert speech_chunks == 0
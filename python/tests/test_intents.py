@@ -0,0 +1,71 @@
+"""IntentRouter: локальные команды узнаются только целиком."""
+
+import pytest
+
+import config
+from intents import IntentRouter
+from text import strip_wake_word
+
+
+class _Volume:
+    def __init__(self, volume):
+        self.volume = volume
+
+    def set_volume(self, volume):
+        self.volume = min(1.0, max(0.0, volume))
+
+
+def _intent(router, phrase):
+    result = router.route(strip_wake_word(phrase))
+    return result[0] if result else None
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("phrase, intent", [
+    ("Жопа, который час?", "time"),
+    ("Жопа, скажи пожалуйста сколько времени", "time"),
+    ("Жопа, какое сегодня число?", "date"),
+    ("Жопа, повтори ещё раз", "repeat"),
+    ("Жопа, сделай погромче!", "volume_up"),
+    ("Жопа, тише", "volume_down"),
+    ("Жопа, спи", "exit"),
+    ("Жопа, иди спать", "exit"),
+    ("До свидания, Жопа!", "exit"),
+])
+def test_whole_commands(router, phrase, intent):
+    assert _intent(router, phrase) == intent
+
+
+@pytest.mark.parametrize("phrase", [
+    "Жопа, не спи",
+    "Жопа, как по-английски «до свидания»?",
+    "Жопа, почему кошки спят днём и спи потом ночью",
+    "Жопа, сколько времени лететь до Марса?",
+    "Жопа, расскажи про время",
+])
+def test_longer_phrases_go_to_gpt(router, phrase):
+    assert _intent(router, phrase) is None
+
+
+def test_volume_limits():
+    tts = _Volume(1.0)
+    router = IntentRouter(tts=tts)
+    assert router.route("громче") == ("volume_up", config.INTENT_REPLIES["volume_up_limit"])
+    assert router.route("тише") == ("volume_down", config.INTENT_REPLIES["volume_down"])
+    assert tts.volume < 1.0
+    assert IntentRouter().route("тише") == ("volume_down", config.INTENT_REPLIES["no_sound"])
+
+
+def test_repeat_without_answer(router):
+    assert router.route("повтори") == ("repeat", config.INTENT_REPLIES["repeat_empty"])
+
+
+def test_record_and_summary(router):
+    router.record("time", 0.2, offline=True)
+    router.record("exit", 0.4, offline=False)
+    assert router.stats == {"local": 2, "offline": 1, "intents": {"time": 1, "exit": 1}}
+    assert "локально 2 из 4 ходов (50%)" in router.summary(4)
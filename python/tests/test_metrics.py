@@ -0,0 +1,82 @@
+"""Реестр метрик: текстовый формат Prometheus и /health."""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, MetricsServer
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_with_escaped_labels(registry):
+    counter = registry.counter("test_calls_total", "Вызовы", ("kind", "error"))
+    counter.inc("stt", 'bad "quote"\\path\nline')
+    counter.inc("chat", "network", amount=2)
+    text = registry.render()
+    assert "# HELP test_calls_total Вызовы\n# TYPE test_calls_total counter\n" in text
+    assert 'test_calls_total{kind="chat",error="network"} 2\n' in text
+    assert 'test_calls_total{kind="stt",error="bad \\"quote\\"\\\\path\\nline"} 1\n' in text
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = registry.histogram("test_seconds", "Задержка", ("station",), buckets=(0.5, 1.0))
+    for value in (0.2, 0.7, 0.8, 3.0):
+        histogram.observe(value, "k1")
+    lines = histogram.render()
+    assert lines == [
+        'test_seconds_bucket{station="k1",le="0.5"} 1',
+        'test_seconds_bucket{station="k1",le="1.0"} 3',
+        'test_seconds_bucket{station="k1",le="+Inf"} 4',
+        'test_seconds_sum{station="k1"} 4.7',
+        'test_seconds_count{station="k1"} 4',
+    ]
+    assert histogram.count("k1") == 4
+
+
+def test_gauge_skips_failing_source(registry):
+    gauge = registry.gauge("test_depth", "Очередь", ("queue",))
+    gauge.track(lambda: 3, "audio")
+    gauge.track(lambda: 1 / 0, "broken")
+    gauge.track(lambda: None, "unknown")
+    assert gauge.render() == ['test_depth{queue="audio"} 3']
+    gauge.untrack("audio")
+    assert gauge.render() == []
+
+
+def test_health_fails_on_bad_or_crashing_check(registry):
+    registry.add_check("serial", lambda: (True, "COM9"))
+    assert registry.health()[0]
+    registry.add_check("api", lambda: 1 / 0)
+    ok, report = registry.health()
+    assert not ok
+    assert report["status"] == "degraded"
+    assert report["checks"]["serial"] == {"ok": True, "detail": "COM9"}
+    assert report["checks"]["api"]["ok"] is False
+
+
+def test_http_status_codes(registry):
+    registry.counter("test_total", "Тест").inc()
+    server = MetricsServer(registry, 0, host="127.0.0.1")
+    server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        with urllib.request.urlopen(base + "/metrics") as response:
+            assert response.status == 200
+            assert "test_total 1" in response.read().decode("utf-8")
+        with urllib.request.urlopen(base + "/health") as response:
+            assert response.status == 200
+
+        registry.add_check("audio", lambda: (False, "поток вывода мёртв"))
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(base + "/health")
+        assert error.value.code == 503
+        report = json.loads(error.value.read().decode("utf-8"))
+        assert report["checks"]["audio"]["detail"] == "поток вывода мёртв"
+    finally:
+        server.close()
@@ -0,0 +1,68 @@
+"""AudioScheduler: приоритеты, вытеснение и гонки с clear()."""
+
+import threading
+import time
+
+import pytest
+
+from playback import PRIORITY_ANSWER, PRIORITY_GREETING, PRIORITY_SLEEP, AudioScheduler
+from tts import OUTPUT_RATE, NullOutput
+
+
+def _pcm(seconds):
+    return bytes(int(OUTPUT_RATE * seconds) * 2)
+
+
+@pytest.fixture
+def output():
+    return NullOutput(realtime=True)
+
+
+@pytest.fixture
+def scheduler(output):
+    scheduler = AudioScheduler(output, echo_tail_sec=0)
+    yield scheduler
+    scheduler.close()
+
+
+def test_same_priority_plays_in_order(scheduler):
+    order = []
+    futures = [scheduler.submit(lambda i=i: order.append(i)) for i in range(5)]
+    assert all(f.result(timeout=2) for f in futures)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_higher_priority_preempts_and_drops(scheduler, output):
+    started = threading.Event()
+    greeting = scheduler.submit(lambda: output.play_pcm(_pcm(5)), PRIORITY_GREETING,
+                                before=started.set)
+    queued = scheduler.submit(lambda: output.play_pcm(_pcm(5)), PRIORITY_GREETING)
+    assert started.wait(2)
+    sleep = scheduler.submit(lambda: None, PRIORITY_SLEEP)
+    assert greeting.result(timeout=2) is False
+    assert queued.result(timeout=2) is False
+    assert sleep.result(timeout=2) is True
+
+
+def test_stop_between_check_and_play_is_not_lost(scheduler, output):
+    """clear() в окне между проверкой cancelled и стартом звука обрывает звук."""
+    future = scheduler.submit(lambda: output.play_pcm(_pcm(5)), PRIORITY_ANSWER,
+                              before=scheduler.clear)
+    started = time.monotonic()
+    assert future.result(timeout=2) is False
+    assert time.monotonic() - started < 1
+
+
+def test_clear_before_pickup_releases_speaking(scheduler):
+    """Звук выкинут до того, как поток вывода его взял, — speaking опускается."""
+    busy, release = threading.Event(), threading.Event()
+    first = scheduler.submit(lambda: None, after=lambda: (busy.set(), release.wait(2)))
+    assert busy.wait(2)  # поток вывода занят after() первого звука
+    second = scheduler.submit(lambda: None)
+    scheduler.clear()
+    release.set()
+    assert first.result(timeout=2) is True
+    assert second.result(timeout=2) is False
+    assert scheduler.wait_idle(timeout=2)
+    assert not scheduler.speaking.is_set()
+    assert not scheduler.is_active()
@@ -0,0 +1,187 @@
+"""RetryPolicy: классы ошибок, дедлайн хода, hedging и отмена проигравшего."""
+
+import threading
+import time
+
+import pytest
+
+import config
+from retry import Deadline, RetryPolicy, current_attempt
+from transport import SharedTransport
+
+
+def _policy(**kwargs):
+    kwargs.setdefault("max_attempts", 3)
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.02)
+    return RetryPolicy("stt", **kwargs)
+
+
+def _primed(policy, seconds, count=None):
+    """Накопить замеры латентности — hedging включается по p95."""
+    for _ in range(count or config.HEDGE_MIN_SAMPLES):
+        policy.latency.add(seconds)
+    return policy
+
+
+def test_retries_network_errors_then_succeeds():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) < 3:
+            raise ConnectionError("обрыв")
+        return "ok"
+
+    policy = _policy()
+    assert policy.call(fn) == "ok"
+    assert len(calls) == 3
+    assert policy.stats["retries"] == 2
+    assert policy.stats["failures"] == 0
+
+
+def test_gives_up_after_max_attempts():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        raise ValueError("плохой запрос")  # класс unknown — повторяется до лимита
+
+    policy = _policy(max_attempts=2)
+    with pytest.raises(ValueError):
+        policy.call(fn)
+    assert len(calls) == 2
+    assert policy.stats["failures"] == 1
+
+
+def test_deadline_stops_retries():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        raise ConnectionError("обрыв")
+
+    policy = _policy(max_attempts=5)
+    deadline = Deadline(budget=0.5)  # меньше RETRY_MIN_ATTEMPT_SEC — повторов нет
+    with pytest.raises(ConnectionError):
+        policy.call(fn, deadline=deadline)
+    assert len(calls) == 1
+
+
+def test_retry_timeout_is_cut_to_remaining_budget():
+    timeouts = []
+
+    def fn(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) == 1:
+            raise ConnectionError("обрыв")
+        return "ok"
+
+    policy = _policy()
+    policy.call(fn, deadline=Deadline(budget=3.0))
+    assert timeouts[0] == policy.timeout  # первая попытка — полный таймаут
+    assert timeouts[1] <= 3.0
+
+
+def test_hedge_duplicate_wins_when_first_is_slow():
+    policy = _primed(_policy(hedge=True), 0.05)
+    started = []
+    release_first = threading.Event()
+
+    def fn(timeout):
+        started.append(timeout)
+        if len(started) == 1:
+            release_first.wait(2)  # первый запрос завис
+            return "first"
+        return "second"
+
+    t0 = time.monotonic()
+    assert policy.call(fn) == "second"
+    assert time.monotonic() - t0 < 1.0
+    assert policy.stats["hedges"] == 1
+    assert policy.stats["hedge_wins"] == 1
+    release_first.set()
+
+
+def test_hedge_loser_is_cancelled_and_keeps_slot_until_it_returns():
+    """Отменённый запрос ещё идёт к API — слот отдаётся, только когда он вернётся."""
+    transport = SharedTransport(api_key="test")
+    policy = _primed(_policy(hedge=True), 0.05)
+    release_first = threading.Event()
+    attempts = []
+
+    def fn(timeout):
+        with transport.slot():
+            attempts.append(current_attempt())
+            if len(attempts) == 1:
+                release_first.wait(2)
+                return "first"
+            return "second"
+
+    assert policy.call(fn) == "second"
+    assert attempts[0].cancelled
+    assert transport.inflight == 1
+    release_first.set()
+    time.sleep(0.05)
+    assert transport.inflight == 0
+
+
+def test_no_hedge_without_free_slot(monkeypatch):
+    monkeypatch.setattr(config, "UPSTREAM_CONCURRENCY", 1)
+    transport = SharedTransport(api_key="test")
+    policy = _primed(_policy(hedge=True), 0.05)
+    sent = []
+
+    def fn(timeout):
+        with transport.slot():
+            sent.append(current_attempt().hedge)
+            time.sleep(0.2)
+            return "first"
+
+    assert policy.call(fn) == "first"
+    assert sent == [False]  # дубликат не ушёл: единственный слот занят
+    assert policy.stats["hedges"] == 0
+    assert policy.stats["hedges_skipped"] == 1
+
+
+def test_hung_loser_does_not_delay_next_call():
+    policy = _primed(_policy(hedge=True), 0.05)
+    release = threading.Event()
+    calls = []
+
+    def hung_first(timeout):
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+        return "ok"
+
+    for _ in range(10):  # больше, чем потоков было в общем пуле
+        calls.clear()
+        assert policy.call(hung_first) == "ok"
+    t0 = time.monotonic()
+    assert policy.call(lambda timeout: "fast") == "fast"
+    assert time.monotonic() - t0 < 0.5
+    release.set()
+
+
+def test_hedge_attempts_keep_own_details():
+    """Уверенность (details) берётся у той попытки, чей текст победил."""
+    policy = _primed(_policy(hedge=True), 0.05)
+    release_first = threading.Event()
+    count = []
+
+    def fn(timeout):
+        count.append(1)
+        details = {}
+        if len(count) == 1:
+            release_first.wait(2)
+            details["no_speech_prob"] = 0.99
+            return "шум", details
+        details["no_speech_prob"] = 0.01
+        return "жопа, привет", details
+
+    text, details = policy.call(fn)
+    release_first.set()
+    time.sleep(0.05)
+    assert text == "жопа, привет"
+    assert details == {"no_speech_prob": 0.01}
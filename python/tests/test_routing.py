@@ -0,0 +1,66 @@
+"""ModelRouter: маршрут по команде и учёт итогов хода."""
+
+import json
+
+import pytest
+
+import config
+from routing import ModelRouter
+
+ANSWERED = [{"role": "user", "content": "кто такой Гагарин"},
+            {"role": "assistant", "content": "Первый человек в космосе."}]
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(echo=False)
+
+
+@pytest.mark.parametrize("command, name", [
+    ("привет", "short"),
+    ("Кто ты?", "short"),
+    ("который час сейчас", "short"),
+    ("какая погода будет завтра в Москве", "normal"),
+    ("расскажи про Python", "long"),
+    ("Почему небо голубое?", "long"),
+    ("слово " * (config.ROUTE_LONG_WORDS + 1), "long"),
+])
+def test_choose(router, command, name):
+    route = router.choose(command)
+    assert route.name == name
+    assert route.max_sentences == config.GPT_ROUTES[name]["max_sentences"]
+
+
+def test_follow_up_only_after_an_answer(router):
+    assert router.choose("а ещё").name == "short"
+    route = router.choose("а ещё", ANSWERED)
+    assert (route.name, route.reason) == ("long", "уточнение")
+
+
+def test_echo_off_prints_nothing(router, capsys):
+    route = router.choose("привет")
+    router.record(route, "привет", {"ttft": 0.3, "total": 0.5, "truncated": True})
+    assert capsys.readouterr().out == ""
+
+
+def test_record_and_summary(router):
+    short = router.choose("привет")
+    router.record(short, "привет", {"ttft": 0.3, "total": 0.5, "truncated": True})
+    router.record(short, "привет", {"ttft": 0.5, "total": 0.9, "truncated": False})
+    router.record(router.choose("почему"), "почему", {"ttft": None, "total": None})
+    assert router.stats["short"] == {"turns": 2, "truncated": 1}
+    assert router.stats["long"] == {"turns": 1, "truncated": 0}
+    summary = router.summary()
+    assert "short 2 (TTFT p50 0.50 с, всего p50 0.90 с, обрезано 1)" in summary
+    assert "long 1" in summary
+
+
+def test_log_file(tmp_path):
+    path = tmp_path / "route.jsonl"
+    router = ModelRouter(log_file=str(path), echo=False)
+    route = router.choose("расскажи анекдот")
+    router.record(route, "расскажи анекдот", {"ttft": 0.4, "total": 1.2, "truncated": False})
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    assert entry["route"] == "long"
+    assert entry["command"] == "расскажи анекдот"
+    assert entry["total"] == 1.2
@@ -0,0 +1,73 @@
+"""ApproachTracker и разбор D<см> — без Arduino и pyserial."""
+
+import pytest
+
+import config
+from approach import ApproachTracker, parse_distance
+
+STEP_SEC = 0.2  # Arduino шлёт замер при изменении, не реже раза в секунду
+
+
+@pytest.mark.parametrize("line, cm", [
+    ("D120", 120),
+    ("D0", 0),
+    ("D999", 999),
+    ("D", None),
+    ("Dx12", None),
+    ("WAKE", None),
+    ("", None),
+])
+def test_parse_distance(line, cm):
+    assert parse_distance(line) == cm
+
+
+def _feed(tracker, distances, start=0.0):
+    return [tracker.update(cm, start + i * STEP_SEC) for i, cm in enumerate(distances)]
+
+
+def test_steady_approach_fires_once():
+    tracker = ApproachTracker()
+    # 240 → 90 см по 10 см за 0.2 с — 50 см/с
+    events = _feed(tracker, range(240, 85, -10))
+    assert events.count(True) == 1
+    assert tracker.velocity == pytest.approx(50, rel=0.05)
+    assert tracker.eta is not None
+
+
+def test_fires_again_after_cooldown():
+    tracker = ApproachTracker()
+    first = _feed(tracker, range(240, 85, -10))
+    _feed(tracker, [999])  # ушёл из виду
+    later = config.APPROACH_COOLDOWN_SEC + 10
+    second = _feed(tracker, range(240, 85, -10), start=later)
+    assert first.count(True) == 1
+    assert second.count(True) == 1
+
+
+def test_jitter_does_not_fire():
+    tracker = ApproachTracker()
+    events = _feed(tracker, [150, 158, 146, 155, 149, 157, 145, 152, 150, 156] * 3)
+    assert not any(events)
+
+
+def test_retreat_does_not_fire():
+    tracker = ApproachTracker()
+    events = _feed(tracker, range(90, 250, 10))
+    assert not any(events)
+    assert tracker.velocity < 0
+    assert tracker.eta is None
+
+
+def test_single_jump_does_not_fire():
+    tracker = ApproachTracker()
+    # Один выброс замера 240 → 100 — два замера, скорость по одному интервалу
+    assert _feed(tracker, [240, 100]) == [False, False]
+
+
+def test_outside_zone_does_not_fire():
+    tracker = ApproachTracker()
+    # Быстро, но дальше APPROACH_MAX_CM, потом уже в зоне WAKE
+    far = range(390, config.APPROACH_MAX_CM, -20)
+    assert not any(_feed(tracker, far))
+    near = ApproachTracker()
+    assert not any(_feed(near, range(config.WAKE_DISTANCE_CM, 10, -10)))
@@ -0,0 +1,32 @@
+"""KioskServer и общие ресурсы станций."""
+
+import pytest
+
+import config
+from server import KioskServer
+from tts import NullOutput, TextToSpeech
+
+
+def test_stations_share_synth_pool(monkeypatch):
+    monkeypatch.setitem(config.BACKENDS, "tts", "null")
+    first = TextToSpeech(output=NullOutput())
+    second = TextToSpeech(output=NullOutput())
+    try:
+        assert first._synth is second._synth
+        assert first.speak("привет").result(timeout=2)
+    finally:
+        first.close()
+    # Закрытая станция не останавливает общий пул
+    assert second.speak("привет").result(timeout=2)
+    second.close()
+    with pytest.raises(RuntimeError):
+        second.speak("привет")
+
+
+def test_rejects_two_stations_on_pygame_mixer():
+    with pytest.raises(ValueError, match="output_device"):
+        KioskServer([{"name": "a"}, {"name": "b"}])
+
+
+def test_one_station_may_use_pygame_mixer():
+    KioskServer([{"name": "a"}, {"name": "b", "output_device": 3}])
@@ -0,0 +1,78 @@
+"""SpeechRecognizer с черновой расшифровкой: фильтр, покрытие и бюджет хода."""
+
+import time
+
+import pytest
+
+import config
+from soak import SyntheticAudio
+from speech import SpeechRecognizer
+
+
+class _SlowAudio(SyntheticAudio):
+    """Микрофон в реальном темпе (почти): черновик успевает вернуться до конца записи."""
+
+    def open(self, frames_per_buffer=None, **kwargs):
+        stream = super().open(frames_per_buffer, **kwargs)
+        read = stream.read
+
+        def slow_read(frames, exception_on_overflow=True):
+            time.sleep(0.01)
+            return read(frames, exception_on_overflow)
+
+        stream.read = slow_read
+        return stream
+
+
+class _STT:
+    name = "fake"
+
+    def __init__(self, text, details):
+        self.text = text
+        self.details = details
+        self.calls = []
+
+    def transcribe(self, audio, filename, language, timeout, details=None):
+        self.calls.append((filename, timeout))
+        if details is not None:
+            details.update(self.details)
+        return self.text
+
+
+@pytest.fixture(autouse=True)
+def draft_enabled(monkeypatch):
+    monkeypatch.setattr(config, "ENDPOINT_DRAFT_STT", True)
+    monkeypatch.setattr(config, "GATE_ENABLED", True)
+
+
+def _recognizer(stt):
+    recognizer = SpeechRecognizer(stt=stt, audio=_SlowAudio())
+    recognizer.calibrate(duration=1)
+    return recognizer
+
+
+def test_draft_used_as_final_text():
+    stt = _STT("Жопа, привет.", {"no_speech_prob": 0.01, "avg_logprob": -0.2})
+    recognizer = _recognizer(stt)
+    assert recognizer.listen() == "Жопа, привет."
+    assert [name for name, _ in stt.calls] == ["draft.wav"]
+    assert stt.calls[0][1] <= config.TURN_BUDGET_SEC
+    # Бюджет хода считается с запроса черновика
+    assert recognizer.turn_deadline.start == recognizer.draft.started
+
+
+def test_draft_goes_through_confidence_checks():
+    stt = _STT("Продолжим.", {"no_speech_prob": 0.95})
+    recognizer = _recognizer(stt)
+    assert recognizer.listen() is None
+    assert recognizer.gate.stats["reasons"] == {"no_speech": 1}
+
+
+def test_draft_not_covering_speech_needs_full_request():
+    stt = _STT("Жопа, привет.", {"no_speech_prob": 0.01})
+    recognizer = _recognizer(stt)
+    recognizer.listen()
+    draft = recognizer.draft
+    assert recognizer._draft_covering_speech() == "Жопа, привет."
+    draft.pcm_length = 0  # черновик с самого начала — вся речь после него
+    assert recognizer._draft_covering_speech() == ""
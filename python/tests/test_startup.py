@@ -0,0 +1,95 @@
+"""Startup: порядок по зависимостям, optional-шаги и фоновые шаги."""
+
+import threading
+import time
+
+import pytest
+
+from startup import Startup, StartupError
+
+
+class _Steps:
+    """Фальшивые шаги: пишут, когда начали и закончили."""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def step(self, name, seconds=0.05, result=None, error=None):
+        def fn(deps):
+            self._log("start", name)
+            time.sleep(seconds)
+            self._log("end", name)
+            if error is not None:
+                raise error
+            return result if result is not None else (name, sorted(deps))
+        return fn
+
+    def index(self, kind, name):
+        return self.events.index((kind, name))
+
+    def _log(self, kind, name):
+        with self._lock:
+            self.events.append((kind, name))
+
+
+def test_dependencies_first_independent_in_parallel():
+    steps = _Steps()
+    startup = Startup()
+    startup.add("transport", steps.step("transport"))
+    startup.add("mic", steps.step("mic"))
+    startup.add("tts", steps.step("tts"), deps=("transport",))
+    startup.add("session", steps.step("session"), deps=("tts", "mic"))
+
+    results = startup.run()
+
+    assert steps.index("end", "transport") < steps.index("start", "tts")
+    assert steps.index("end", "tts") < steps.index("start", "session")
+    assert steps.index("end", "mic") < steps.index("start", "session")
+    # transport и mic идут одновременно: оба начались раньше, чем кто-то закончил
+    assert {steps.events[0][1], steps.events[1][1]} == {"transport", "mic"}
+    assert results["session"] == ("session", ["mic", "tts"])
+
+
+def test_optional_failure_gives_none():
+    steps = _Steps()
+    startup = Startup()
+    startup.add("arduino", steps.step("arduino", error=OSError("нет порта")), optional=True)
+    startup.add("ai", steps.step("ai"))
+    results = startup.run()
+    assert results["arduino"] is None
+    assert results["ai"] == ("ai", [])
+
+
+def test_required_failure_raises():
+    steps = _Steps()
+    startup = Startup()
+    startup.add("transport", steps.step("transport", error=ConnectionError("нет сети")))
+    startup.add("tts", steps.step("tts"), deps=("transport",))
+    with pytest.raises(StartupError, match="transport"):
+        startup.run()
+    assert ("start", "tts") not in steps.events  # зависимый шаг не начинался
+
+
+def test_background_step_does_not_delay_ready():
+    steps = _Steps()
+    release = threading.Event()
+    startup = Startup()
+    startup.add("mic", steps.step("mic"))
+
+    def prefetch(deps):
+        release.wait(2)
+        return "кэш"
+
+    startup.add("prefetch", prefetch, deps=("mic",), background=True)
+    started = time.monotonic()
+    results = startup.run()
+    assert time.monotonic() - started < 1
+    assert "prefetch" not in results
+    release.set()
+
+
+def test_unknown_dependency():
+    startup = Startup()
+    with pytest.raises(ValueError, match="tts"):
+        startup.add("session", lambda deps: None, deps=("tts",))
@@ -0,0 +1,51 @@
+"""TranscriptGate: галлюцинации Whisper отсекаются, команды — нет."""
+
+import pytest
+
+from transcript_gate import TranscriptGate
+
+
+@pytest.fixture
+def gate():
+    return TranscriptGate()
+
+
+@pytest.mark.parametrize("text", [
+    "Продолжение следует...",
+    "Жопа, продолжение следует.",
+    "Субтитры сделал DimaTorzok",
+    "Спасибо за просмотр! Подписывайтесь на канал.",
+])
+def test_rejects_hallucinations(gate, text):
+    assert gate.check(text) == "hallucination"
+
+
+@pytest.mark.parametrize("text", [
+    "Жопа, что значит «продолжение следует»?",
+    "Жопа, как сказать по-английски спасибо за просмотр",
+    "Жопа, который час?",
+])
+def test_passes_commands_that_quote_a_phrase(gate, text):
+    assert gate.check(text, audio_sec=3) is None
+
+
+def test_whisper_confidence(gate):
+    assert gate.check("жопа привет", details={"no_speech_prob": 0.9}) == "no_speech"
+    assert gate.check("жопа привет", details={"avg_logprob": -1.5}) == "low_confidence"
+    assert gate.check("...") == "empty"
+
+
+def test_speech_rate(gate):
+    assert gate.check("жопа расскажи анекдот про программистов", audio_sec=0.5) == "too_fast"
+    assert gate.check("жопа", audio_sec=10) == "too_slow"
+    assert gate.check("жопа", audio_sec=1) is None
+
+
+def test_counts_saved_turns_only_with_wake_word(gate):
+    gate.check("Продолжение следует")
+    gate.check("Жопа, продолжение следует")
+    gate.check("Жопа, который час?")
+    assert gate.stats["checked"] == 3
+    assert gate.stats["rejected"] == 2
+    assert gate.stats["reasons"] == {"hallucination": 2}
+    assert gate.stats["saved_turns"] == 1
@@ -0,0 +1,82 @@
+"""VoiceActivityDetector на синтетических уровнях chunks."""
+
+import random
+
+import config
+from vad import VoiceActivityDetector, adaptive_silence_chunks
+
+CHUNK_SEC = config.CHUNK / config.SAMPLE_RATE
+
+
+def _levels(rng, low, high, seconds):
+    return [rng.uniform(low, high) for _ in range(int(seconds / CHUNK_SEC))]
+
+
+def _utterance_end(levels, noise):
+    """Секунда, на которой VAD + адаптивная тишина закончили бы фразу (None — не закончили)."""
+    vad = VoiceActivityDetector(CHUNK_SEC)
+    vad.seed([noise] * 30)
+    vad.reset()
+    for i, level in enumerate(levels):
+        vad.update(level)
+        if vad.in_speech and vad.silent_chunks >= adaptive_silence_chunks(vad.speech_chunks, CHUNK_SEC):
+            return i * CHUNK_SEC
+    return None
+
+
+def test_short_click_is_not_speech():
+    vad = VoiceActivityDetector(CHUNK_SEC)
+    vad.seed([50] * 30)
+    vad.reset()
+    vad.update(3000)  # один chunk — щелчок
+    vad.update(50)
+    assert not vad.in_speech
+
+
+def test_speech_starts_and_ends():
+    rng = random.Random(1)
+    levels = _levels(rng, 30, 60, 1) + _levels(rng, 900, 2000, 2) + _levels(rng, 30, 60, 3)
+    end = _utterance_end(levels, noise=45)
+    assert end is not None
+    assert 3.0 <= end <= 4.5  # конец речи на 3 с + пауза тишины
+
+
+def test_long_speech_is_not_truncated():
+    """Фон не уползает в уровень речи: тихий конец длинной фразы не обрезается."""
+    rng = random.Random(5)
+    levels = (_levels(rng, 30, 60, 0.6) + _levels(rng, 1500, 2500, 4)
+              + _levels(rng, 500, 900, 4) + _levels(rng, 30, 60, 3))
+    end = _utterance_end(levels, noise=45)
+    assert end is not None
+    assert end >= 8.6  # речь до 8.6 с, раньше фраза обрывалась на ~5.4 с
+
+
+def test_noise_floor_frozen_during_speech():
+    rng = random.Random(4)
+    vad = VoiceActivityDetector(CHUNK_SEC)
+    vad.seed([45] * 30)
+    vad.reset()
+    for level in _levels(rng, 800, 2000, 8):
+        vad.update(level)
+    assert vad.in_speech
+    assert vad.noise < 100
+    assert vad.stop_threshold < 800
+
+
+def test_noisy_room_still_ends():
+    """Потолок нижнего порога не опускается ниже шума — фраза в шумном зале заканчивается."""
+    rng = random.Random(6)
+    levels = _levels(rng, 400, 600, 0.6) + _levels(rng, 900, 1400, 3) + _levels(rng, 400, 600, 12)
+    end = _utterance_end(levels, noise=500)
+    assert end is not None
+    assert end < 6.0
+
+
+def test_noise_adapts_between_phrases():
+    vad = VoiceActivityDetector(CHUNK_SEC)
+    vad.seed([50] * 30)
+    vad.reset()
+    for _ in range(200):
+        vad.update(300)  # включили вентилятор
+    assert vad.noise > 250
+    assert not vad.in_speech
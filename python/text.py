@@ -0,0 +1,35 @@
+"""Текст фраз: нормализация и имя станции.
+
+Общие помощники для сессии, локальных команд, маршрутизации
+и фильтра расшифровок — без зависимостей от остальных модулей.
+"""
+
+import re
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+# Regex для wake-word (как отдельное слово)
+WAKE_PATTERN = re.compile(r'\bжоп[ауеы]?\b|\bzhopa\b', re.IGNORECASE)
+
+
+def normalize(text):
+    """Нижний регистр, без пунктуации, ё → е."""
+    text = _PUNCT.sub(" ", text.lower().replace("ё", "е"))
+    return _SPACES.sub(" ", text).strip()
+
+
+def contains_wake_word(text):
+    """Проверяет есть ли имя ЖОПА в тексте (regex, не substring)."""
+    return bool(WAKE_PATTERN.search(text))
+
+
+def strip_wake_word(text):
+    """Убирает имя из фразы, оставляет команду."""
+    # Находим wake-word и берём всё после него
+    match = WAKE_PATTERN.search(text)
+    if match:
+        after = text[match.end():].strip(" ,!.?")
+        if after:
+            return after
+    return text
@@ -0,0 +1,91 @@
+"""Фильтр расшифровок — шум и галлюцинации Whisper не доходят до GPT и TTS.
+
+На тишине и шуме Whisper «слышит» титры из обучающих видео
+(«Продолжение следует...», «Субтитры сделал...») или выдаёт текст
+с почти нулевой уверенностью. Каждая такая фраза с именем в тексте
+стоила полного хода GPT + TTS. Отсекаем по:
+  - no_speech_prob — Whisper сам считает, что речи не было;
+  - avg_logprob — низкая уверенность в словах;
+  - списку известных галлюцинаций — если фраза из них почти целиком;
+  - скорости речи: символов на секунду записи больше, чем можно сказать,
+    или почти ничего за долгую запись.
+"""
+
+import threading
+
+import config
+from text import contains_wake_word, normalize
+
+
+class TranscriptGate:
+    """Решение «пропустить / отклонить» + счётчики сэкономленного."""
+
+    def __init__(self):
+        self._phrases = [normalize(p) for p in config.HALLUCINATION_PHRASES]
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "rejected": 0, "reasons": {},
+                      "saved_turns": 0, "saved_usd": 0.0, "saved_sec": 0.0}
+
+    def check(self, text, audio_sec=None, details=None):
+        """None — расшифровка годится, иначе причина отказа."""
+        reason = self._reason(text, audio_sec, details or {})
+        with self._lock:
+            self.stats["checked"] += 1
+            if reason is None:
+                return None
+            self.stats["rejected"] += 1
+            self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+            # Без имени фраза и так игнорировалась — сэкономлен только ход с именем
+            if contains_wake_word(text):
+                self.stats["saved_turns"] += 1
+                self.stats["saved_usd"] += config.GATE_TURN_COST["usd"]
+                self.stats["saved_sec"] += config.GATE_TURN_COST["sec"]
+        return reason
+
+    def summary(self):
+        st = self.stats
+        share = st["rejected"] / st["checked"] * 100 if st["checked"] else 0.0
+        reasons = ", ".join(f"{k} {v}" for k, v in sorted(st["reasons"].items())) or "—"
+        return (f"проверено {st['checked']}, отклонено {st['rejected']} ({share:.0f}%: {reasons}), "
+                f"сэкономлено ходов {st['saved_turns']}: ~${st['saved_usd']:.3f}, "
+                f"~{st['saved_sec']:.0f} с")
+
+    # === Внутренние методы ===
+
+    def _reason(self, text, audio_sec, details):
+        no_speech = details.get("no_speech_prob")
+        if no_speech is not None and no_speech >= config.GATE_NO_SPEECH_PROB:
+            return "no_speech"
+
+        logprob = details.get("avg_logprob")
+        if logprob is not None and logprob < config.GATE_MIN_AVG_LOGPROB:
+            return "low_confidence"
+
+        norm = normalize(text)
+        if not norm:
+            return "empty"
+        if self._is_hallucination(norm):
+            return "hallucination"
+
+        seconds = audio_sec or details.get("duration")
+        if seconds:
+            rate = len(norm) / seconds
+            if rate > config.GATE_MAX_CHARS_PER_SEC:
+                return "too_fast"
+            if seconds >= config.GATE_MIN_RATE_AFTER_SEC and rate < config.GATE_MIN_CHARS_PER_SEC:
+                return "too_slow"
+        return None
+
+    def _is_hallucination(self, norm):
+        """Фраза целиком (или почти) из известных галлюцинаций.
+
+        «Жопа, продолжение следует» — титры; «жопа, что значит продолжение
+        следует» — команда: после вычёркивания фраз остаются слова.
+        """
+        words = f" {norm} "
+        found = False
+        for phrase in self._phrases:
+            if f" {phrase} " in words:
+                words = words.replace(f" {phrase} ", " ")
+                found = True
+        return found and len(words.split()) <= config.GATE_HALLUCINATION_EXTRA_WORDS
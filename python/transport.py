@@ -0,0 +1,266 @@
+"""Общий HTTP-транспорт для всех вызовов OpenAI — пул соединений + keep-alive."""
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from retry import SlotBusy, current_attempt
+
+
+class SharedTransport:
+    """Один пул HTTP-соединений на Whisper, GPT и TTS.
+
+    Держит соединения тёплыми: прогрев при WAKE и периодический пинг,
+    пока человек стоит рядом. Считает, сколько запросов ушло по уже
+    открытому соединению, а сколько потребовало нового TLS-рукопожатия.
+    """
+
+    def __init__(self, api_key=None, pool_size=None, http2=None):
+        self.api_key = api_key or config.OPENAI_API_KEY
+        self.pool_size = pool_size or config.HTTP_POOL_SIZE
+        self.http2 = config.HTTP2_ENABLED if http2 is None else http2
+
+        self._client = None
+        self._http = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._streams = {}  # id(network_stream) → stream, для подсчёта reuse
+        self._warming = False
+
+        self._keepalive_stop = threading.Event()
+        self._keepalive_thread = None
+        self._keepalive_users = 0
+
+        self._slots = threading.BoundedSemaphore(config.UPSTREAM_CONCURRENCY)
+        self._inflight = 0
+        self._last_response = None  # monotonic последнего ответа API (любой статус)
+        self._probe = None  # (время, ok, подробности) последней TCP-пробы
+
+        self.stats = {
+            "requests": 0, "new_connections": 0, "reused": 0, "warmups": 0,
+            "max_inflight": 0, "slot_waits": 0, "slot_wait_sec": 0.0,
+        }
+
+    @property
+    def client(self):
+        """OpenAI клиент поверх общего пула (создаётся при первом обращении)."""
+        with self._lock:
+            if self._client is None:
+                self._client = self._build_client()
+            return self._client
+
+    def timeout(self, kind, total=None):
+        """Таймаут для типа вызова: stt, chat, tts, warmup. total — урезанный бюджет попытки."""
+        import httpx
+
+        if total is None:
+            total = config.HTTP_TIMEOUTS.get(kind, config.HTTP_TIMEOUTS["chat"])
+        return httpx.Timeout(total, connect=min(total, config.HTTP_CONNECT_TIMEOUT))
+
+    # === Прогрев ===
+
+    def warmup(self, background=False):
+        """Открыть/освежить соединения в пуле. background=True — не блокирует."""
+        if self._client is None:
+            return  # ни один движок OpenAI не выбран — греть нечего
+        if background:
+            threading.Thread(target=self.warmup, daemon=True).start()
+            return
+
+        with self._stats_lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        try:
+            # Параллельные пинги открывают несколько соединений сразу:
+            # приветствие TTS и запись Whisper могут идти одновременно
+            threads = [
+                threading.Thread(target=self._ping, daemon=True)
+                for _ in range(max(1, config.HTTP_WARM_CONNECTIONS))
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            with self._stats_lock:
+                self._warming = False
+                self.stats["warmups"] += 1
+
+    def start_keepalive(self, interval=None):
+        """Периодический прогрев, пока человек рядом (счётчик — для нескольких станций)."""
+        interval = interval or config.KEEPALIVE_INTERVAL_SEC
+        with self._stats_lock:
+            self._keepalive_users += 1
+            if self._keepalive_thread and self._keepalive_thread.is_alive() \
+                    and not self._keepalive_stop.is_set():
+                return
+            # Свой Event на каждый поток — старый поток точно завершится
+            self._keepalive_stop = threading.Event()
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, args=(interval, self._keepalive_stop), daemon=True
+            )
+            self._keepalive_thread.start()
+
+    def stop_keepalive(self):
+        """Снять один запрос keep-alive; пинги прекращаются, когда никому не нужны."""
+        with self._stats_lock:
+            self._keepalive_users = max(0, self._keepalive_users - 1)
+            if self._keepalive_users == 0:
+                self._keepalive_stop.set()
+
+    @contextmanager
+    def slot(self):
+        """Ограничение одновременных вызовов API на весь процесс.
+
+        Слот отдаётся, только когда запрос вернулся: отменённая hedged-попытка
+        (ответил дубликат) всё ещё идёт к API и занимает его. Дубликат слот
+        не ждёт — нет свободного, значит не отправляется (SlotBusy).
+        """
+        attempt = current_attempt()
+        if attempt is not None and attempt.cancelled:
+            raise TimeoutError("попытка отменена до запроса")
+        started = time.monotonic()
+        if attempt is not None and attempt.hedge:
+            if not self._slots.acquire(blocking=False):
+                raise SlotBusy("все слоты заняты — дубликат не отправлен")
+        else:
+            self._slots.acquire()
+        waited = time.monotonic() - started
+
+        with self._stats_lock:
+            self._inflight += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self._inflight)
+            if waited > 0.01:
+                self.stats["slot_waits"] += 1
+                self.stats["slot_wait_sec"] += waited
+        try:
+            yield
+        finally:
+            with self._stats_lock:
+                self._inflight -= 1
+            self._slots.release()
+
+    # === Статистика ===
+
+    @property
+    def inflight(self):
+        """Сколько вызовов API идёт прямо сейчас."""
+        return self._inflight
+
+    def upstream_status(self):
+        """Проверка здоровья: (ok, подробности) о доступности API.
+
+        Недавний ответ API — уже доказательство; иначе TCP-проба до хоста,
+        результат которой кэшируется на HEALTH_PROBE_CACHE_SEC.
+        """
+        if "openai" not in config.BACKENDS.values():
+            return True, "не используется (движки без OpenAI)"
+        now = time.monotonic()
+        last = self._last_response
+        if last is not None and now - last < config.HEALTH_UPSTREAM_FRESH_SEC:
+            return True, f"ответ API {now - last:.0f} с назад"
+
+        probe = self._probe
+        if probe is None or now - probe[0] >= config.HEALTH_PROBE_CACHE_SEC:
+            host = config.HEALTH_UPSTREAM_HOST
+            try:
+                with socket.create_connection((host, 443), timeout=config.HEALTH_PROBE_TIMEOUT):
+                    pass
+                probe = (now, True, f"{host}:443 доступен")
+            except OSError as e:
+                probe = (now, False, f"{host}:443 недоступен: {e}")
+            self._probe = probe
+        return probe[1], probe[2]
+
+    def reuse_rate(self):
+        """Доля запросов, ушедших по уже открытому соединению (0..1)."""
+        with self._stats_lock:
+            total = self.stats["new_connections"] + self.stats["reused"]
+            return self.stats["reused"] / total if total else 0.0
+
+    def summary(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return (
+            f"запросов: {stats['requests']}, новых соединений: {stats['new_connections']}, "
+            f"reuse: {self.reuse_rate() * 100:.0f}%, прогревов: {stats['warmups']}, "
+            f"макс. параллельно: {stats['max_inflight']}, ожиданий слота: {stats['slot_waits']}"
+        )
+
+    def close(self):
+        self._keepalive_stop.set()
+        if self._http is not None:
+            self._http.close()
+
+    # === Внутренние методы ===
+
+    def _build_client(self):
+        import httpx
+        from openai import OpenAI
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("[HTTP] Пакет h2 не установлен — работаю по HTTP/1.1")
+                http2 = False
+
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=config.HTTP_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._http = httpx.Client(
+            limits=limits,
+            http2=http2,
+            timeout=self.timeout("chat"),
+            event_hooks={"response": [self._on_response]},
+        )
+        # Повторы делает retry.RetryPolicy — встроенные retry SDK выключены
+        return OpenAI(api_key=self.api_key, http_client=self._http, max_retries=0)
+
+    def _on_response(self, response):
+        """Hook httpx: новое соединение или переиспользованное."""
+        stream = response.extensions.get("network_stream")
+        self._last_response = time.monotonic()
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            if stream is None:
+                return
+            key = id(stream)
+            if key in self._streams:
+                self.stats["reused"] += 1
+                return
+            self.stats["new_connections"] += 1
+            # Держим ссылку, чтобы id не переиспользовался; старые выкидываем
+            self._streams[key] = stream
+            if len(self._streams) > self.pool_size * 4:
+                self._streams.pop(next(iter(self._streams)))
+
+    def _ping(self):
+        try:
+            self.client.models.list(timeout=self.timeout("warmup"))
+        except Exception as e:
+            print(f"[HTTP] Прогрев не удался: {e}")
+
+    def _keepalive_loop(self, interval, stop):
+        while not stop.wait(interval):
+            self.warmup()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_transport():
+    """Общий транспорт процесса (создаётся при первом вызове)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SharedTransport()
+        return _default
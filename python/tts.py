@@ -1,168 +1,477 @@
-"""Модуль синтеза речи — OpenAI TTS с поддержкой streaming chunks."""
+"""Модуль синтеза речи — движок TTS (по умолчанию OpenAI) с поддержкой streaming chunks."""
 
 import array
+import io
 import math
 import os
 import tempfile
+import threading
 import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from openai import OpenAI
-import pygame
-
+import backends
 import config
+from playback import (PRIORITY_ANSWER, PRIORITY_GREETING, PRIORITY_SLEEP, AudioScheduler,
+                      tts_failures)
+from retry import Deadline, classify_error, get_policy
+
+
+class TTSCache:
+    """LRU-кэш синтезированного аудио: (движок, голос, текст) → байты."""
+
+    def __init__(self, max_items=None):
+        self.max_items = max_items or config.TTS_CACHE_SIZE
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
+    def get(self, key):
+        with self._lock:
+            audio = self._items.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return audio
 
-class TextToSpeech:
-    """Озвучка через OpenAI TTS API — живой человеческий голос."""
+    def put(self, key, audio):
+        with self._lock:
+            self._items[key] = audio
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        """Проверка без счёта попаданий/промахов."""
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """Общий кэш TTS процесса."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
+
+
+_synth_pool = None
+
+
+def get_synth_pool():
+    """Общие потоки синтеза процесса — их число не растёт со станциями."""
+    global _synth_pool
+    with _cache_lock:
+        if _synth_pool is None:
+            _synth_pool = ThreadPoolExecutor(max_workers=config.TTS_SYNTH_WORKERS,
+                                             thread_name_prefix="tts")
+        return _synth_pool
+
+
+OUTPUT_RATE = 24000  # Гц — и OpenAI pcm, и pygame.mixer работают на 24 кГц
+
+
+def _tone(freq, duration_ms, volume, fade_ratio):
+    """Синус с плавным fade in/out — PCM 16 бит, OUTPUT_RATE."""
+    n_samples = int(OUTPUT_RATE * duration_ms / 1000)
+    fade = max(1, int(n_samples * fade_ratio))
+    buf = array.array("h", [0] * n_samples)
+    for i in range(n_samples):
+        t = i / OUTPUT_RATE
+        envelope = 1.0
+        if i < fade:
+            envelope = i / fade
+        elif i > n_samples - fade:
+            envelope = (n_samples - i) / fade
+        buf[i] = int(32767 * volume * envelope * math.sin(2 * math.pi * freq * t))
+    return buf
+
+
+def _scale(pcm, volume):
+    """Громкость PCM 16 бит программно — для вывода без своего регулятора."""
+    samples = array.array("h", bytes(pcm))
+    for i, sample in enumerate(samples):
+        samples[i] = int(sample * volume)
+    return samples.tobytes()
+
+
+def audio_duration(audio, audio_format):
+    """Длительность аудио в секундах (для mp3 — 0, без декодирования не узнать)."""
+    if audio_format == "pcm":
+        return len(audio) / 2 / OUTPUT_RATE
+    if audio_format == "wav":
+        with wave.open(io.BytesIO(audio), "rb") as wf:
+            return wf.getnframes() / wf.getframerate()
+    return 0.0
+
+
+class PygameOutput:
+    """Вывод через pygame.mixer — устройство по умолчанию, одно на процесс."""
+
+    def __init__(self):
+        import pygame  # тяжёлый импорт — только когда нужен звук
+
+        pygame.mixer.init(frequency=OUTPUT_RATE, size=-16, channels=1)
+        self._stopped = threading.Event()
+        self.volume = 1.0
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def status(self):
+        """Проверка здоровья: (ok, подробности)."""
+        import pygame
+
+        if pygame.mixer.get_init() is None:
+            return False, "pygame.mixer не инициализирован"
+        return True, "pygame.mixer"
+
+    def play_audio(self, audio, audio_format):
+        """Проиграть байты аудио (mp3 / wav / pcm). Блокирующий вызов."""
+        import pygame
+
+        if audio_format == "pcm":
+            self.play_pcm(audio)
+            return
+
+        with tempfile.NamedTemporaryFile(suffix=f".{audio_format}", delete=False) as f:
+            f.write(audio)
+            tmp_path = f.name
+
+        try:
+            pygame.mixer.music.load(tmp_path)
+            pygame.mixer.music.set_volume(self.volume)
+            pygame.mixer.music.play()
+
+            while pygame.mixer.music.get_busy():
+                if self._stopped.is_set():
+                    pygame.mixer.music.stop()
+                    break
+                pygame.time.wait(50)
+        finally:
+            # Раздельно: unload() нет в pygame < 2.0 — файл всё равно удаляем
+            try:
+                pygame.mixer.music.unload()
+            except Exception:
+                pass
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def play_pcm(self, pcm, pad_ms=0):
+        """Проиграть сырой PCM и дождаться конца."""
+        import pygame
+
+        sound = pygame.mixer.Sound(buffer=pcm)
+        sound.set_volume(self.volume)
+        channel = sound.play()
+        # Ждём по кусочку, чтобы stop() обрывал звук сразу — даже пришедший до play()
+        while channel is not None and channel.get_busy():
+            if self._stopped.is_set():
+                channel.stop()
+                return
+            pygame.time.wait(20)
+        if pad_ms:
+            pygame.time.wait(pad_ms)
+
+    def reset(self):
+        self._stopped.clear()
+
+    def stop(self):
+        import pygame
+
+        self._stopped.set()
+        pygame.mixer.music.stop()
+        pygame.mixer.stop()
+
+    def close(self):
+        pass
+
+
+class DeviceOutput:
+    """Вывод на конкретное устройство через PyAudio (mp3 не умеет — нужен wav/pcm).
+
+    Нужен серверу с несколькими станциями: у pygame.mixer одно устройство на процесс.
+    """
+
+    def __init__(self, device_index):
+        import pyaudio
+
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=pyaudio.paInt16, channels=1, rate=OUTPUT_RATE,
+            output=True, output_device_index=device_index,
+        )
+        self._stopped = threading.Event()
+        self._device = device_index
+        self.volume = 1.0
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def status(self):
+        """Проверка здоровья: (ok, подробности)."""
+        if self._stream.is_stopped():
+            return False, f"поток вывода {self._device} остановлен"
+        return True, f"устройство {self._device}"
+
+    def play_audio(self, audio, audio_format):
+        if audio_format == "wav":
+            with wave.open(io.BytesIO(audio), "rb") as wf:
+                pcm = wf.readframes(wf.getnframes())
+        elif audio_format == "pcm":
+            pcm = audio
+        else:
+            raise ValueError(f"DeviceOutput не умеет {audio_format} — выбери pcm")
+        self.play_pcm(pcm)
+
+    def play_pcm(self, pcm, pad_ms=0):
+        view = memoryview(pcm).cast("B")
+        step = OUTPUT_RATE // 10 * 2  # по 100 мс, чтобы stop() срабатывал быстро
+        for offset in range(0, len(view), step):
+            if self._stopped.is_set():
+                return
+            chunk = bytes(view[offset:offset + step])
+            if self.volume < 1.0:
+                chunk = _scale(chunk, self.volume)
+            self._stream.write(chunk)
+        if pad_ms:
+            time.sleep(pad_ms / 1000)
+
+    def reset(self):
+        self._stopped.clear()
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pa.terminate()
 
-    def __init__(self, client=None, voice=None):
-        self.client = client or OpenAI(api_key=config.OPENAI_API_KEY)
+
+class NullOutput:
+    """Без звука — для симуляции станций и нагрузочных тестов.
+
+    realtime=True — ждёт столько, сколько звучало бы аудио (делённое на speed).
+    """
+
+    def __init__(self, realtime=False, speed=1.0):
+        self.realtime = realtime
+        self.speed = speed
+        self.volume = 1.0
+        self._stopped = threading.Event()
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def status(self):
+        return True, "без звука"
+
+    def play_audio(self, audio, audio_format):
+        self._wait(audio_duration(audio, audio_format))
+
+    def play_pcm(self, pcm, pad_ms=0):
+        self._wait(len(pcm) / 2 / OUTPUT_RATE + pad_ms / 1000)
+
+    def reset(self):
+        self._stopped.clear()
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        pass
+
+    def _wait(self, seconds):
+        if self.realtime and seconds > 0:
+            self._stopped.wait(seconds / self.speed)
+
+
+class TextToSpeech:
+    """Озвучка через движок TTS — по умолчанию OpenAI, живой человеческий голос.
+
+    Весь звук идёт через AudioScheduler: методы озвучки не блокируют
+    и возвращают Future (True — доиграло). Синтез следующих предложений
+    идёт, пока играет текущее.
+    """
+
+    def __init__(self, engine=None, voice=None, transport=None, cache=None, output=None):
+        self.engine = engine or backends.create("tts", transport=transport)
+        self.cache = cache or get_tts_cache()
+        self.output = output or PygameOutput()
+        self.scheduler = AudioScheduler(self.output)
         self.voice = voice or config.TTS_VOICE
+        self.volume = None
+        self.set_volume(config.TTS_VOLUME)
+        self._synth = get_synth_pool()
+        self._closed = False
+        self._pending = 0  # предложений ждут синтеза или синтезируются
+        self._pending_lock = threading.Lock()
         self._on_start = None
         self._on_end = None
-        self._speaking = False
 
-        pygame.mixer.init(frequency=24000, size=-16, channels=1)
+    # === Синтез и кэш ===
 
-    def on_start(self, callback):
-        self._on_start = callback
+    def synthesize(self, text):
+        """Байты аудио для текста: из кэша или через движок (retry по общей политике)."""
+        key = self._cache_key(text)
+        audio = self.cache.get(key)
+        if audio is not None:
+            return audio
 
-    def on_end(self, callback):
-        self._on_end = callback
+        deadline = Deadline(config.TTS_SENTENCE_BUDGET_SEC)
 
-    # === Озвучка одного предложения (для streaming pipeline) ===
+        def synthesize(timeout):
+            return self.engine.synthesize(text, self.voice, timeout)
 
-    def speak_chunk(self, text, is_first=False, is_last=False):
-        """Озвучить одно предложение. Для streaming GPT → TTS."""
-        if not text:
-            return
+        try:
+            audio = get_policy("tts").call(synthesize, deadline=deadline)
+        except Exception as e:
+            print(f"[TTS] Не удалось озвучить ({classify_error(e)}): {e}")
+            tts_failures.inc("synth")
+            return None
 
-        if is_first and self._on_start:
-            self._on_start()
-            self._speaking = True
+        self.cache.put(key, audio)
+        return audio
 
-        self._play_text(text)
+    @property
+    def pending(self):
+        """Глубина очереди синтеза."""
+        return self._pending
 
-        if is_last and self._on_end:
-            self._on_end()
-            self._speaking = False
+    def status(self):
+        """Проверка здоровья вывода: устройство и поток очереди звука."""
+        if not self.scheduler.alive:
+            return False, "поток вывода звука остановлен"
+        return self.output.status()
 
-    # === Полная озвучка (для текстового режима / ошибок) ===
+    def is_cached(self, text):
+        """Фраза уже синтезирована — озвучка без сети."""
+        return self._cache_key(text) in self.cache
 
-    def speak(self, text):
-        """Озвучить весь текст. Блокирующий вызов."""
-        if not text:
-            return
+    def set_volume(self, volume):
+        """Громкость 0.2–1.0 (в ноль не уводим — иначе станция «сломалась»)."""
+        self.volume = round(min(1.0, max(config.VOLUME_STEP, volume)), 2)
+        self.output.set_volume(self.volume)
+
+    def prefetch(self, texts):
+        """Заранее синтезировать фразы (приветствия и т.п.) в кэш."""
+        for text in texts:
+            self.synthesize(text)
+
+    def warmup(self):
+        """Прогрев движка TTS."""
+        self.engine.warmup()
+
+    def on_start(self, callback):
+        self._on_start = callback
 
-        if self._on_start:
-            self._on_start()
+    def on_end(self, callback):
+        self._on_end = callback
 
-        self._play_text(text)
+    # === Озвучка по предложениям (для streaming pipeline) ===
 
-        if self._on_end:
-            self._on_end()
+    def speak_chunk(self, text, is_first=False):
+        """Поставить в очередь одно предложение. Синтез начинается сразу."""
+        if not text:
+            return None
+        return self._submit_text(text, PRIORITY_ANSWER,
+                                 before=self._on_start if is_first else None)
+
+    def end_chunks(self):
+        """Конец ответа: после последнего предложения — стоп анимации."""
+        return self.scheduler.submit(lambda: None, PRIORITY_ANSWER, after=self._on_end)
+
+    def speak_cached(self, text):
+        """Фраза только из кэша — играет мгновенно. Нет в кэше — None, синтез не запускаем."""
+        audio = self.cache.get(self._cache_key(text))
+        if audio is None:
+            return None
+        return self.scheduler.submit(lambda: self._play_audio(audio), PRIORITY_ANSWER,
+                                     before=self._on_start)
+
+    # === Полная озвучка (приветствие, прощание, ошибки) ===
+
+    def speak(self, text, priority=PRIORITY_ANSWER):
+        """Озвучить весь текст. Не блокирует — .result() у Future дождётся конца."""
+        if not text:
+            return None
+        return self._submit_text(text, priority, before=self._on_start, after=self._on_end)
 
     def stop(self):
-        """Остановить воспроизведение."""
-        pygame.mixer.music.stop()
-        if self._speaking and self._on_end:
-            self._on_end()
-            self._speaking = False
+        """Оборвать воспроизведение и очистить очередь."""
+        self.scheduler.clear()
+
+    def close(self):
+        self._closed = True  # пул общий — не останавливаем, только не берём новый синтез
+        self.scheduler.close()
+        self.output.close()
 
     # === Звуковые эффекты ===
 
-    @staticmethod
-    def play_beep(frequency=None, duration_ms=None, volume=None):
+    def play_beep(self, frequency=None, duration_ms=None, volume=None):
         """Короткий beep — подтверждение wake-word."""
         freq = frequency or config.BEEP_FREQUENCY
         dur = duration_ms or config.BEEP_DURATION
         vol = volume or config.BEEP_VOLUME
+        pcm = _tone(freq, dur, vol, fade_ratio=0.1)
+        return self.scheduler.submit(lambda: self.output.play_pcm(pcm, pad_ms=20), PRIORITY_ANSWER)
 
-        sample_rate = 24000
-        n_samples = int(sample_rate * dur / 1000)
-
-        buf = array.array("h", [0] * n_samples)
-        for i in range(n_samples):
-            t = i / sample_rate
-            # Fade in/out для мягкого звука
-            envelope = 1.0
-            fade = int(n_samples * 0.1)
-            if i < fade:
-                envelope = i / fade
-            elif i > n_samples - fade:
-                envelope = (n_samples - i) / fade
-            buf[i] = int(32767 * vol * envelope * math.sin(2 * math.pi * freq * t))
-
-        sound = pygame.mixer.Sound(buffer=buf)
-        sound.play()
-        pygame.time.wait(dur + 20)
-
-    @staticmethod
-    def play_melody(notes, duration_ms=150, volume=0.2):
+    def play_melody(self, notes, duration_ms=150, volume=0.2, priority=PRIORITY_ANSWER):
         """Проиграть мелодию из нот. notes = список частот в Hz."""
-        sample_rate = 24000
-
+        pcm = array.array("h")
         for freq in notes:
-            n_samples = int(sample_rate * duration_ms / 1000)
-            buf = array.array("h", [0] * n_samples)
-            for i in range(n_samples):
-                t = i / sample_rate
-                envelope = 1.0
-                fade = int(n_samples * 0.15)
-                if i < fade:
-                    envelope = i / fade
-                elif i > n_samples - fade:
-                    envelope = (n_samples - i) / fade
-                buf[i] = int(32767 * volume * envelope * math.sin(2 * math.pi * freq * t))
-
-            sound = pygame.mixer.Sound(buffer=buf)
-            sound.play()
-            pygame.time.wait(duration_ms)
-
-    @staticmethod
-    def play_wake_sound():
+            pcm.extend(_tone(freq, duration_ms, volume, fade_ratio=0.15))
+        return self.scheduler.submit(lambda: self.output.play_pcm(pcm), priority)
+
+    def play_wake_sound(self):
         """Мелодия пробуждения — 3 ноты вверх."""
-        TextToSpeech.play_melody([523, 659, 784], duration_ms=120, volume=0.2)
+        return self.play_melody([523, 659, 784], duration_ms=120, volume=0.2,
+                                priority=PRIORITY_GREETING)
 
-    @staticmethod
-    def play_sleep_sound():
-        """Мелодия засыпания — 3 ноты вниз."""
-        TextToSpeech.play_melody([784, 659, 523], duration_ms=180, volume=0.15)
+    def play_sleep_sound(self):
+        """Мелодия засыпания — 3 ноты вниз. Обрывает всё, что играло."""
+        return self.play_melody([784, 659, 523], duration_ms=180, volume=0.15,
+                                priority=PRIORITY_SLEEP)
 
     # === Внутренние ===
 
-    def _play_text(self, text):
-        """Генерация и воспроизведение аудио для текста с retry."""
-        for attempt in range(2):
-            try:
-                response = self.client.audio.speech.create(
-                    model=config.TTS_MODEL,
-                    voice=self.voice,
-                    input=text,
-                    response_format="mp3",
-                )
-
-                with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-                    f.write(response.content)
-                    tmp_path = f.name
-
-                pygame.mixer.music.load(tmp_path)
-                pygame.mixer.music.play()
-
-                while pygame.mixer.music.get_busy():
-                    pygame.time.wait(50)
-
-                try:
-                    pygame.mixer.music.unload()
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
-
-                return  # Успех
-
-            except Exception as e:
-                print(f"[TTS] Ошибка (попытка {attempt + 1}): {e}")
-                if attempt == 0:
-                    time.sleep(0.5)
-                else:
-                    print("[TTS] Не удалось озвучить")
+    def _cache_key(self, text):
+        return (self.engine.name, self.engine.audio_format, self.voice, text)
+
+    def _submit_text(self, text, priority, before=None, after=None):
+        """Синтез (с кэшем и retry) в фоне, воспроизведение — в очереди вывода."""
+        if self._closed:
+            raise RuntimeError("TextToSpeech закрыт")
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            audio = self._synth.submit(self.synthesize, text)
+        except RuntimeError:
+            self._synth_done(None)  # интерпретатор завершается — синтез не запустится
+            raise
+        audio.add_done_callback(self._synth_done)
+        return self.scheduler.submit(self._play_audio, priority,
+                                     prepare=audio, before=before, after=after)
+
+    def _synth_done(self, _):
+        with self._pending_lock:
+            self._pending -= 1
+
+    def _play_audio(self, audio):
+        if audio:
+            self.output.play_audio(audio, self.engine.audio_format)
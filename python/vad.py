@@ -0,0 +1,520 @@
+"""Детектор голосовой активности — адаптивный шумовой фон + гистерезис.
+
+Порог тишины больше не фиксируется один раз при калибровке: уровень
+шума отслеживается постоянно (перцентиль по скользящему окну + EWMA):
+пока станция ждёт речь — по всем chunks, внутри фразы — только по паузам
+ниже нижнего порога, иначе фон за долгую фразу уползает в уровень речи.
+Вход в речь — по верхнему порогу и не короче VAD_MIN_SPEECH_SEC, выход —
+по нижнему, который не поднимается выше доли уровня речи.
+
+Запись идёт в предвыделенный CaptureBuffer: chunks копируются на место,
+уровень считается по memoryview, WAV-заголовок пишется в начало того же
+буфера — STT получает срез без склейки и временного файла.
+
+Оценка на записанном корпусе (WAV 16 кГц моно):
+  python vad.py corpus/        — corpus/speech/*.wav и corpus/noise/*.wav
+  python vad.py --bench [сек]  — выделения памяти: старая запись vs CaptureBuffer
+"""
+
+import io
+import operator
+import os
+import struct
+import sys
+import time
+import tracemalloc
+import wave
+from collections import deque
+
+import config
+
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")  # RIFF + fmt (PCM) + data, 44 байта
+
+
+def rms(data):
+    """Среднеквадратичная амплитуда PCM 16 бит (bytes или memoryview — без копии)."""
+    count = len(data) // 2
+    if count == 0:
+        return 0
+    samples = memoryview(data)[:count * 2].cast("h")
+    sum_sq = sum(map(operator.mul, samples, samples))
+    return int((sum_sq / count) ** 0.5)
+
+
+def adaptive_silence_chunks(speech_chunks, chunk_sec):
+    """Сколько chunks тишины ждать: короткая фраза — меньше, длинная — больше."""
+    speech_sec = speech_chunks * chunk_sec
+
+    if speech_sec < 3.0:
+        silence_sec = config.SILENCE_SHORT_PHRASE
+    elif speech_sec > 5.0:
+        silence_sec = config.SILENCE_LONG_PHRASE
+    else:
+        silence_sec = config.SILENCE_DURATION
+
+    return int(silence_sec / chunk_sec)
+
+
+class VoiceActivityDetector:
+    """Адаптивный VAD с гистерезисом. Оценки шума и речи живут между фразами."""
+
+    def __init__(self, chunk_sec):
+        self.chunk_sec = chunk_sec
+        self.noise = config.MIN_SILENCE_THRESHOLD / config.VAD_START_RATIO
+        self.speech_level = None
+        self.min_speech_chunks = max(1, round(config.VAD_MIN_SPEECH_SEC / chunk_sec))
+        self._window = deque(maxlen=max(1, int(config.VAD_NOISE_WINDOW_SEC / chunk_sec)))
+        self.reset()
+
+    def reset(self):
+        """Новая фраза: состояние сбрасывается, оценки шума и речи остаются."""
+        self.in_speech = False
+        self.speech_chunks = 0
+        self.silent_chunks = 0
+        self._onset = 0
+
+    def seed(self, levels):
+        """Начальная оценка шума по калибровочной записи."""
+        if not levels:
+            return
+        self._window.extend(levels)
+        self.noise = sorted(levels)[len(levels) // 2]
+
+    @property
+    def start_threshold(self):
+        """Верхний порог — вход в речь."""
+        threshold = max(config.MIN_SILENCE_THRESHOLD, self.noise * config.VAD_START_RATIO)
+        if self.speech_level and self.speech_level > self.noise:
+            # В шумном зале порог не должен уйти выше обычной речи
+            threshold = min(threshold, self.noise + (self.speech_level - self.noise) * 0.5)
+        return max(threshold, self.stop_threshold)
+
+    @property
+    def stop_threshold(self):
+        """Нижний порог — ниже него chunk считается тишиной внутри фразы."""
+        threshold = self.noise * config.VAD_STOP_RATIO
+        if self.speech_level and self.speech_level > self.noise:
+            # Тихий конец фразы — ещё речь, даже если шум оценён высоко
+            threshold = min(threshold,
+                            self.noise + (self.speech_level - self.noise) * config.VAD_STOP_SPEECH_SHARE)
+        return max(config.MIN_SILENCE_THRESHOLD * 0.8, threshold)
+
+    def update(self, level):
+        """Обработать уровень chunk-а. True — идёт речь."""
+        if not self.in_speech or level < self.stop_threshold:
+            self._track_noise(level)
+
+        if not self.in_speech:
+            if level > self.start_threshold:
+                self._onset += 1
+                if self._onset >= self.min_speech_chunks:
+                    self.in_speech = True
+                    self.speech_chunks = self._onset
+                    self.silent_chunks = 0
+            else:
+                self._onset = 0
+            return self.in_speech
+
+        if level >= self.stop_threshold:
+            self.speech_chunks += 1
+            self.silent_chunks = 0
+            self._track_speech(level)
+        else:
+            self.silent_chunks += 1
+        return True
+
+    # === Внутренние методы ===
+
+    def _track_noise(self, level):
+        """Шум = EWMA низкого перцентиля окна: паузы между словами его не раздувают."""
+        self._window.append(level)
+        ordered = sorted(self._window)
+        floor = ordered[int(len(ordered) * config.VAD_NOISE_PERCENTILE / 100)]
+        self.noise += config.VAD_NOISE_ALPHA * (floor - self.noise)
+
+    def _track_speech(self, level):
+        if self.speech_level is None:
+            self.speech_level = level
+        else:
+            self.speech_level += config.VAD_SPEECH_ALPHA * (level - self.speech_level)
+
+
+class CaptureBuffer:
+    """Предвыделенный буфер одной фразы: [WAV-заголовок][PCM].
+
+    Пока ждём речь, chunks ложатся в кольцо из preroll мест в начале PCM;
+    с началом речи кольцо один раз выстраивается по порядку, дальше chunks
+    дописываются подряд. wav() пишет заголовок на место и отдаёт срез —
+    готовый файл для STT без копии. Буфер переиспользуется между фразами:
+    срезы pcm / wav() действительны до следующего reset().
+    """
+
+    def __init__(self, chunk_bytes, max_chunks, preroll, sample_rate=None, channels=1):
+        self.chunk_bytes = chunk_bytes
+        self.preroll = max(1, preroll)
+        self.sample_rate = sample_rate or config.SAMPLE_RATE
+        self.channels = channels
+        self._data = bytearray(WAV_HEADER.size + (max_chunks + self.preroll) * chunk_bytes)
+        self._view = memoryview(self._data)
+        self._ring_sizes = [0] * self.preroll
+        self.reset()
+
+    @property
+    def capacity(self):
+        return len(self._data) - WAV_HEADER.size
+
+    @property
+    def pcm(self):
+        return self._view[WAV_HEADER.size:WAV_HEADER.size + self.length]
+
+    @property
+    def seconds(self):
+        return self.length / (2 * self.channels * self.sample_rate)
+
+    def reset(self):
+        self.length = 0
+        self._ring_count = 0
+
+    def ring_put(self, data):
+        """Фаза ожидания: chunk в кольцо pre-roll. Возвращает срез с ним (для уровня)."""
+        size = min(len(data), self.chunk_bytes)
+        start = WAV_HEADER.size + (self._ring_count % self.preroll) * self.chunk_bytes
+        self._view[start:start + size] = data[:size]
+        self._ring_sizes[self._ring_count % self.preroll] = size
+        self._ring_count += 1
+        return self._view[start:start + size]
+
+    def ring_commit(self):
+        """Речь началась: pre-roll по порядку в начало PCM."""
+        count = min(self._ring_count, self.preroll)
+        first = self._ring_count - count
+        base = WAV_HEADER.size
+        if first % self.preroll == 0 and all(
+                self._ring_sizes[i] == self.chunk_bytes for i in range(count - 1)):
+            # Самый старый chunk в первом месте — кольцо уже по порядку
+            self.length = sum(self._ring_sizes[:count])
+            return
+        # Один раз на фразу: копия pre-roll (несколько chunks) и раскладка по порядку
+        ring = bytes(self._view[base:base + self.preroll * self.chunk_bytes])
+        offset = base
+        for n in range(first, self._ring_count):
+            slot = n % self.preroll
+            size = self._ring_sizes[slot]
+            start = slot * self.chunk_bytes
+            self._view[offset:offset + size] = ring[start:start + size]
+            offset += size
+        self.length = offset - base
+
+    def append(self, data):
+        """Дописать chunk после pre-roll. Возвращает срез с ним; None — буфер полон."""
+        size = len(data)
+        start = WAV_HEADER.size + self.length
+        if self.length + size > self.capacity:
+            return None
+        self._view[start:start + size] = data
+        self.length += size
+        return self._view[start:start + size]
+
+    def wav(self):
+        """WAV-файл фразы: заголовок пишется на место, возвращается срез буфера."""
+        block_align = 2 * self.channels
+        WAV_HEADER.pack_into(
+            self._data, 0,
+            b"RIFF", WAV_HEADER.size - 8 + self.length, b"WAVE",
+            b"fmt ", 16, 1, self.channels, self.sample_rate,
+            self.sample_rate * block_align, block_align, 16,
+            b"data", self.length,
+        )
+        return self._view[:WAV_HEADER.size + self.length]
+
+
+class FixedThresholdDetector:
+    """Старое поведение: порог = 1.8 × средний шум калибровки, без гистерезиса."""
+
+    min_speech_chunks = 1
+
+    def __init__(self, chunk_sec):
+        self.chunk_sec = chunk_sec
+        self.threshold = config.MIN_SILENCE_THRESHOLD
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.speech_chunks = 0
+        self.silent_chunks = 0
+
+    def seed(self, levels):
+        avg_noise = sum(levels) / len(levels) if levels else 300
+        self.threshold = max(int(avg_noise * 1.8), config.MIN_SILENCE_THRESHOLD)
+
+    def update(self, level):
+        if not self.in_speech:
+            if level > self.threshold:
+                self.in_speech = True
+                self.speech_chunks = 1
+            return self.in_speech
+        if level >= self.threshold:
+            self.speech_chunks += 1
+            self.silent_chunks = 0
+        else:
+            self.silent_chunks += 1
+        return True
+
+
+def capture(read_chunk, detector, timeout_chunks, max_chunks, endpointer=None, draft=None,
+            buffer=None):
+    """Фаза 1 — ждём речь, фаза 2 — пишем до паузы.
+
+    read_chunk() возвращает байты PCM (пустые — конец записи).
+    endpointer — решает конец реплики (endpoint.Endpointer); без него —
+    адаптивная пауза по длине фразы. draft — черновая расшифровка на паузе
+    (endpoint.DraftTranscriber), её текст подсказывает endpointer-у.
+    buffer — CaptureBuffer для переиспользования; без него создаётся свой
+    по размеру первого chunk-а.
+    Возвращает (pcm, speech_chunks): pcm — memoryview в буфере, пуст — речи не было.
+    """
+    detector.reset()
+    if endpointer is not None:
+        endpointer.reset()
+    if draft is not None:
+        draft.reset()
+    # Pre-roll: chunks, пока VAD набирал минимальную длительность, — это уже речь
+    preroll = detector.min_speech_chunks + config.VAD_PREROLL_CHUNKS
+    if buffer is not None:
+        buffer.reset()
+
+    # Фаза 1: ждём начала речи
+    for _ in range(timeout_chunks):
+        data = read_chunk()
+        if not data:
+            return memoryview(b""), 0
+        if buffer is None:
+            buffer = CaptureBuffer(len(data), max_chunks, preroll)
+        if detector.update(rms(buffer.ring_put(data))):
+            break
+    else:
+        return memoryview(b""), 0
+
+    # Фаза 2: запись до конца реплики
+    buffer.ring_commit()
+    for _ in range(max_chunks):
+        data = read_chunk()
+        if not data:
+            break
+        chunk = buffer.append(data)
+        if chunk is None:
+            break  # буфер рассчитан на max_chunks — дальше MAX_RECORD_SEC
+        level = rms(chunk)
+        detector.update(level)
+
+        if endpointer is None:
+            limit = adaptive_silence_chunks(detector.speech_chunks, detector.chunk_sec)
+            if detector.silent_chunks >= limit:
+                break
+            continue
+
+        endpointer.observe(level, detector)
+        if draft is not None:
+            if detector.silent_chunks == 0:
+                draft.speech_resumed()
+            elif detector.silent_chunks == endpointer.draft_chunks:
+                draft.request(buffer.pcm)
+        if endpointer.should_stop(detector, draft.text if draft is not None else None):
+            break
+
+    return buffer.pcm, detector.speech_chunks
+
+
+# === Оценка на корпусе ===
+
+def _wav_reader(path, chunk):
+    wf = wave.open(path, "rb")
+    if wf.getframerate() != config.SAMPLE_RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+        wf.close()
+        raise ValueError(f"{path}: нужен WAV {config.SAMPLE_RATE} Гц, моно, 16 бит")
+    return wf, lambda: wf.readframes(chunk)
+
+
+def _run_file(path, detector_cls, chunk):
+    """Прогнать файл как непрерывный эфир: список длительностей загрузок (сек)."""
+    chunk_sec = chunk / config.SAMPLE_RATE
+    wf, read = _wav_reader(path, chunk)
+    try:
+        detector = detector_cls(chunk_sec)
+        # Калибровка — первая секунда, как при старте станции
+        calib = []
+        for _ in range(int(1 / chunk_sec)):
+            data = read()
+            if not data:
+                break
+            calib.append(rms(data))
+        detector.seed(calib)
+
+        uploads = []
+        timeout_chunks = int(config.LISTEN_TIMEOUT / chunk_sec)
+        max_chunks = int(config.MAX_RECORD_SEC / chunk_sec)
+        while True:
+            pcm, _ = capture(read, detector, timeout_chunks, max_chunks)
+            if pcm:
+                uploads.append(len(pcm) / 2 / config.SAMPLE_RATE)
+            if wf.tell() >= wf.getnframes():
+                return uploads
+    finally:
+        wf.close()
+
+
+def evaluate(corpus_dir, chunk=None):
+    """Ложные срабатывания на шуме и средняя длина загрузки: старый порог vs VAD."""
+    chunk = chunk or config.CHUNK
+    detectors = {"фикс. порог": FixedThresholdDetector, "адаптивный VAD": VoiceActivityDetector}
+    report = {}
+
+    for label, detector_cls in detectors.items():
+        res = {"false_triggers": 0, "noise_files": 0, "missed": 0, "speech_files": 0, "uploads": []}
+        for kind in ("noise", "speech"):
+            folder = os.path.join(corpus_dir, kind)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if not name.lower().endswith(".wav"):
+                    continue
+                uploads = _run_file(os.path.join(folder, name), detector_cls, chunk)
+                res[f"{kind}_files"] += 1
+                if kind == "noise":
+                    res["false_triggers"] += len(uploads)
+                else:
+                    res["missed"] += 0 if uploads else 1
+                res["uploads"].extend(uploads)
+        report[label] = res
+
+    for label, res in report.items():
+        uploads = res["uploads"]
+        avg = sum(uploads) / len(uploads) if uploads else 0.0
+        print(f"[VAD] {label}: ложных срабатываний {res['false_triggers']} "
+              f"на {res['noise_files']} файлах шума, пропущено {res['missed']} "
+              f"из {res['speech_files']} фраз, загрузок {len(uploads)}, "
+              f"средняя длина {avg:.2f} с, всего {sum(uploads):.1f} с")
+    return report
+
+
+# === Бенчмарк выделений памяти ===
+
+def _rms_unpack(data):
+    """Прежний rms: кортеж из всех сэмплов на каждый chunk."""
+    count = len(data) // 2
+    shorts = struct.unpack(f"{count}h", data[:count * 2])
+    return int((sum(s * s for s in shorts) / count) ** 0.5)
+
+
+def _legacy_capture(read_chunk, detector, timeout_chunks, max_chunks):
+    """Прежняя запись: список bytes → b"".join → WAV через wave. Только для --bench."""
+    detector.reset()
+    preroll = deque(maxlen=detector.min_speech_chunks + config.VAD_PREROLL_CHUNKS)
+    for _ in range(timeout_chunks):
+        data = read_chunk()
+        preroll.append(data)
+        if detector.update(_rms_unpack(data)):
+            break
+    frames = list(preroll)
+    for _ in range(max_chunks):
+        data = read_chunk()
+        if not data:
+            break
+        frames.append(data)
+        detector.update(_rms_unpack(data))
+        if detector.silent_chunks >= adaptive_silence_chunks(detector.speech_chunks,
+                                                             detector.chunk_sec):
+            break
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(config.SAMPLE_RATE)
+        wf.writeframes(b"".join(frames))
+    return buf.getvalue()
+
+
+def benchmark(seconds=10.0, chunk=None, rounds=3):
+    """Пик выделенной памяти и время на секунду записи: прежняя запись vs CaptureBuffer.
+
+    Источник отдаёт заранее созданные chunks — меряется только путь записи,
+    а не микрофон. Прежний путь взят с запасом в его пользу: WAV собирается
+    в памяти, без временного файла и чтения его обратно.
+    """
+    import random
+
+    chunk = chunk or config.CHUNK
+    chunk_sec = chunk / config.SAMPLE_RATE
+    rng = random.Random(1)
+
+    def noise(amplitude):
+        return struct.pack(f"<{chunk}h", *(int(rng.uniform(-amplitude, amplitude))
+                                            for _ in range(chunk)))
+
+    loud = [noise(4000) for _ in range(8)]
+    quiet = [noise(60) for _ in range(8)]
+    speech = int(seconds / chunk_sec)
+    # Слоги: три громких chunk-а и тихий — шумовой фон VAD не подтягивается к речи
+    script = quiet[:3] + [loud[i % 8] if i % 4 else quiet[i % 8] for i in range(speech)]
+    script += [quiet[i % 8] for i in range(60)]
+    max_chunks = int(config.MAX_RECORD_SEC / chunk_sec)
+    timeout_chunks = int(config.LISTEN_TIMEOUT / chunk_sec)
+
+    def source():
+        it = iter(script)
+        return lambda: next(it, b"")
+
+    def seeded():
+        detector = VoiceActivityDetector(chunk_sec)
+        detector.seed([rms(q) for q in quiet])
+        return detector
+
+    buffer = CaptureBuffer(chunk * 2, max_chunks + speech,
+                           seeded().min_speech_chunks + config.VAD_PREROLL_CHUNKS)
+
+    def legacy():
+        return _legacy_capture(source(), seeded(), timeout_chunks, max_chunks + speech)
+
+    def zero_copy():
+        capture(source(), seeded(), timeout_chunks, max_chunks + speech, buffer=buffer)
+        return buffer.wav()
+
+    results = {}
+    for label, run in (("список + join", legacy), ("CaptureBuffer", zero_copy)):
+        run()  # прогрев: кэши, интернированные объекты
+        elapsed = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            wav = run()
+            elapsed.append(time.perf_counter() - started)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        wav = run()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        recorded = (len(wav) - WAV_HEADER.size) / 2 / config.SAMPLE_RATE
+        results[label] = {"wav": bytes(wav), "recorded_sec": recorded,
+                          "peak_kb_per_sec": peak / 1e3 / recorded,
+                          "ms_per_sec": min(elapsed) * 1e3 / recorded}
+
+    (old_label, old), (new_label, new) = results.items()
+    print(f"[VAD] Запись {new['recorded_sec']:.1f} с, буфер CaptureBuffer "
+          f"{len(buffer._data) / 1e3:.0f} КБ выделен заранее (один раз на станцию)")
+    for label, res in results.items():
+        print(f"[VAD] {label}: пик {res['peak_kb_per_sec']:.1f} КБ на секунду записи, "
+              f"{res['ms_per_sec']:.1f} мс CPU на секунду записи")
+    ratio = old["peak_kb_per_sec"] / max(new["peak_kb_per_sec"], 1e-3)
+    same = "да" if old["wav"] == new["wav"] else "НЕТ"
+    print(f"[VAD] Пик выделений меньше в {ratio:.0f} раз; WAV совпадает байт в байт: {same}")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python vad.py corpus/  (corpus/speech/*.wav, corpus/noise/*.wav)")
+        print("               python vad.py --bench [секунд записи]")
+        sys.exit(1)
+    if sys.argv[1] == "--bench":
+        benchmark(float(sys.argv[2]) if len(sys.argv) > 2 else 10.0)
+    else:
+        evaluate(sys.argv[1])